@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# 项目模块都在仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_klines(n=2000, seed=0, drift=0.0):
+    """随机游走生成的 1h K线，索引为开盘时间；drift 为每根K线的对数收益率均值"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(drift, 0.01, n)))
+    open_ = np.r_[100, close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.005, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.005, n))
+    index = pd.date_range("2024-01-01", periods=n, freq="1h", name="timestamp")
+    return pd.DataFrame({"open": open_, "high": high, "low": low, "close": close,
+                         "volume": rng.uniform(1, 10, n)}, index=index)
+
+
+def random_batch_strategy(seed, p=(0.97, 0.01, 0.01, 0.005, 0.005)):
+    """按固定随机种子给每根K线一个信号编码的批量策略"""
+    def trade_signals(timestamps, opens, highs, lows, closes, volumes):
+        rng = np.random.default_rng(seed)
+        return rng.choice(5, len(closes), p=list(p)).astype(np.int8)
+    return trade_signals
+
+
+def random_tick_strategy(seed, p=(0.97, 0.01, 0.01, 0.005, 0.005)):
+    """按固定随机种子逐tick给出信号的 trade_signal"""
+    rng = np.random.default_rng(seed)
+    names = ["不操作", "做多", "做空", "平多", "平空"]
+
+    def trade_signal(time, price):
+        return names[rng.choice(5, p=list(p))]
+    return trade_signal
+
+
+@pytest.fixture(scope="session")
+def klines():
+    return make_klines(3000, 3)
+
+
+@pytest.fixture(scope="session")
+def rising_klines():
+    """持续上涨的行情，空头持仓会触发强平"""
+    return make_klines(3000, 3, drift=0.001)
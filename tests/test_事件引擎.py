@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from conftest import random_batch_strategy, random_tick_strategy
+from 回测引擎 import (FIXED_MARGIN_MODE, PARAM_MODELS, PERCENT_MARGIN_MODE, BacktestConfig, BacktestEngine,
+                  expand_ohlc)
+from 事件引擎 import EventBus, EventEngine, market_event, MARKET, FILL
+from 交易规则 import SymbolFilters
+
+RULES = {"BTCUSDT": SymbolFilters("BTCUSDT", "0.001", "0.1", min_qty=0.001, min_notional=5)}
+
+
+def assert_same_result(a, b):
+    assert a.trade_orders == b.trade_orders
+    assert a.open_orders == b.open_orders
+    assert a.final_margin == b.final_margin
+    assert a.ticks == b.ticks
+    assert a.bankrupt == b.bankrupt
+    assert a.summary == b.summary
+    assert np.array_equal(a.equity, b.equity)
+    assert np.array_equal(a.exposure, b.exposure)
+
+
+@pytest.mark.parametrize("order_mode", [FIXED_MARGIN_MODE, PERCENT_MARGIN_MODE])
+@pytest.mark.parametrize("param_model", PARAM_MODELS)
+@pytest.mark.parametrize("leverage", [5, 125])
+@pytest.mark.parametrize("rules", [None, RULES])
+def test_event_engine_matches_tick_loop(klines, order_mode, param_model, leverage, rules):
+    config = BacktestConfig(order_mode=order_mode, param_model=param_model, leverage=leverage,
+                            symbol_filters=rules, initial_margin=100000)
+    a = BacktestEngine(config, random_tick_strategy(1)).run(klines)
+    b = EventEngine(config, random_tick_strategy(1)).run_ticks(expand_ohlc(klines, param_model))
+    assert a.trade_orders
+    assert_same_result(a, b)
+
+
+@pytest.mark.parametrize("order_mode", [FIXED_MARGIN_MODE, PERCENT_MARGIN_MODE])
+def test_event_engine_matches_tick_loop_with_batch_signals(klines, order_mode):
+    strategy = random_batch_strategy(2)
+    config = BacktestConfig(order_mode=order_mode, leverage=50, initial_margin=100000)
+    engine = BacktestEngine(config, batch_strategy=strategy)
+    ticks = engine.expand_ticks(klines)
+    tick_signals = engine.batch_tick_signals(strategy, klines, ticks)
+    a = engine.run_ticks(ticks, tick_signals)
+    b = EventEngine(config, batch_strategy=strategy).run_ticks(ticks, tick_signals)
+    assert_same_result(a, b)
+
+
+def test_bus_orders_by_time_then_priority():
+    bus = EventBus()
+    seen = []
+    bus.subscribe(MARKET, lambda event: seen.append((event["time"], event["type"])))
+    bus.subscribe(FILL, lambda event: seen.append((event["time"], event["type"])))
+    bus.add_source(iter([market_event(1, 10.0), market_event(3, 11.0)]))
+    bus.add_source(iter([market_event(2, 12.0)]))
+    bus.put({"type": FILL, "time": 2})
+    bus.run()
+    assert seen == [(1, MARKET), (2, FILL), (2, MARKET), (3, MARKET)]
+
+
+def test_liquidation_only_event_liquidates_and_stops_on_bankrupt():
+    signals = iter(["做多"])
+    engine = EventEngine(BacktestConfig(leverage=50, initial_margin=1000, fixed_margin=100),
+                         lambda time, price: next(signals, "不操作"))
+    result = engine.run_events(iter([
+        market_event(1, 100.0),
+        market_event(2, None, low=1.0, high=100.0),
+        market_event(3, 100.0)
+    ]))
+    assert len(result.trade_orders) == 1
+    assert result.trade_orders[0]["action"].startswith("强平")
+    assert result.trade_orders[0]["close_price"] == 1.0
+    assert result.bankrupt
+    assert result.ticks == 1
@@ -0,0 +1,118 @@
+import pytest
+
+from 交易规则 import SymbolFilters, parse_exchange_info
+
+
+def exchange_info(*symbols):
+    return {"symbols": list(symbols)}
+
+
+def symbol_info(symbol, step="0.001", tick="0.10", min_qty="0.001", max_qty="1000", market_max_qty=None,
+                notional=None):
+    filters = [
+        {"filterType": "PRICE_FILTER", "tickSize": tick, "minPrice": "0.1", "maxPrice": "1000000"},
+        {"filterType": "LOT_SIZE", "stepSize": step, "minQty": min_qty, "maxQty": max_qty},
+    ]
+    if market_max_qty is not None:
+        filters.append({"filterType": "MARKET_LOT_SIZE", "stepSize": step, "minQty": min_qty,
+                        "maxQty": market_max_qty})
+    if notional is not None:
+        filters.append({"filterType": "MIN_NOTIONAL", **notional})
+    return {"symbol": symbol, "filters": filters}
+
+
+@pytest.mark.parametrize("quantity, expected", [
+    (0.3, 0.3),
+    (0.1 * 3, 0.3),
+    (0.7 * 3, 2.1),
+    (0.29999, 0.2),
+    (1.05, 1.0),
+])
+def test_floor_quantity_absorbs_float_error(quantity, expected):
+    assert SymbolFilters("X", "0.1", "0.01").floor_quantity(quantity) == expected
+
+
+@pytest.mark.parametrize("quantity, expected", [
+    (0.12345678, 0.12345678),
+    (0.123456789, 0.12345678),
+    (0.1 + 0.2, 0.3),
+    (12.00000001, 12.00000001),
+    (0.000000019, 0.00000001),
+])
+def test_floor_quantity_eight_decimal_step(quantity, expected):
+    filters = SymbolFilters("X", "0.00000001", "0.01")
+    assert filters.quantity_precision == 8
+    assert filters.floor_quantity(quantity) == expected
+
+
+def test_floor_quantity_step_larger_than_precision():
+    filters = SymbolFilters("X", "5", "0.01")
+    assert filters.floor_quantity(14.999) == 10
+    assert filters.floor_quantity(15.0) == 15
+
+
+@pytest.mark.parametrize("price, expected", [
+    (100.24, 100.0),
+    (100.26, 100.5),
+    (100.74, 100.5),
+    (100.75, 101.0),
+    (0.2, 0.0),
+])
+def test_round_price_non_power_of_ten_tick(price, expected):
+    filters = SymbolFilters("X", "0.001", "0.5")
+    assert filters.price_precision == 1
+    assert filters.round_price(price) == expected
+    assert filters.format_price(filters.round_price(price)) == f"{expected:.1f}"
+
+
+def test_round_price_power_of_ten_tick():
+    filters = SymbolFilters("X", "0.001", "0.01")
+    assert filters.round_price(0.1 + 0.2) == 0.3
+    assert filters.round_price(123.456) == 123.46
+
+
+def test_adjust_quantity_caps_market_orders_by_market_lot_size():
+    filters = parse_exchange_info(exchange_info(
+        symbol_info("BTCUSDT", max_qty="1000", market_max_qty="120")))["BTCUSDT"]
+    assert filters.adjust_quantity(500.0) == 120
+    # 限价单只受 LOT_SIZE 上限约束
+    assert filters.adjust_quantity(500.0, market=False) == 500
+    assert filters.adjust_quantity(5000.0, market=False) == 1000
+
+
+def test_market_lot_size_defaults_to_lot_size():
+    filters = parse_exchange_info(exchange_info(symbol_info("BTCUSDT", max_qty="1000")))["BTCUSDT"]
+    assert filters.market_max_qty == 1000
+    assert filters.adjust_quantity(5000.0) == 1000
+
+
+def test_adjust_quantity_rejects_below_min_qty_and_notional():
+    filters = SymbolFilters("X", "0.001", "0.1", min_qty="0.01", min_notional="5")
+    assert filters.adjust_quantity(0.0099, price=1000) == 0.0
+    assert filters.adjust_quantity(0.0049, price=1000) == 0.0
+    assert filters.adjust_quantity(0.01, price=100) == 0.0
+    assert filters.adjust_quantity(0.05, price=100) == 0.05
+    # 不传价格时不检查名义价值
+    assert filters.adjust_quantity(0.01) == 0.01
+
+
+@pytest.mark.parametrize("notional, expected", [
+    ({"notional": "5"}, 5.0),
+    ({"minNotional": "10"}, 10.0),
+    ({"notional": "5", "minNotional": "10"}, 5.0),
+    (None, 0.0),
+])
+def test_parse_min_notional_field_fallback(notional, expected):
+    filters = parse_exchange_info(exchange_info(symbol_info("BTCUSDT", notional=notional)))["BTCUSDT"]
+    assert filters.min_notional == expected
+
+
+def test_parse_skips_symbols_without_lot_or_price_filter():
+    broken = {"symbol": "BROKEN", "filters": [{"filterType": "LOT_SIZE", "stepSize": "1", "minQty": "1",
+                                               "maxQty": "10"}]}
+    result = parse_exchange_info(exchange_info(symbol_info("BTCUSDT", step="0.001", tick="0.10"), broken,
+                                               {"symbol": "EMPTY"}))
+    assert list(result) == ["BTCUSDT"]
+    filters = result["BTCUSDT"]
+    assert (filters.quantity_precision, filters.price_precision) == (3, 1)
+    assert filters.format_quantity(filters.floor_quantity(1.23456)) == "1.234"
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from conftest import random_batch_strategy
+from 回测引擎 import FIXED_MARGIN_MODE, PARAM_MODELS, PERCENT_MARGIN_MODE, BacktestConfig, BacktestEngine
+from 交易规则 import SymbolFilters
+
+RULES = {"BTCUSDT": SymbolFilters("BTCUSDT", "0.001", "0.1", min_qty=0.001, min_notional=5)}
+
+
+def run_both(config, strategy, df):
+    """分别用快速路径和逐tick循环回测同一批信号"""
+    fast = BacktestEngine(config, batch_strategy=strategy).run(df)
+    engine = BacktestEngine(config, batch_strategy=strategy)
+    ticks = engine.expand_ticks(df)
+    slow = engine.run_ticks(ticks, engine.batch_tick_signals(strategy, df, ticks))
+    return fast, slow
+
+
+def assert_same_result(fast, slow):
+    assert fast.trade_orders == slow.trade_orders
+    assert fast.open_orders == slow.open_orders
+    assert fast.final_margin == slow.final_margin
+    assert fast.margin_min == slow.margin_min
+    assert fast.ticks == slow.ticks
+    assert fast.bankrupt == slow.bankrupt
+    assert fast.summary == slow.summary
+    # 快速路径按段做数组运算，与逐tick累加只有浮点舍入的差别
+    assert len(fast.equity) == len(slow.equity) == fast.ticks
+    np.testing.assert_allclose(fast.equity, slow.equity, rtol=1e-9, atol=1e-6)
+    assert np.array_equal(fast.exposure, slow.exposure)
+
+
+@pytest.mark.parametrize("order_mode", [FIXED_MARGIN_MODE, PERCENT_MARGIN_MODE])
+@pytest.mark.parametrize("param_model", PARAM_MODELS)
+@pytest.mark.parametrize("leverage", [5, 50, 125])
+@pytest.mark.parametrize("rules", [None, RULES])
+@pytest.mark.parametrize("enable_liquidation", [True, False])
+@pytest.mark.parametrize("data", ["klines", "rising_klines"])
+def test_vectorized_matches_tick_loop(request, data, order_mode, param_model, leverage, rules, enable_liquidation):
+    config = BacktestConfig(order_mode=order_mode, param_model=param_model, leverage=leverage,
+                            symbol_filters=rules, enable_liquidation=enable_liquidation, initial_margin=100000)
+    fast, slow = run_both(config, random_batch_strategy(0), request.getfixturevalue(data))
+    assert fast.trade_orders
+    assert_same_result(fast, slow)
+
+
+@pytest.mark.parametrize("rules", [None, RULES])
+def test_vectorized_matches_tick_loop_with_liquidations(rising_klines, rules):
+    config = BacktestConfig(leverage=125, symbol_filters=rules, initial_margin=100000)
+    fast, slow = run_both(config, random_batch_strategy(0), rising_klines)
+    assert any(trade["action"].startswith("强平") for trade in fast.trade_orders)
+    assert_same_result(fast, slow)
+
+
+@pytest.mark.parametrize("rules", [None, RULES])
+def test_vectorized_matches_tick_loop_until_bankrupt(rising_klines, rules):
+    config = BacktestConfig(leverage=125, order_mode=PERCENT_MARGIN_MODE, symbol_filters=rules, initial_margin=100000)
+    fast, slow = run_both(config, random_batch_strategy(0), rising_klines)
+    assert fast.bankrupt
+    assert fast.ticks < len(rising_klines) * 4
+    assert_same_result(fast, slow)
+
+
+def test_equity_marks_open_positions_to_market(klines):
+    engine = BacktestEngine(BacktestConfig(initial_margin=100000), batch_strategy=random_batch_strategy(0))
+    result = engine.run(klines)
+    last_price = float(klines["close"].iloc[-1])
+    locked = sum(order["margin"] for order in result.open_orders)
+    expected = result.final_margin + locked + engine.positions.unrealized_pnl(last_price)
+    assert result.open_orders
+    assert result.equity[-1] == pytest.approx(expected)
+    assert result.exposure[-1]
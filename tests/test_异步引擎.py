@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from 回测引擎 import BacktestConfig
+from 异步引擎 import AsyncTradingEngine, TradingSession
+
+SLOW_STRATEGY = """
+import time
+
+def trade_signal(time_, price):
+    time.sleep(0.5)
+    return "做多"
+"""
+
+FAST_STRATEGY = """
+def trade_signal(time_, price):
+    return "做多"
+"""
+
+
+def trade_event(symbol, price):
+    return {"type": "trade", "symbol": symbol, "time": 1704067200000, "price": price, "quantity": 1.0}
+
+
+def test_slow_strategy_does_not_block_other_sessions():
+    slow = TradingSession("slow", SLOW_STRATEGY, BacktestConfig(symbol="BTCUSDT", initial_margin=1000))
+    fast = TradingSession("fast", FAST_STRATEGY, BacktestConfig(symbol="ETHUSDT", initial_margin=1000))
+
+    async def scenario():
+        tasks = [asyncio.create_task(slow.run()), asyncio.create_task(fast.run())]
+        await asyncio.sleep(0)
+        started = time.perf_counter()
+        slow.push(trade_event("BTCUSDT", 100.0))
+        await asyncio.sleep(0.05)
+        # 慢策略还在线程池中计算时，事件循环仍能处理其他会话的行情
+        fast.push(trade_event("ETHUSDT", 10.0))
+        while len(fast.engine.positions) == 0:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        slow_ticks = slow.ticks, len(slow.engine.positions)
+        while len(slow.engine.positions) == 0:
+            await asyncio.sleep(0.01)
+        for session in (slow, fast):
+            session.stopped = True
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return elapsed, slow_ticks
+
+    elapsed, slow_ticks = asyncio.run(scenario())
+    assert elapsed < 0.3
+    assert slow_ticks == (1, 0)
+    assert len(fast.engine.positions) == 1
+    assert len(slow.engine.positions) == 1
+
+
+def test_join_reports_whether_engine_is_running():
+    engine = AsyncTradingEngine()
+    assert not engine.running
+    assert engine.join(0) is False
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from 持仓账本 import LONG, SHORT, PositionBook
+
+
+def open_order(book, action, sequence, entry_price=100.0, liquidation_price=np.nan, notional=1000.0):
+    return book.open(action, notional / 10, notional, entry_price, liquidation_price, fee=0.5,
+                     sequence=sequence, time=f"t{sequence}")
+
+
+def test_close_first_skips_positions_closed_out_of_order():
+    book = PositionBook()
+    slots = {sequence: open_order(book, "做多", sequence) for sequence in (1, 2, 3)}
+    open_order(book, "做空", 4)
+
+    # 中间一笔先被单独移除（如强平），FIFO 队列里留下的旧条目在出队时跳过
+    assert book.remove(slots[2])["sequence"] == 2
+    assert book.close_first(LONG)["sequence"] == 1
+    assert book.close_first(LONG)["sequence"] == 3
+    assert book.close_first(LONG) is None
+    assert book.close_first(SHORT)["sequence"] == 4
+    assert len(book) == 0
+
+
+def test_close_first_ignores_reused_slot():
+    book = PositionBook()
+    first = open_order(book, "做多", 1)
+    open_order(book, "做多", 2)
+    book.remove(first)
+    # 新开仓复用刚释放的槽位，旧的 (槽位, 序列号1) 条目不能被当成新持仓
+    assert open_order(book, "做多", 3) == first
+
+    assert book.close_first(LONG)["sequence"] == 2
+    assert book.close_first(LONG)["sequence"] == 3
+    assert book.close_first(LONG) is None
+
+
+def test_first_and_find_skip_stale_entries():
+    book = PositionBook()
+    slots = [open_order(book, "做空", sequence) for sequence in (1, 2)]
+    book.remove(slots[0])
+    open_order(book, "做空", 3)
+
+    assert book.find(1) is None
+    assert book.find(3)["time"] == "t3"
+    # first 只查看不移除，并顺带弹出过期条目
+    assert book.first(SHORT)["sequence"] == 2
+    assert book.first(SHORT)["sequence"] == 2
+    assert len(book._fifo[SHORT]) == 2
+    assert book.first(LONG) is None
+    assert [order["sequence"] for order in book] == [2, 3]
+
+
+def test_scans_after_arrays_grow():
+    book = PositionBook(capacity=2)
+    rng = np.random.default_rng(0)
+    expected = {}
+    for sequence in range(1, 201):
+        action = "做多" if sequence % 3 else "做空"
+        entry = float(rng.uniform(90, 110))
+        liquidation = entry * (0.9 if action == "做多" else 1.1)
+        open_order(book, action, sequence, entry, liquidation, notional=float(rng.uniform(100, 1000)))
+        expected[sequence] = book.find(sequence)
+    assert book.capacity >= 200
+    # 移除一部分，让数组中留下空槽
+    for sequence in range(1, 201, 7):
+        book.remove(book._by_sequence[sequence])
+        del expected[sequence]
+
+    price = 95.0
+    side = {"做多": LONG, "做空": SHORT}
+    pnl = sum(o["actual_control_funds"] * side[o["action"]] * (price - o["open_price"]) / o["open_price"]
+              for o in expected.values())
+    assert book.unrealized_pnl(price) == pytest.approx(pnl)
+    a, b = book.equity_terms()
+    assert a * price + b == pytest.approx(pnl + sum(o["margin"] for o in expected.values()))
+
+    for price in (85.0, 100.0, 115.0):
+        hits = [sequence for sequence, o in expected.items()
+                if (o["action"] == "做多" and price <= o["liquidation_price"]) or
+                   (o["action"] == "做空" and price >= o["liquidation_price"])]
+        assert [int(book.sequence[slot]) for slot in book.liquidations(price)] == sorted(hits)
+    long_max = max(o["liquidation_price"] for o in expected.values() if o["action"] == "做多")
+    short_min = min(o["liquidation_price"] for o in expected.values() if o["action"] == "做空")
+    assert book.first_touch(np.array([long_max + 0.01, long_max, short_min])) == 1
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from 指标库 import ATR, EMA, MACD, RSI, Bollinger, Donchian, RingBuffer, RollingMean, RollingStd, WilderMA
+
+
+@pytest.fixture(scope="module")
+def prices():
+    rng = np.random.default_rng(7)
+    return pd.Series(30000 + np.cumsum(rng.normal(0, 25, 3000)))
+
+
+@pytest.fixture(scope="module")
+def spreads():
+    # 标准差只和数据的离散程度有关，用量级在1附近的序列比较，误差不受价格量级放大
+    rng = np.random.default_rng(7)
+    return pd.Series(np.cumsum(rng.normal(0, 1, 3000)) / 10)
+
+
+def stream(indicator, values):
+    """逐个喂给指标，数据不足时的 None 换成 nan"""
+    out = []
+    for x in values:
+        value = indicator.update(x)
+        out.append(np.nan if value is None else value)
+    return np.array(out)
+
+
+def seeded_ewm(series, period, alpha):
+    """前 period 个值的简单平均作为初值，之后按 alpha 递推，与 EMA 的约定一致"""
+    series = series.dropna()
+    seeded = pd.concat([pd.Series([series.iloc[:period].mean()], index=[series.index[period - 1]]),
+                        series.iloc[period:]])
+    return seeded.ewm(alpha=alpha, adjust=False).mean()
+
+
+def assert_matches(actual, expected, rel=0.0, abs=1e-11):
+    expected = np.asarray(expected, dtype=float)
+    assert np.array_equal(np.isnan(actual), np.isnan(expected))
+    mask = ~np.isnan(expected)
+    np.testing.assert_allclose(actual[mask], expected[mask], rtol=rel, atol=abs)
+
+
+def test_ring_buffer_order_and_eviction():
+    buffer = RingBuffer(3)
+    assert [buffer.append(x) for x in range(5)] == [None, None, None, 0, 1]
+    assert list(buffer) == [2, 3, 4]
+    assert (buffer[0], buffer[-1]) == (2, 4)
+    with pytest.raises(IndexError):
+        buffer[3]
+
+
+@pytest.mark.parametrize("window", [2, 5, 20])
+def test_rolling_mean_matches_pandas(prices, window):
+    # 3000 个值跨过多次定期重新求和
+    assert_matches(stream(RollingMean(window), prices), prices.rolling(window).mean(), abs=1e-9)
+
+
+@pytest.mark.parametrize("window", [5, 20, 50])
+def test_rolling_std_matches_pandas(spreads, window):
+    # 窗口较小时 3000 个值会跨过多次定期重新计算
+    std = RollingStd(window)
+    assert_matches(stream(std, spreads), spreads.rolling(window).std())
+    assert std.mean == pytest.approx(spreads.iloc[-window:].mean(), abs=1e-11)
+
+
+def test_rolling_std_population(spreads):
+    assert_matches(stream(RollingStd(10, ddof=0), spreads), spreads.rolling(10).std(ddof=0))
+
+
+def test_rolling_std_constant_input_is_zero():
+    assert stream(RollingStd(5), [1.1] * 50)[-1] == 0.0
+
+
+@pytest.mark.parametrize("period", [1, 9, 26])
+def test_ema_matches_pandas(prices, period):
+    expected = seeded_ewm(prices, period, 2.0 / (period + 1)).reindex(prices.index)
+    assert_matches(stream(EMA(period), prices), expected, abs=1e-9)
+
+
+def test_wilder_ma_matches_pandas(prices):
+    expected = seeded_ewm(prices, 14, 1.0 / 14).reindex(prices.index)
+    assert_matches(stream(WilderMA(14), prices), expected, abs=1e-9)
+
+
+def test_atr_matches_pandas(prices):
+    rng = np.random.default_rng(8)
+    high = prices + rng.uniform(0, 30, len(prices))
+    low = prices - rng.uniform(0, 30, len(prices))
+    prev_close = prices.shift()
+    true_range = pd.concat([high - low, (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
+    expected = seeded_ewm(true_range, 14, 1.0 / 14).reindex(prices.index)
+
+    atr = ATR(14)
+    actual = np.array([np.nan if v is None else v for v in map(atr.update, high, low, prices)])
+    assert_matches(actual, expected, abs=1e-9)
+
+
+def test_rsi_matches_pandas(prices):
+    change = prices.diff()
+    gain = seeded_ewm(change.clip(lower=0), 14, 1.0 / 14)
+    loss = seeded_ewm((-change).clip(lower=0), 14, 1.0 / 14)
+    expected = (100 - 100 / (1 + gain / loss)).reindex(prices.index)
+    assert_matches(stream(RSI(14), prices), expected, abs=1e-9)
+
+
+def test_rsi_without_losses():
+    assert stream(RSI(3), [1, 2, 3, 4])[-1] == 100.0
+    assert stream(RSI(3), [1, 1, 1, 1])[-1] == 50.0
+
+
+def test_macd_matches_pandas(prices):
+    fast = seeded_ewm(prices, 12, 2.0 / 13).reindex(prices.index)
+    slow = seeded_ewm(prices, 26, 2.0 / 27).reindex(prices.index)
+    macd = fast - slow
+    signal = seeded_ewm(macd, 9, 2.0 / 10).reindex(prices.index)
+
+    indicator = MACD()
+    values = [indicator.update(x) for x in prices]
+    actual = np.array([[np.nan if v is None else v for v in value] for value in values])
+    assert_matches(actual[:, 0], macd, abs=1e-9)
+    assert_matches(actual[:, 1], signal, abs=1e-9)
+    assert_matches(actual[:, 2], macd - signal, abs=1e-9)
+
+
+def test_bollinger_matches_pandas(spreads):
+    mid = spreads.rolling(20).mean()
+    std = spreads.rolling(20).std()
+
+    indicator = Bollinger(20, std_multiplier=2)
+    values = [indicator.update(x) for x in spreads]
+    actual = np.array([[np.nan if v is None else v for v in value] for value in values])
+    assert_matches(actual[:, 0], mid)
+    assert_matches(actual[:, 1], mid + 2 * std)
+    assert_matches(actual[:, 2], mid - 2 * std)
+
+
+@pytest.mark.parametrize("window", [1, 20])
+def test_donchian_matches_pandas(prices, window):
+    rng = np.random.default_rng(9)
+    high = prices + rng.uniform(0, 30, len(prices))
+    low = prices - rng.uniform(0, 30, len(prices))
+    upper, lower = high.rolling(window).max(), low.rolling(window).min()
+
+    indicator = Donchian(window)
+    values = [indicator.update(h, l) for h, l in zip(high, low)]
+    actual = np.array([[np.nan if v is None else v for v in value] for value in values])
+    assert_matches(actual[:, 0], upper, abs=0)
+    assert_matches(actual[:, 1], lower, abs=0)
+    assert_matches(actual[:, 2], (upper + lower) / 2, abs=0)
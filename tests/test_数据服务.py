@@ -0,0 +1,189 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import 数据服务
+from 数据服务 import INTERVAL_MS, KlineDownloader, RequestWeightLimiter
+from 网络请求 import HttpClient
+
+HOUR_MS = INTERVAL_MS["1h"]
+START_MS = 1704067200000  # 2024-01-01 00:00:00 UTC
+
+
+class KlineStandIn(ThreadingHTTPServer):
+    """本地的币安K线接口替身：按 startTime/endTime/limit 生成连续K线
+
+    failures 为依次返回的限频响应 [(状态码, Retry-After), ...]，用完后正常返回；
+    每个请求的参数记录在 requests 中，响应头带上累计的请求权重。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, failures=(), weight=5):
+        super().__init__(("127.0.0.1", 0), KlineHandler)
+        self.failures = list(failures)
+        self.weight = weight
+        self.used_weight = 0
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/fapi/v1/klines"
+
+
+class KlineHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        params = {key: values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+        with server.lock:
+            server.requests.append(params)
+            server.used_weight += server.weight
+            used = server.used_weight
+            failure = server.failures.pop(0) if server.failures else None
+
+        if failure is not None:
+            status, retry_after = failure
+            self.send_response(status)
+            self.send_header("Retry-After", str(retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        step = INTERVAL_MS[params["interval"]]
+        start, end, limit = int(params["startTime"]), int(params["endTime"]), int(params["limit"])
+        first = -(-start // step) * step
+        rows = [[t, "1", "2", "0.5", "1.5", "10", t + step - 1, "0", 1, "0", "0", "0"]
+                for t in range(first, end + 1, step)][:limit]
+        body = json.dumps(rows).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-MBX-USED-WEIGHT-1M", str(used))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stand_in(request):
+    server = KlineStandIn(failures=getattr(request, "param", ()))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_downloader(server, **kwargs):
+    return KlineDownloader(base_url=server.url, session=HttpClient(timeout=5), **kwargs)
+
+
+def test_split_windows_covers_range_without_overlap():
+    downloader = KlineDownloader(base_url="http://127.0.0.1:9", limit=100)
+    end_ms = START_MS + 250 * HOUR_MS
+    windows = downloader.split_windows("1h", START_MS, end_ms)
+    assert windows == [
+        (START_MS, START_MS + 100 * HOUR_MS - 1),
+        (START_MS + 100 * HOUR_MS, START_MS + 200 * HOUR_MS - 1),
+        (START_MS + 200 * HOUR_MS, end_ms - 1)
+    ]
+
+
+def test_download_stitches_parallel_windows_in_order(stand_in):
+    downloader = make_downloader(stand_in, limit=100, max_workers=4)
+    progress = []
+    rows = downloader.download("BTCUSDT", "1h", START_MS, START_MS + 1050 * HOUR_MS, progress=progress.append)
+
+    assert len(stand_in.requests) == 11
+    assert {int(r["startTime"]) for r in stand_in.requests} == {START_MS + i * 100 * HOUR_MS for i in range(11)}
+    assert [row[0] for row in rows] == [START_MS + i * HOUR_MS for i in range(1050)]
+    assert progress[-1] == 1050
+    # 响应头中交易所返回的已用权重会校正本地计数
+    assert downloader.limiter.used >= stand_in.used_weight
+
+
+@pytest.mark.parametrize("stand_in", [[(429, 0.3), (418, 0.2)]], indirect=True)
+def test_rate_limit_responses_honour_retry_after(stand_in):
+    downloader = make_downloader(stand_in, limit=100, max_workers=1)
+    waits = []
+    block_for = downloader.limiter.block_for
+    downloader.limiter.block_for = lambda seconds: (waits.append(seconds), block_for(seconds))
+
+    rows = downloader.download("BTCUSDT", "1h", START_MS, START_MS + 100 * HOUR_MS)
+
+    assert waits == [0.3, 0.2]
+    assert len(stand_in.requests) == 3
+    assert len(rows) == 100
+
+
+@pytest.mark.parametrize("stand_in", [[(429, 0)] * 3], indirect=True)
+def test_rate_limit_retries_are_bounded(stand_in):
+    downloader = make_downloader(stand_in, limit=100, max_retries=2)
+    with pytest.raises(Exception):
+        downloader.download("BTCUSDT", "1h", START_MS, START_MS + 100 * HOUR_MS)
+    assert len(stand_in.requests) == 3
+
+
+class FakeClock:
+    """替换 数据服务.time 的假时钟，sleep 只推进时间"""
+
+    def __init__(self, now):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_weight_limiter_keeps_each_minute_within_budget(monkeypatch):
+    clock = FakeClock(1_000_020.0)  # 窗口从 1_000_020 开始，整分钟对齐
+    monkeypatch.setattr(数据服务, "time", clock)
+    limiter = RequestWeightLimiter(weight_limit=20, window=60)
+
+    granted = []
+    for _ in range(10):
+        limiter.acquire(5)
+        granted.append(clock.now)
+
+    # 每 60 秒窗口最多放行 20 / 5 = 4 次，超出的请求等到下一个窗口开始
+    windows = [int(t // 60) for t in granted]
+    assert all(windows.count(w) <= 4 for w in set(windows))
+    assert granted[:4] == [1_000_020.0] * 4
+    assert granted[4] == pytest.approx(1_000_080.0)
+    assert granted[8] == pytest.approx(1_000_140.0)
+
+
+def test_weight_limiter_uses_exchange_reported_weight(monkeypatch):
+    clock = FakeClock(1_000_020.0)
+    monkeypatch.setattr(数据服务, "time", clock)
+    limiter = RequestWeightLimiter(weight_limit=20, window=60)
+
+    limiter.acquire(5)
+    limiter.update(18)  # 交易所统计的权重包含其他程序的请求
+    limiter.acquire(5)
+    assert clock.now == pytest.approx(1_000_080.0)
+
+
+def test_weight_limiter_pauses_all_requests_after_rate_limit(monkeypatch):
+    clock = FakeClock(1_000_020.0)
+    monkeypatch.setattr(数据服务, "time", clock)
+    limiter = RequestWeightLimiter(weight_limit=20, window=60)
+
+    limiter.acquire(5)
+    limiter.block_for(7)
+    assert clock.now == pytest.approx(1_000_027.0)
+    # 其他线程在 Retry-After 到期前发起的请求也要等待，到期后本窗口剩余预算照常可用
+    clock.now = 1_000_023.0
+    limiter.acquire(5)
+    assert clock.now == pytest.approx(1_000_027.0)
+    assert limiter.used == 10
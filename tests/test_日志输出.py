@@ -0,0 +1,63 @@
+import threading
+
+from 日志输出 import LogBuffer
+
+
+def test_capacity_drops_oldest_and_counts():
+    buffer = LogBuffer(capacity=3)
+    for i in range(5):
+        buffer.write(f"{i}\n")
+    assert buffer.drain() == (["2\n", "3\n", "4\n"], 2)
+    # 取走后积压和丢弃计数都清零
+    assert buffer.drain() == ([], 0)
+
+    buffer.write("5\n")
+    buffer.clear()
+    assert buffer.drain() == ([], 0)
+
+
+def test_concurrent_writers_lose_nothing_within_capacity():
+    buffer = LogBuffer(capacity=10000)
+
+    def writer(name):
+        for i in range(1000):
+            buffer.write(f"{name}{i}\n")
+
+    threads = [threading.Thread(target=writer, args=(name,)) for name in "abcd"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    lines, dropped = buffer.drain()
+    assert dropped == 0
+    assert sorted(lines) == sorted(f"{name}{i}\n" for name in "abcd" for i in range(1000))
+
+
+def test_batches_spill_to_file_including_dropped(tmp_path):
+    path = tmp_path / "logs" / "app.log"
+    buffer = LogBuffer(capacity=2, file_path=str(path), spill_batch=3)
+    for i in range(7):
+        buffer.write(f"line {i}\n")
+    # 攒够一批才写文件，被界面缓冲丢弃的记录也写入
+    assert path.read_text(encoding="utf-8") == "".join(f"line {i}\n" for i in range(6))
+    assert buffer.drain() == (["line 5\n", "line 6\n"], 5)
+
+    buffer.close_file()
+    assert path.read_text(encoding="utf-8") == "".join(f"line {i}\n" for i in range(7))
+    # 关闭文件后只写入界面缓冲
+    buffer.write("after\n")
+    buffer.flush_file()
+    assert "after" not in path.read_text(encoding="utf-8")
+
+
+def test_spill_file_rotates_by_size(tmp_path):
+    path = tmp_path / "app.log"
+    buffer = LogBuffer(file_path=str(path), max_bytes=100, backup_count=2, spill_batch=1)
+    for i in range(30):
+        buffer.write(f"{i:02d} " + "x" * 20 + "\n")
+    buffer.close_file()
+
+    files = sorted(p.name for p in tmp_path.iterdir())
+    assert files == ["app.log", "app.log.1", "app.log.2"]
+    assert all(p.stat().st_size <= 100 for p in tmp_path.iterdir())
+    assert path.read_text(encoding="utf-8").endswith("29 " + "x" * 20 + "\n")
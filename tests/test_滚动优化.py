@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from conftest import make_klines
+from 参数优化 import _init_worker
+from 回测引擎 import BacktestConfig
+from 滚动优化 import WalkForward, _run_out_of_sample, stitch_equity
+
+# 只在看到第 window 个tick时做多一次，之后一直持有
+COUNTING_STRATEGY = """
+window = 44
+seen = 0
+
+def trade_signal(time, price):
+    global seen
+    seen += 1
+    return "做多" if seen == window else None
+"""
+
+# 只在第 window 根K线做多一次
+BATCH_STRATEGY = """
+import numpy as np
+
+window = 12
+
+def trade_signals(times, opens, highs, lows, closes, volumes):
+    return np.where(np.arange(len(closes)) == window, "做多", None)
+"""
+
+
+def config():
+    return BacktestConfig(initial_margin=1000, fixed_margin=100, leverage=10, fee_rate=0)
+
+
+@pytest.mark.parametrize("code", [COUNTING_STRATEGY, BATCH_STRATEGY])
+def test_out_of_sample_is_warmed_up_on_in_sample_bars(code):
+    df = make_klines(60, seed=1)
+    _init_worker(code, df, config())
+
+    # 样本外只有5根K线（20个tick），冷启动的指标来不及进入状态
+    cold = _run_out_of_sample({}, 50, 55)
+    assert cold["error"] == ""
+    assert cold["open_orders"] == 0
+    assert len(cold["equity"]) == 5 * cold["ticks_per_bar"]
+
+    # 用样本内K线预热后，信号在样本外开始前就已具备条件，预热期间不下单
+    warm = _run_out_of_sample({}, 50, 55, warmup_start=40)
+    assert warm["error"] == ""
+    assert warm["open_orders"] == 1
+    assert warm["trades"] == []
+    assert len(warm["equity"]) == 5 * warm["ticks_per_bar"]
+    assert warm["equity"][-1] != 1000
+
+
+def test_stitch_carries_open_positions_into_next_window():
+    windows = [
+        {"样本外起": 10, "样本外时间": "t10", "样本外": {"equity": np.array([1000.0, 1050.0, 1100.0, 1100.0]),
+                                                   "ticks_per_bar": 2, "trades": []}},
+        {"样本外起": 12, "样本外时间": "t12", "样本外": None},
+        {"样本外起": 14, "样本外时间": "t14", "样本外": {"equity": np.array([950.0, 900.0]),
+                                                   "ticks_per_bar": 2, "trades": []}},
+    ]
+    curve = stitch_equity(windows, 1000, bar_label=lambda i: f"t{i}")
+
+    # 第一个窗口没有平仓，浮动盈利仍带入下一个窗口，并按窗口开始时的权益等比例缩放
+    assert curve[0] == ("t10", 1000)
+    assert [time for time, _ in curve[1:]] == ["t10", "t10", "t11", "t11", "t14", "t14"]
+    assert [equity for _, equity in curve[1:]] == pytest.approx([1000, 1050, 1100, 1100, 1045, 990])
+
+
+def test_walk_forward_curve_includes_unrealized_pnl(rising_klines):
+    df = rising_klines.iloc[:300]
+    walk_forward = WalkForward(COUNTING_STRATEGY, df, config(), train_bars=100, test_bars=50, max_workers=1)
+    windows, curve, summary = walk_forward.run({"window": [402, 404]})
+
+    assert summary["窗口数"] == 4
+    assert summary["样本外交易次数"] == 0
+    # 样本内400个tick不足以触发信号；预热后样本外第2个tick做多且从不平仓，资金曲线仍然随行情上涨
+    assert all(window["样本外"]["open_orders"] == 1 for window in windows)
+    assert len(curve) == 1 + 4 * 50 * 4
+    assert curve[-1][1] > curve[0][1]
+    assert summary["样本外收益率"] > 0
+    assert curve[1][0] == df.index[100].strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,63 @@
+import pytest
+
+from conftest import make_klines
+from 回测引擎 import BacktestConfig, BacktestEngine, build_strategy_namespace
+from 组合回测 import PortfolioBacktestEngine
+
+RANDOM_STRATEGY = """
+import random
+
+rng = random.Random(0)
+
+def trade_signal(time, price):
+    return rng.choices(["不操作", "做多", "做空", "平多", "平空"], [0.9, 0.03, 0.03, 0.02, 0.02])[0]
+"""
+
+
+def two_symbol_frames(n=500):
+    return {"BTCUSDT": make_klines(n, 1), "ETHUSDT": make_klines(n, 2)}
+
+
+def test_portfolio_runs_every_tick_without_error():
+    frames = two_symbol_frames()
+    result = PortfolioBacktestEngine(BacktestConfig(initial_margin=100000), RANDOM_STRATEGY).run(frames)
+    assert result.error is None
+    assert result.ticks == sum(len(df) for df in frames.values()) * 4
+    assert len(result.trade_orders) > 1
+
+
+def test_symbols_keep_independent_strategy_state_and_books():
+    frames = two_symbol_frames()
+    config = BacktestConfig(initial_margin=100000)
+    result = PortfolioBacktestEngine(config, RANDOM_STRATEGY).run(frames)
+
+    for symbol, df in frames.items():
+        # 保证金充足时，每个交易对的成交与单独回测该交易对完全相同（订单序号除外）
+        single = BacktestEngine(config, build_strategy_namespace(RANDOM_STRATEGY)["trade_signal"]).run(df)
+        trades = [t for t in result.trade_orders if t["symbol"] == symbol]
+        assert [(t["time"], t["action"], t["profit"]) for t in trades] == \
+            [(t["time"], t["action"], t["profit"]) for t in single.trade_orders]
+        stats = result.symbol_summary[symbol]
+        assert stats["交易次数"] == len(trades) > 0
+        assert stats["总盈亏"] == round(sum(t["profit"] for t in trades), 2)
+        assert stats["总手续费"] == round(sum(t["total_fee"] for t in trades), 2)
+        assert stats["未平仓数"] == sum(1 for o in result.open_orders if o["symbol"] == symbol)
+
+    assert result.summary["交易次数"] == len(result.trade_orders) == \
+        sum(stats["交易次数"] for stats in result.symbol_summary.values())
+    # 共用一个保证金账户：余额 + 占用保证金 = 初始金额 + 已平仓净盈亏 - 未平仓的开仓手续费
+    closed = sum(t["profit"] - t["total_fee"] for t in result.trade_orders)
+    locked = sum(o["margin"] for o in result.open_orders)
+    open_fees = sum(o["fee"] for o in result.open_orders)
+    assert result.final_margin + locked == pytest.approx(config.initial_margin + closed - open_fees)
+
+
+def test_margin_pool_is_shared_between_symbols():
+    always_long = 'def trade_signal(time, price):\n    return "做多"\n'
+    config = BacktestConfig(initial_margin=150, fixed_margin=100, enable_liquidation=False)
+    result = PortfolioBacktestEngine(config, always_long).run(two_symbol_frames(50))
+
+    # 第一个tick由 BTCUSDT 开仓后余额不足 100，ETHUSDT 始终无法开仓
+    assert [o["symbol"] for o in result.open_orders] == ["BTCUSDT"]
+    assert result.symbol_summary["ETHUSDT"]["未平仓数"] == 0
+    assert result.final_margin == pytest.approx(150 - 100 - result.open_orders[0]["fee"])
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from conftest import random_tick_strategy
+from 回测引擎 import BacktestConfig, BacktestEngine
+from 绩效统计 import MetricsAccumulator, decimate_minmax, equity_metrics
+
+
+def test_accumulator_starts_from_first_equity_sample():
+    metrics = MetricsAccumulator()
+    metrics.update_equity(500.0, False, now=0)
+    metrics.update_equity(400.0, True, now=1)
+    metrics.update_equity(450.0, False, now=3)
+    snapshot = metrics.snapshot(now=4)
+    # 起点为第一次的 500，而不是任何预设的初始金额
+    assert snapshot["最大回撤"] == 20.0
+    assert metrics.peak == 500.0
+
+
+def test_accumulator_with_initial_peak():
+    metrics = MetricsAccumulator(1000.0)
+    metrics.update_equity(500.0, False, now=0)
+    assert metrics.snapshot(now=0)["最大回撤"] == 50.0
+
+
+def test_accumulator_matches_backtest_summary(klines):
+    config = BacktestConfig(initial_margin=100000)
+    # 实测运行时由逐tick循环在每个tick和每笔平仓时更新
+    engine = BacktestEngine(config, random_tick_strategy(0))
+    engine.metrics = metrics = MetricsAccumulator(config.initial_margin)
+    result = engine.run(klines)
+    snapshot = metrics.snapshot()
+
+    assert snapshot["交易次数"] == len(result.trade_orders)
+    for key in ["胜率", "夏普比率", "标准差"]:
+        assert snapshot[key] == pytest.approx(result.summary[key], abs=0.011)
+    expected = equity_metrics(result.equity, result.exposure, config.initial_margin)
+    assert snapshot["最大回撤"] == pytest.approx(expected["最大回撤"], abs=0.011)
+    assert np.isfinite(snapshot["平均盈亏"])
+
+
+def max_drawdown(values):
+    peak = np.maximum.accumulate(values)
+    return float(((peak - values) / peak).max())
+
+
+@pytest.mark.parametrize("n, max_points", [(100001, 200), (12345, 99), (1000, 7)])
+def test_decimation_keeps_drawdown_extremes(n, max_points):
+    rng = np.random.default_rng(n)
+    equity = 1000 + np.cumsum(rng.normal(0, 1, n))
+    # 单个tick的插针高点和低点，最大回撤就在这两点之间
+    equity[n // 3] = equity.max() + 500
+    equity[n // 3 * 2] = equity.min() - 300
+
+    keep = decimate_minmax(equity, max_points)
+    assert len(keep) <= max_points + 2
+    assert np.all(np.diff(keep) > 0)
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert {n // 3, n // 3 * 2} <= set(keep.tolist())
+    assert max_drawdown(equity[keep]) == max_drawdown(equity)
+    assert equity[keep].max() == equity.max() and equity[keep].min() == equity.min()
+
+
+def test_decimation_keeps_short_series():
+    assert decimate_minmax([1.0, 2.0, 3.0], 10).tolist() == [0, 1, 2]
+    assert decimate_minmax([], 10).tolist() == []
@@ -0,0 +1,59 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from binance.client import Client
+
+from 网络请求 import ClientSession, HttpClient
+
+
+class HeaderEcho(BaseHTTPRequestHandler):
+    """把收到的请求头原样返回"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def echo(self):
+        body = json.dumps(dict(self.headers)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_DELETE = echo
+
+
+@pytest.fixture
+def echo_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), HeaderEcho)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/fapi/v1/echo"
+    server.shutdown()
+    server.server_close()
+
+
+def test_api_key_stays_on_bound_client(echo_url):
+    http = HttpClient()
+    client = http.bind_binance_client(Client("my-key", "my-secret", ping=False))
+
+    assert isinstance(client.session, ClientSession)
+    assert "X-MBX-APIKEY" not in http.headers
+    # 共用连接池的其他请求不带 API Key，普通请求头照常保留
+    shared = http.get(echo_url).json()
+    assert "X-MBX-APIKEY" not in shared
+    assert shared["User-Agent"].startswith("Mozilla/5.0")
+
+    signed = client.session.post(echo_url, headers={"Content-Type": "application/x-www-form-urlencoded"}).json()
+    assert signed["X-MBX-APIKEY"] == "my-key"
+    assert signed["Content-Type"] == "application/x-www-form-urlencoded"
+    assert "POST /fapi/v1/echo" in http.stats()
+
+
+def test_each_client_keeps_its_own_api_key(echo_url):
+    http = HttpClient()
+    first = http.bind_binance_client(Client("key-1", "secret", ping=False))
+    second = http.bind_binance_client(Client("key-2", "secret", ping=False))
+    assert first.session.get(echo_url).json()["X-MBX-APIKEY"] == "key-1"
+    assert second.session.get(echo_url).json()["X-MBX-APIKEY"] == "key-2"
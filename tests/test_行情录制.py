@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from 行情录制 import (KLINE, MARK, TICK_LOG_HEADER_SIZE, TICK_RECORD_DTYPE, TRADE, TickLog, TickRecorder,
+                  recorded_events)
+
+
+def write_log(path, rows, batch=4):
+    recorder = TickRecorder(str(path), "BTCUSDT", batch=batch)
+    for row in rows:
+        recorder.record(*row)
+    return recorder
+
+
+ROWS = [(TRADE, 1000 + i, 100.0 + i * 0.5, 1700000000.0 + i * 0.25) for i in range(10)]
+
+
+def test_round_trip_through_memmap(tmp_path):
+    path = tmp_path / "BTCUSDT.ticks"
+    recorder = write_log(path, ROWS)
+    # 每攒够 batch 条写入一次，剩余的留在缓冲区
+    assert recorder.recorded == 10
+    assert path.stat().st_size == TICK_LOG_HEADER_SIZE + 8 * TICK_RECORD_DTYPE.itemsize
+    recorder.close()
+    assert TICK_RECORD_DTYPE.itemsize == 25
+    assert path.stat().st_size == TICK_LOG_HEADER_SIZE + 10 * 25
+
+    log = TickLog(str(path))
+    assert log.symbol == "BTCUSDT"
+    assert len(log) == 10
+    assert isinstance(log.records, np.memmap)
+    assert log.records["kind"].tolist() == [TRADE] * 10
+    assert log.records["time"].tolist() == [row[1] for row in ROWS]
+    assert log.records["price"].tolist() == [row[2] for row in ROWS]
+    assert log.records["received"].tolist() == [row[3] for row in ROWS]
+    assert log.duration == pytest.approx(2.25)
+
+
+def test_append_keeps_single_header_and_ignores_partial_record(tmp_path):
+    path = tmp_path / "BTCUSDT.ticks"
+    write_log(path, ROWS[:3]).close()
+    recorder = TickRecorder(str(path), "BTCUSDT")
+    recorder.record_event({"type": "mark", "time": 2000, "price": 99.0})
+    recorder.record_event({"type": "kline", "close_time": 3599999, "close": 98.0, "time": 0})
+    recorder.close()
+    # 模拟写入最后一条记录时进程退出
+    with open(path, "ab") as f:
+        f.write(b"\x01" * 10)
+
+    log = TickLog(str(path))
+    assert len(log) == 5
+    assert log.records["kind"].tolist() == [TRADE, TRADE, TRADE, MARK, KLINE]
+    assert log.records["time"].tolist()[-2:] == [2000, 3599999]
+    assert log.records["price"].tolist()[-2:] == [99.0, 98.0]
+
+
+def test_empty_and_foreign_files(tmp_path):
+    path = tmp_path / "empty.ticks"
+    TickRecorder(str(path), "ETHUSDT").close()
+    log = TickLog(str(path))
+    assert (log.symbol, len(log), log.duration) == ("ETHUSDT", 0, 0.0)
+
+    other = tmp_path / "other.ticks"
+    other.write_bytes(b"not a tick log" * 4)
+    with pytest.raises(ValueError):
+        TickLog(str(other))
+
+
+def test_recorded_events_follow_trigger(tmp_path):
+    path = tmp_path / "BTCUSDT.ticks"
+    write_log(path, [(TRADE, 1, 10.0, 0.0), (MARK, 2, 11.0, 0.0), (KLINE, 3, 12.0, 0.0)]).close()
+    log = TickLog(str(path))
+
+    # 逐笔成交触发时K线记录不产生事件，标记价格只用于强平检查
+    by_trade = list(recorded_events(log, "逐笔成交", chunk=2))
+    assert [event["price"] for event in by_trade] == [10.0, None]
+    assert [(event["low"], event["high"]) for event in by_trade] == [(10.0, 10.0), (11.0, 11.0)]
+
+    by_kline = list(recorded_events(log, "K线收盘", chunk=2))
+    assert [event["price"] for event in by_kline] == [None, None, 12.0]
+    assert [event["time"] for event in by_kline] == [1, 2, 3]
+    assert all(event["symbol"] == "BTCUSDT" for event in by_kline)
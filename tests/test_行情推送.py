@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+
+import pytest
+from websockets.datastructures import Headers
+from websockets.exceptions import ConnectionClosed
+from websockets.http11 import Response
+from websockets.sync.server import serve
+
+import 行情推送
+from 行情推送 import MarketDataFeed, TickConflator
+
+
+def trade(price, ms=1):
+    return json.dumps({"stream": "btcusdt@aggTrade",
+                       "data": {"e": "aggTrade", "s": "BTCUSDT", "T": ms, "p": str(price), "q": "1"}})
+
+
+def mark(price, ms=1):
+    return json.dumps({"stream": "btcusdt@markPrice@1s",
+                       "data": {"e": "markPriceUpdate", "s": "BTCUSDT", "E": ms, "p": str(price)}})
+
+
+def kline(close, closed=True, ms=0):
+    return json.dumps({"stream": "btcusdt@kline_1h", "data": {"e": "kline", "s": "BTCUSDT", "k": {
+        "t": ms, "T": ms + 3599999, "i": "1h", "o": "10", "h": "12", "l": "8", "c": str(close), "v": "5",
+        "x": closed}}})
+
+
+class StreamStandIn:
+    """本地的币安组合推送替身
+
+    scripts 为依次接入的连接要执行的脚本，每个脚本是 (消息列表, 结束方式)：
+    "close" 发完消息后由服务端关闭连接，"hold" 发完消息后不再推送，直到客户端断开；
+    "reject" 直接以 503 拒绝握手。脚本用完后的连接都按 "hold" 处理。
+    """
+
+    def __init__(self, scripts):
+        self.scripts = list(scripts)
+        self.paths = []
+        self.lock = threading.Lock()
+        self.server = serve(self.handler, "127.0.0.1", 0, process_request=self.process_request)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.server.socket.getsockname()[1]}"
+
+    def process_request(self, connection, request):
+        with self.lock:
+            self.paths.append(request.path)
+            if self.scripts and self.scripts[0][1] == "reject":
+                self.scripts.pop(0)
+                return Response(503, "Service Unavailable", Headers())
+            connection.script = self.scripts.pop(0) if self.scripts else ([], "hold")
+        return None
+
+    def handler(self, connection):
+        messages, ending = connection.script
+        try:
+            for message in messages:
+                connection.send(message)
+            if ending == "hold":
+                for _ in connection:
+                    pass
+        except ConnectionClosed:
+            pass
+
+
+@pytest.fixture
+def stand_in(request):
+    server = StreamStandIn(request.param)
+    server.thread.start()
+    yield server
+    server.server.shutdown()
+
+
+class RecordingEvent(threading.Event):
+    """记录重连退避时长的停止事件，退避不真正等待"""
+
+    def __init__(self):
+        super().__init__()
+        self.waits = []
+
+    def wait(self, timeout=None):
+        if timeout is not None:
+            self.waits.append(timeout)
+            timeout = 0.01
+        return super().wait(timeout)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+def make_feed(server, on_event, **kwargs):
+    feed = MarketDataFeed("BTCUSDT", "1h", on_event, base_url=server.url, **kwargs)
+    feed._stop = RecordingEvent()
+    return feed
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    # 抖动系数固定为 1，退避时长正好是 min(2 ** attempt, max_backoff)
+    monkeypatch.setattr(行情推送.random, "random", lambda: 0.5)
+
+
+@pytest.mark.parametrize("stand_in", [[
+    ([trade(10)], "close"),
+    ([], "reject"),
+    ([], "reject"),
+    ([trade(11)], "hold")
+]], indirect=True)
+def test_reconnects_with_exponential_backoff_after_server_close(stand_in):
+    events, statuses = [], []
+    feed = make_feed(stand_in, events.append, on_status=statuses.append)
+    feed.start()
+    wait_until(lambda: len(events) == 2)
+    feed.stop(wait=True)
+
+    assert [event["price"] for event in events] == [10.0, 11.0]
+    assert feed.reconnects == 3
+    # 服务端关闭后立即重连，握手被拒绝时退避逐次翻倍
+    assert feed._stop.waits == [2, 4, 8]
+    assert stand_in.paths[0] == "/stream?streams=btcusdt@aggTrade/btcusdt@markPrice@1s/btcusdt@kline_1h"
+    assert len(stand_in.paths) == 4
+    assert statuses.count("行情推送已连接: BTCUSDT") == 2
+    assert statuses[-1] == "行情推送已停止: BTCUSDT"
+    assert not feed.running
+
+
+@pytest.mark.parametrize("stand_in", [[([], "reject")] * 4 + [([trade(10)], "close"), ([trade(11)], "hold")]],
+                         indirect=True)
+def test_backoff_is_capped_and_resets_after_connect(stand_in):
+    events = []
+    feed = make_feed(stand_in, events.append, max_backoff=5)
+    feed.start()
+    wait_until(lambda: len(events) == 2)
+    feed.stop(wait=True)
+
+    # 连接成功后退避从头开始
+    assert feed._stop.waits == [2, 4, 5, 5, 2]
+
+
+@pytest.mark.parametrize("stand_in", [[([trade(10)], "hold"), ([trade(11)], "hold")]], indirect=True)
+def test_heartbeat_timeout_forces_reconnect(stand_in):
+    events, statuses = [], []
+    feed = make_feed(stand_in, events.append, on_status=statuses.append, heartbeat_timeout=0.3)
+    feed.start()
+    wait_until(lambda: len(events) == 2)
+    feed.stop(wait=True)
+
+    assert feed.reconnects >= 1
+    assert any("0.3秒未收到行情" in text for text in statuses)
+    assert [event["price"] for event in events[:2]] == [10.0, 11.0]
+
+
+@pytest.mark.parametrize("stand_in", [[
+    ([trade(10, 1), trade(12, 2), mark(13, 3), trade(8, 4), kline(9, closed=False), trade(11, 5), kline(9)], "hold")
+]], indirect=True)
+def test_conflation_keeps_last_price_and_extremes(stand_in):
+    conflator = TickConflator()
+    feed = make_feed(stand_in, conflator.push)
+    feed.start()
+    wait_until(lambda: feed.messages == 7)
+    feed.stop(wait=True)
+
+    snapshot = conflator.take(timeout=1)
+    assert snapshot["price"] == 11.0
+    assert snapshot["time"] == 5
+    assert snapshot["high"] == 13.0
+    assert snapshot["low"] == 8.0
+    assert snapshot["mark"] == 13.0
+    assert snapshot["trades"] == 4
+    assert [k["close"] for k in snapshot["klines"]] == [9.0]
+    assert conflator.take_nowait() is None
+
+
+def test_take_waits_for_next_push():
+    conflator = TickConflator()
+    assert conflator.take(timeout=0.05) is None
+    threading.Timer(0.05, conflator.push, args=[{"type": "trade", "time": 1, "price": 10.0}]).start()
+    snapshot = conflator.take(timeout=5)
+    assert snapshot["price"] == snapshot["high"] == snapshot["low"] == 10.0
+    assert snapshot["trades"] == 1
@@ -0,0 +1,104 @@
+import itertools
+
+import pytest
+
+import 订单表格
+from 订单表格 import OrderTable
+
+
+class FakeWidget:
+    """不需要显示器的 ttk 控件替身，只记录表格和滚动条的内容"""
+
+    _ids = itertools.count()
+
+    def __init__(self, *args, **kwargs):
+        self.items = {}
+        self.scroll = None
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    def insert(self, parent, index):
+        item = f"I{next(self._ids)}"
+        self.items[item] = None
+        return item
+
+    def delete(self, item):
+        del self.items[item]
+
+    def item(self, item, values):
+        self.items[item] = values
+
+    def set(self, first, last):
+        self.scroll = (first, last)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    for name in ("Frame", "Treeview", "Scrollbar"):
+        monkeypatch.setattr(订单表格.ttk, name, FakeWidget)
+    return OrderTable(None, ["序号", "方向", "价格", "状态"], height=3)
+
+
+def shown(table):
+    return [table.tree.items[item] for item in table._items]
+
+
+def test_apply_pending_keeps_operation_order(table):
+    table.append((1, "做多", 100, "持仓"), key=1)
+    table.append((2, "做空", 101, "持仓"), key=2)
+    table.update(1, {"状态": "已平仓", "价格": 102})
+    # 没有该键的更新忽略
+    table.update(9, {"状态": "已平仓"})
+    assert len(table) == 0
+    assert table.apply_pending()
+    assert table.rows == [(1, "做多", 102, "已平仓"), (2, "做空", 101, "持仓")]
+    assert not table.apply_pending()
+
+
+def test_clear_resets_keys_before_later_operations(table):
+    table.append((1, "做多", 100, "持仓"), key=1)
+    table.clear()
+    table.update(1, {"状态": "已平仓"})
+    table.append((3, "做多", 103, "持仓"), key=3)
+    table.update(3, {"状态": "强平"})
+    table.apply_pending()
+    assert table.rows == [(3, "做多", 103, "强平")]
+    assert table._keys == {3: 0}
+    assert (table.top, table.follow) == (0, True)
+
+
+def test_update_after_rows_scrolled_out(table):
+    for i in range(10):
+        table.append((i, "做多", 100 + i, "持仓"), key=i)
+    table.apply_pending()
+    table.update(0, {"状态": "已平仓"})
+    table.apply_pending()
+    assert table.rows[0] == (0, "做多", 100, "已平仓")
+    assert table.rows[1:] == [(i, "做多", 100 + i, "持仓") for i in range(1, 10)]
+
+
+def test_render_shows_only_visible_rows_and_follows_bottom(table):
+    for i in range(5):
+        table.append((i, "做多", 100 + i, "持仓"), key=i)
+    table.apply_pending()
+    table.render()
+    # Treeview 里只有 height 行，停在底部时显示最新的行
+    assert len(table.tree.items) == 3
+    assert [row[0] for row in shown(table)] == [2, 3, 4]
+    assert table.scrollbar.scroll == (0.4, 1.0)
+
+    table.on_scroll("moveto", 0)
+    assert [row[0] for row in shown(table)] == [0, 1, 2]
+    assert not table.follow
+    # 向上翻看时新行不会把视野拉回底部
+    table.append((5, "做多", 105, "持仓"))
+    table.apply_pending()
+    table.render()
+    assert [row[0] for row in shown(table)] == [0, 1, 2]
+
+    table.clear()
+    table.apply_pending()
+    table.render()
+    assert table.tree.items == {}
+    assert table.scrollbar.scroll == (0, 1)
@@ -0,0 +1,91 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import 币安量化框架 as gui
+from 持仓账本 import PositionBook
+from 延迟统计 import LatencyRecorder
+from 账户推送 import AccountMirror
+
+
+def order_update(order_id, status, price=100.0, quantity=1.0):
+    return {"e": "ORDER_TRADE_UPDATE", "o": {
+        "i": order_id, "s": "BTCUSDT", "S": "BUY", "ps": "LONG", "X": status, "x": "TRADE",
+        "q": str(quantity), "z": str(quantity if status == "FILLED" else 0), "ap": str(price),
+        "n": "0.05", "rp": "0", "T": 1}}
+
+
+def test_watch_order_calls_back_when_fill_arrives():
+    mirror = AccountMirror()
+    fills = []
+    mirror.watch_order(7, fills.append)
+    mirror.apply(order_update(7, "NEW"))
+    assert fills == []
+    mirror.apply(order_update(7, "FILLED", price=101.0))
+    assert [(fill["status"], fill["avg_price"]) for fill in fills] == [("FILLED", 101.0)]
+    # 回调只触发一次
+    mirror.apply(order_update(7, "FILLED"))
+    assert len(fills) == 1
+
+
+def test_watch_order_calls_back_immediately_if_already_filled():
+    mirror = AccountMirror()
+    mirror.apply(order_update(7, "FILLED"))
+    fills = []
+    mirror.watch_order(7, fills.append)
+    assert len(fills) == 1
+    assert fills[0]["received"] <= time.perf_counter()
+
+
+def test_add_stage_counts_late_stage_once():
+    recorder = LatencyRecorder()
+    early = recorder.begin("开仓")
+    recorder.add_stage(early, "成交回报", 0.01)
+    recorder.finish(early)
+    late = recorder.begin("开仓")
+    recorder.finish(late)
+    recorder.add_stage(late, "成交回报", 0.03)
+
+    summary = recorder.summary()
+    assert summary[("开仓", "成交回报")]["次数"] == 2
+    assert summary[("开仓", "成交回报")]["最大ms"] == 30.0
+    assert summary[("开仓", "总耗时")]["次数"] == 2
+
+
+class Var:
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+def test_live_open_does_not_wait_for_fill_push():
+    mirror = AccountMirror()
+    client = SimpleNamespace(futures_create_order=lambda **kwargs: {"orderId": 42})
+    self = SimpleNamespace(
+        order_mode=Var("固定保证金模式"), fixed_margin=Var(100), percentage_margin=Var(10),
+        current_margin=Var(1000), leverage=Var(10), fee_rate=Var(0.05),
+        adjust_quantity=lambda symbol, quantity, price=None: quantity,
+        binance_client=client, account_mirror=mirror, latency=LatencyRecorder(), log=lambda text: None,
+        trade_count=0, positions=PositionBook(), order_sequence=1,
+        live_order_table=SimpleNamespace(append=lambda row, key=None: None)
+    )
+    trace = self.latency.begin()
+
+    started = time.perf_counter()
+    gui.TradingEngine.live_signal(self, "BTCUSDT", "2024-01-01 00:00:00", 100.0, "做多", trace)
+    assert time.perf_counter() - started < 0.5
+    assert len(self.positions) == 1
+    assert "成交回报" not in trace.stages
+    self.latency.finish(trace)
+
+    # 推送稍后到达时补记成交回报
+    mirror.apply(order_update(42, "FILLED"))
+    stats = self.latency.summary()[("开仓", "成交回报")]
+    assert stats["次数"] == 1
+    assert trace.stages["成交回报"] == pytest.approx(stats["最大ms"] / 1000, abs=1e-5)
@@ -0,0 +1,88 @@
+import zipfile
+
+import numpy as np
+import pytest
+
+from 逐笔回放 import ReplayTicks, detect_kind, read_chunks, thin_chunks, thin_ticks
+
+
+def agg_trades(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    times = 1704067200000 + np.cumsum(rng.integers(0, 40, n))
+    prices = np.round(100 + np.cumsum(rng.normal(0, 0.1, n)), 2)
+    return times, prices
+
+
+def write_agg_trades(path, times, prices, header=False, time_scale=1):
+    lines = ["agg_trade_id,price,quantity,first_trade_id,last_trade_id,transact_time,is_buyer_maker"] if header else []
+    for i, (time_ms, price) in enumerate(zip(times.tolist(), prices.tolist())):
+        lines.append(f"{i},{price},0.5,{i},{i},{time_ms * time_scale},true")
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def concat(chunks):
+    chunks = list(chunks)
+    return np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks])
+
+
+def test_bucket_keeps_first_last_and_extremes():
+    times = np.array([0, 10, 20, 30, 40, 100, 110, 250])
+    prices = np.array([5.0, 7.0, 3.0, 7.0, 4.0, 6.0, 6.0, 1.0])
+    kept_times, kept_prices = thin_ticks(times, prices, 100)
+    # 第一桶保留首笔、第一次出现的最高价、最低价和末笔；只有一两笔的桶原样保留
+    assert kept_times.tolist() == [0, 10, 20, 40, 100, 110, 250]
+    assert kept_prices.tolist() == [5.0, 7.0, 3.0, 4.0, 6.0, 6.0, 1.0]
+
+
+@pytest.mark.parametrize("chunksize", [1, 7, 64, 1000])
+def test_thinning_across_chunk_boundaries_matches_whole_file(tmp_path, chunksize):
+    times, prices = agg_trades()
+    path = write_agg_trades(tmp_path / "BTCUSDT-aggTrades-2024-01-01.csv", times, prices)
+    expected_times, expected_prices = thin_ticks(times, prices, 250)
+
+    replay = ReplayTicks(path, chunksize=chunksize, bucket_ms=250)
+    kept_times, kept_prices = concat(replay.chunks())
+    assert kept_times.tolist() == expected_times.tolist()
+    assert kept_prices.tolist() == expected_prices.tolist()
+
+    # 每个桶的首尾和极值都保留
+    buckets = times // 250
+    for bucket in np.unique(buckets):
+        inside = buckets == bucket
+        kept = kept_prices[kept_times // 250 == bucket]
+        assert kept[0] == prices[inside][0] and kept[-1] == prices[inside][-1]
+        assert kept.max() == prices[inside].max() and kept.min() == prices[inside].min()
+
+
+def test_bucket_spanning_many_chunks_is_not_split():
+    chunks = [(np.array([0, 1]), np.array([1.0, 9.0])), (np.array([2, 3]), np.array([2.0, 0.5])),
+              (np.array([4]), np.array([3.0])), (np.array([], dtype=np.int64), np.array([])),
+              (np.array([5, 100]), np.array([4.0, 8.0]))]
+    kept_times, kept_prices = concat(thin_chunks(chunks, 100))
+    assert kept_times.tolist() == [0, 1, 3, 5, 100]
+    assert kept_prices.tolist() == [1.0, 9.0, 0.5, 4.0, 8.0]
+
+
+def test_zip_archive_with_header_and_microsecond_times(tmp_path):
+    times, prices = agg_trades(50, seed=1)
+    csv_path = write_agg_trades(tmp_path / "BTCUSDT-aggTrades-2025-01-01.csv", times, prices, header=True,
+                                time_scale=1000)
+    zip_path = tmp_path / "BTCUSDT-aggTrades-2025-01-01.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.write(csv_path, "BTCUSDT-aggTrades-2025-01-01.csv")
+
+    assert detect_kind(str(zip_path)) == "aggTrades"
+    read_times, read_prices = concat(read_chunks(str(zip_path), chunksize=16))
+    assert read_times.tolist() == times.tolist()
+    assert read_prices.tolist() == prices.tolist()
+
+    ticks = list(ReplayTicks(str(zip_path)))
+    assert len(ticks) == 50
+    assert ticks[0][0] == np.datetime_as_string(np.datetime64(int(times[0]), "ms")).replace("T", " ")
+    assert ticks[0][1] == prices[0]
+
+
+def test_missing_file_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ReplayTicks(str(tmp_path / "missing-aggTrades.csv"))
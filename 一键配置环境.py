@@ -8,6 +8,8 @@ def install_libraries():
         "pandas",
         "tkinter",  # 通常Python自带，但有些环境可能需要单独安装
         "python-binance",  # 包含binance.client和binance.enums
+        "websockets",  # WebSocket行情推送
+        "aiohttp",  # 异步引擎的HTTP和WebSocket
         "logging"   # Python标准库，通常不需要安装
     ]
     
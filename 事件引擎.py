@@ -0,0 +1,258 @@
+import time
+import heapq
+import logging
+import itertools
+from datetime import datetime
+
+from 回测引擎 import SIGNAL_NAMES, BacktestEngine
+from 行情推送 import format_event_time
+
+logger = logging.getLogger(__name__)
+
+# 事件类型
+MARKET, SIGNAL, ORDER, FILL, RISK = "行情", "信号", "订单", "成交", "风控"
+EVENT_TYPES = [MARKET, SIGNAL, ORDER, FILL, RISK]
+
+# 同一时刻的事件按优先级处理（数字小的先处理）：一条行情派生出的信号、订单、成交和风控检查
+# 总是在下一条行情之前处理完，处理顺序与逐tick回测一致（先开平仓，再检查强平）
+EVENT_PRIORITY = {FILL: 0, ORDER: 1, SIGNAL: 2, RISK: 3, MARKET: 4}
+
+ACTIONABLE_SIGNALS = ("做多", "做空", "平多", "平空")
+
+
+def market_event(time_ms, price, symbol=None, label=None, low=None, high=None, signal=None):
+    """构造行情事件；price 为 None 时只携带期间的最低/最高价，用于强平检查"""
+    return {"type": MARKET, "time": time_ms, "label": label or format_event_time(time_ms), "symbol": symbol,
+            "price": price, "low": low, "high": high, "signal": signal}
+
+
+class EventBus:
+    """按 (时间, 优先级, 序号) 排序的事件队列
+
+    数据源是产出行情事件的迭代器，每个数据源在队列中只保留下一条事件，处理完再取下一条，
+    多个数据源按时间归并，历史数据不会整体进入队列；实时数据源在迭代时阻塞等待新行情。
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._sequence = itertools.count()
+        self.handlers = {event_type: [] for event_type in EVENT_TYPES}
+        self.running = False
+
+    def subscribe(self, event_type, handler):
+        """注册事件处理函数，同一类型的多个处理函数按注册顺序调用"""
+        self.handlers[event_type].append(handler)
+
+    def put(self, event, source=None):
+        heapq.heappush(self._heap, (event["time"], EVENT_PRIORITY[event["type"]], next(self._sequence),
+                                    event, source))
+
+    def add_source(self, source):
+        self._pull(iter(source))
+
+    def _pull(self, source):
+        event = next(source, None)
+        if event is not None:
+            self.put(event, source)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        """处理事件直到队列为空或调用 stop()"""
+        heap = self._heap
+        handlers = self.handlers
+        self.running = True
+        while heap and self.running:
+            _, _, _, event, source = heapq.heappop(heap)
+            for handler in handlers[event["type"]]:
+                handler(event)
+            # 先处理完当前事件再取数据源的下一条，实时数据源不会因为预取而阻塞当前事件
+            if source is not None:
+                self._pull(source)
+        self.running = False
+
+
+def array_events(ticks, tick_signals=None, symbol=None):
+    """把K线展开的 TickArrays 转为行情事件，tick_signals 为批量策略算出的逐tick信号编码"""
+    timestamps = ticks.timestamps.tolist()
+    for i, (label, price) in enumerate(ticks):
+        signal = None if tick_signals is None else SIGNAL_NAMES[tick_signals[i]] or "不操作"
+        yield market_event(timestamps[i], price, symbol, label, signal=signal)
+
+
+def snapshot_events(snapshots, symbol=None, trigger="逐笔成交"):
+    """把 TickConflator 的快照转为行情事件
+
+    逐笔成交触发时每个快照一条事件（最新价 + 期间最高/最低价）；K线收盘触发时每根收盘K线一条事件，
+    再附加一条只带最高/最低价的事件做强平检查。
+    """
+    for snapshot in snapshots:
+        event_time = snapshot["time"] or int(time.time() * 1000)
+        if trigger == "K线收盘":
+            for kline in snapshot["klines"]:
+                yield market_event(kline["close_time"], kline["close"], symbol)
+            if snapshot["low"] is not None:
+                yield market_event(event_time, None, symbol, low=snapshot["low"], high=snapshot["high"])
+        elif snapshot["price"] is not None:
+            yield market_event(event_time, snapshot["price"], symbol, low=snapshot["low"], high=snapshot["high"])
+        elif snapshot["low"] is not None:
+            yield market_event(event_time, None, symbol, low=snapshot["low"], high=snapshot["high"])
+
+
+def poll_events(fetch_price, interval_seconds, is_running, symbol=None, on_error=None, retry_seconds=5):
+    """定时轮询最新价，每个周期产出一条行情事件，is_running() 返回 False 时结束"""
+    while is_running():
+        try:
+            price = fetch_price()
+        except Exception as e:
+            if on_error:
+                on_error(e)
+            time.sleep(retry_seconds)
+            continue
+        now = datetime.now()
+        yield market_event(int(now.timestamp() * 1000), price, symbol, now.strftime("%Y-%m-%d %H:%M:%S"))
+        time.sleep(interval_seconds)
+
+
+class SimulatedExecution:
+    """模拟成交：订单按信号价格立即全部成交"""
+
+    def on_order(self, engine, order):
+        engine.bus.put(dict(order, type=FILL, quantity=None))
+
+
+class EventEngine(BacktestEngine):
+    """事件驱动的交易引擎
+
+    行情、信号、订单、成交和风控事件都经过同一个 EventBus：行情事件调用策略产生信号，信号生成订单，
+    订单交给成交处理器（默认 SimulatedExecution）产生成交，成交按回测引擎的口径记账，
+    最后检查强平和爆仓。数据源可以是实时推送（snapshot_events）、定时轮询（poll_events）、
+    录制回放（行情录制.recorded_events）或历史K线（array_events）。界面的实测和行情回放由它驱动；
+    界面回测仍使用 BacktestEngine，实盘按交易所的成交回报单独记账，都不经过事件队列。
+    开平仓、手续费和强平计算继承自 BacktestEngine，同样的行情下结果与逐tick回测完全一致（run_ticks 用于校验）。
+    execution 为成交处理器，提供 on_order(engine, order) 并把成交事件放回队列。
+    stop_on_error 为 True 时策略出错即结束（回测），否则记录日志后继续（实时行情）。
+    """
+
+    def __init__(self, config, strategy=None, log=None, on_trade=None, batch_strategy=None, execution=None,
+                 stop_on_error=True):
+        super().__init__(config, strategy, log, on_trade, batch_strategy)
+        self.execution = execution or SimulatedExecution()
+        self.stop_on_error = stop_on_error
+        self.bus = None
+        self.result = None
+
+    def stop(self):
+        super().stop()
+        if self.bus is not None:
+            self.bus.stop()
+
+    def begin(self):
+        result = super().begin()
+        bus = self.bus = EventBus()
+        bus.subscribe(MARKET, self.on_market)
+        bus.subscribe(SIGNAL, self.on_signal)
+        bus.subscribe(ORDER, lambda event: self.execution.on_order(self, event))
+        bus.subscribe(FILL, self.on_fill)
+        bus.subscribe(RISK, self.check_risk)
+        self.pending_price = None
+        return result
+
+    def run_ticks(self, ticks, tick_signals=None):
+        """用事件驱动的方式回测K线展开的 tick 序列，结果与 BacktestEngine.run_ticks 一致"""
+        if tick_signals is None and self.strategy is None:
+            raise ValueError("逐tick回测需要提供 trade_signal 策略函数")
+        result = self.begin()
+        self.bus.add_source(array_events(ticks, tick_signals, self.config.symbol))
+        return self.finish(result)
+
+    def run_events(self, *sources):
+        """处理一个或多个行情事件数据源，直到数据源结束、调用 stop() 或爆仓"""
+        result = self.begin()
+        for source in sources:
+            self.bus.add_source(source)
+        return self.finish(result)
+
+    def finish(self, result):
+        self.bus.run()
+        self.flush_equity()
+        self.finish_curve(result)
+        if self.stop_requested and not result.bankrupt and result.error is None:
+            result.stopped = True
+            if self.log:
+                self.log("回测已停止\n")
+        result.final_margin = self.margin
+        result.open_orders = self.positions.to_list()
+        self.summarize(result)
+        return result
+
+    def flush_equity(self):
+        """上一条行情派生的事件都处理完后（下一条行情到来或结束时）记录它的权益"""
+        if self.pending_price is not None:
+            self.record_equity(self.pending_price)
+            self.pending_price = None
+
+    def on_market(self, event):
+        self.flush_equity()
+        price = event["price"]
+        if price is None:
+            if self.positions:
+                self.check_risk(event)
+            return
+        try:
+            signal = event["signal"]
+            if signal is None:
+                signal = self.strategy(event["label"], price)
+            self.result.ticks += 1
+            self.pending_price = price
+            if self.log:
+                self.log(f"{event['label']}，价格: {price}，信号: {signal}\n")
+        except Exception as e:
+            self.fail(e, "策略计算出错")
+            return
+
+        if signal in ACTIONABLE_SIGNALS:
+            self.bus.put(dict(event, type=SIGNAL, signal=signal))
+            self.bus.put(dict(event, type=RISK))
+        elif self.positions:
+            self.check_risk(event)
+
+    def on_signal(self, event):
+        # 保证金检查和下单数量由开仓记账完成，这里直接转为市价单
+        self.bus.put(dict(event, type=ORDER))
+
+    def on_fill(self, event):
+        signal = event["signal"]
+        try:
+            if signal in ["做多", "做空"]:
+                self.open_position(event["label"], signal, event["price"], event["quantity"])
+            else:
+                self.close_position(event["label"], signal, event["price"])
+        except Exception as e:
+            self.fail(e, "成交记账出错")
+
+    def check_risk(self, event):
+        """按行情价（或期间的最低/最高价）检查强平，保证金耗尽时结束"""
+        if self.config.enable_liquidation:
+            low, high = event["low"], event["high"]
+            if low is None:
+                self.check_liquidation(event["label"], event["price"])
+            else:
+                for price in (low, high) if high != low else (low,):
+                    self.check_liquidation(event["label"], price)
+        if self.margin <= 0 and not self.result.bankrupt:
+            self.result.bankrupt = True
+            if self.log:
+                self.log("账户爆仓，停止交易\n")
+            self.bus.stop()
+
+    def fail(self, error, text):
+        if self.log:
+            self.log(f"{text}: {str(error)}\n")
+        if self.stop_on_error:
+            self.result.error = error
+            self.bus.stop()
@@ -0,0 +1,170 @@
+import time
+import logging
+import threading
+from decimal import Decimal
+
+from 网络请求 import get_default_client
+
+logger = logging.getLogger(__name__)
+
+EXCHANGE_INFO_URL = "https://fapi.binance.com/fapi/v1/exchangeInfo"
+
+
+def fetch_exchange_info(session=None, timeout=10):
+    """请求合约交易规则（全部交易对）"""
+    response = (session or get_default_client()).get(EXCHANGE_INFO_URL, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    if "symbols" not in data:
+        raise ValueError(f"交易规则接口返回异常: {data}")
+    return data
+
+
+def decimal_places(value):
+    """"0.001" -> 3，"10" -> 0"""
+    exponent = Decimal(str(value)).normalize().as_tuple().exponent
+    return max(-exponent, 0)
+
+
+class SymbolFilters:
+    """单个交易对的下单规则，创建时把步长换算成整数，取整只做整数运算
+
+    数量按 LOT_SIZE 步长向下取整（市价单上限取 MARKET_LOT_SIZE），价格按 PRICE_FILTER 最小变动价位四舍五入，
+    数量低于最小下单量或名义价值低于 MIN_NOTIONAL 时视为无法下单。
+    """
+
+    def __init__(self, symbol, step_size, tick_size, min_qty=0.0, max_qty=float("inf"), market_max_qty=None,
+                 min_notional=0.0):
+        self.symbol = symbol
+        self.step_size = float(step_size)
+        self.tick_size = float(tick_size)
+        self.min_qty = float(min_qty)
+        self.max_qty = float(max_qty)
+        self.market_max_qty = self.max_qty if market_max_qty is None else float(market_max_qty)
+        self.min_notional = float(min_notional)
+        self.quantity_precision = decimal_places(step_size)
+        self.price_precision = decimal_places(tick_size)
+        self._quantity_scale = 10 ** self.quantity_precision
+        self._price_scale = 10 ** self.price_precision
+        self._step_units = max(round(self.step_size * self._quantity_scale), 1)
+        self._tick_units = max(round(self.tick_size * self._price_scale), 1)
+
+    def __repr__(self):
+        return (f"SymbolFilters({self.symbol}, step={self.step_size}, tick={self.tick_size}, "
+                f"min_qty={self.min_qty}, max_qty={self.max_qty}, min_notional={self.min_notional})")
+
+    def floor_quantity(self, quantity):
+        """数量向下取整到步长"""
+        # 加一个远小于步长的量，抵消 0.3 / 0.1 这类浮点误差
+        units = int(quantity * self._quantity_scale + 1e-6)
+        return (units - units % self._step_units) / self._quantity_scale
+
+    def round_price(self, price):
+        """价格四舍五入到最小变动价位"""
+        units = round(price * self._price_scale)
+        return (units + self._tick_units // 2) // self._tick_units * self._tick_units / self._price_scale
+
+    def adjust_quantity(self, quantity, price=None, market=True):
+        """按规则调整下单数量，无法满足最小下单量或最小名义价值时返回 0"""
+        quantity = min(self.floor_quantity(quantity), self.market_max_qty if market else self.max_qty)
+        if quantity < self.min_qty or quantity <= 0:
+            return 0.0
+        if price is not None and quantity * price < self.min_notional:
+            return 0.0
+        return quantity
+
+    def format_quantity(self, quantity):
+        return f"{quantity:.{self.quantity_precision}f}"
+
+    def format_price(self, price):
+        return f"{price:.{self.price_precision}f}"
+
+
+def parse_exchange_info(data):
+    """把 exchangeInfo 的返回值解析为 {交易对: SymbolFilters}"""
+    result = {}
+    for item in data["symbols"]:
+        filters = {f["filterType"]: f for f in item.get("filters", [])}
+        lot = filters.get("LOT_SIZE")
+        price_filter = filters.get("PRICE_FILTER")
+        if lot is None or price_filter is None:
+            continue
+        market_lot = filters.get("MARKET_LOT_SIZE")
+        notional = filters.get("MIN_NOTIONAL", {})
+        result[item["symbol"]] = SymbolFilters(
+            item["symbol"],
+            lot["stepSize"],
+            price_filter["tickSize"],
+            min_qty=lot["minQty"],
+            max_qty=lot["maxQty"],
+            market_max_qty=market_lot["maxQty"] if market_lot else None,
+            # 合约接口字段为 notional，现货为 minNotional
+            min_notional=notional.get("notional", notional.get("minNotional", 0))
+        )
+    return result
+
+
+class ExchangeInfoCache:
+    """全部交易对下单规则的缓存
+
+    首次读取时请求一次 exchangeInfo，start() 后在后台每 refresh_interval 秒刷新一次；
+    刷新失败时保留旧数据。读取是一次字典查找，下单时不会再请求接口。
+    """
+
+    def __init__(self, fetch=fetch_exchange_info, refresh_interval=3600):
+        self.fetch = fetch
+        self.refresh_interval = refresh_interval
+        self.loaded_at = None
+        self._filters = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """重新请求交易规则，返回 {交易对: SymbolFilters}"""
+        filters = parse_exchange_info(self.fetch())
+        self._filters = filters
+        self.loaded_at = time.time()
+        logger.info(f"交易规则已更新，共 {len(filters)} 个交易对")
+        return filters
+
+    def filters(self):
+        """返回全部交易对的规则，尚未加载时先加载一次"""
+        filters = self._filters
+        if filters is None:
+            with self._lock:
+                filters = self._filters if self._filters is not None else self.refresh()
+        return filters
+
+    def get(self, symbol):
+        """返回交易对的规则，没有该交易对时返回 None"""
+        return self.filters().get(symbol)
+
+    def select(self, symbols):
+        """返回指定交易对的规则字典，用于回测配置"""
+        filters = self.filters()
+        return {symbol: filters[symbol] for symbol in symbols if symbol in filters}
+
+    def round_quantity(self, symbol, quantity, price=None):
+        """按交易对规则调整下单数量，没有该交易对的规则时原样返回"""
+        rules = self.get(symbol)
+        return quantity if rules is None else rules.adjust_quantity(quantity, price)
+
+    def start(self):
+        """启动后台定时刷新"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"刷新交易规则失败，继续使用旧数据: {e}")
+
@@ -0,0 +1,90 @@
+import time
+import logging
+import threading
+
+from 网络请求 import get_default_client
+
+logger = logging.getLogger(__name__)
+
+TICKER_PRICE_URL = "https://fapi.binance.com/fapi/v1/ticker/price"
+
+
+def fetch_ticker_price(symbol, session=None, timeout=5):
+    """请求交易对的最新成交价"""
+    response = (session or get_default_client()).get(TICKER_PRICE_URL, params={"symbol": symbol}, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    if "price" not in data:
+        raise ValueError(f"价格接口返回异常: {data}")
+    return float(data["price"])
+
+
+class _PendingFetch:
+    """一次进行中的价格请求，等待者共享其结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.price = None
+        self.error = None
+
+
+class PriceService:
+    """按交易对缓存最新价格，供实测/实盘的监控线程、结果线程共同读取
+
+    缓存未超过 ttl 秒时直接返回；过期后只有第一个读取者发起请求，
+    同一时间的其他读取者等待并共享这一次请求的结果（请求合并）。
+    WebSocket 推送的价格可以通过 update 写入，读取者就不再需要发请求。
+    """
+
+    def __init__(self, fetch=fetch_ticker_price, ttl=2.0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._prices = {}
+        self._pending = {}
+
+    def update(self, symbol, price):
+        """写入外部获得的价格（如推送的成交价）"""
+        with self._lock:
+            self._prices[symbol] = (price, time.monotonic())
+
+    def cached(self, symbol, max_age=None):
+        """返回未过期的缓存价格，没有时返回 None"""
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            entry = self._prices.get(symbol)
+        if entry is not None and time.monotonic() - entry[1] <= max_age:
+            return entry[0]
+        return None
+
+    def get(self, symbol, max_age=None):
+        """读取价格，缓存过期时请求一次（并发读取者共享同一次请求），请求失败时抛出异常"""
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            entry = self._prices.get(symbol)
+            if entry is not None and time.monotonic() - entry[1] <= max_age:
+                return entry[0]
+            pending = self._pending.get(symbol)
+            leader = pending is None
+            if leader:
+                pending = self._pending[symbol] = _PendingFetch()
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.price
+
+        try:
+            self.requests += 1
+            pending.price = self.fetch(symbol)
+            self.update(symbol, pending.price)
+            return pending.price
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[symbol]
+            pending.done.set()
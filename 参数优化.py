@@ -0,0 +1,232 @@
+import os
+import sys
+import ast
+import argparse
+import itertools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import fields, replace
+from datetime import datetime
+
+from 回测引擎 import (BacktestConfig, BacktestEngine, FIXED_MARGIN_MODE, PERCENT_MARGIN_MODE,
+                  build_strategy_namespace, read_strategy_source)
+
+logger = logging.getLogger(__name__)
+
+# 与回测参数同名的参数作用于 BacktestConfig，其余参数注入策略命名空间
+CONFIG_FIELDS = {f.name for f in fields(BacktestConfig)}
+SWEEP_METRICS = ["收益率", "最大回撤", "胜率", "夏普比率", "交易次数", "结算金额"]
+
+
+def parse_value(text):
+    """把参数值文本解析为数字/布尔等字面量，无法解析时保留字符串"""
+    text = text.strip()
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_grid(text):
+    """解析参数网格文本
+
+    格式为 "window=10,20,30; leverage=5,10"，也支持 "window=10:30:5" 表示 10 到 30（含）步长 5。
+    """
+    grid = {}
+    for part in text.replace("\n", ";").split(";"):
+        if not part.strip():
+            continue
+        if "=" not in part:
+            raise ValueError(f"参数格式错误: {part.strip()}，应为 名称=值1,值2")
+        name, values = part.split("=", 1)
+        name = name.strip()
+        values = values.strip()
+        if values.count(":") == 2 and "," not in values:
+            start, stop, step = (parse_value(v) for v in values.split(":"))
+            if step == 0:
+                raise ValueError(f"参数 {name} 的步长不能为0")
+            count = int(round((stop - start) / step)) + 1
+            grid[name] = [round(start + i * step, 10) for i in range(max(count, 0))]
+        else:
+            grid[name] = [parse_value(v) for v in values.split(",") if v.strip()]
+        if not grid[name]:
+            raise ValueError(f"参数 {name} 没有取值")
+    return grid
+
+
+def expand_grid(grid):
+    """把参数网格展开为参数组合列表"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def split_params(params):
+    """拆分为 (回测参数覆盖, 策略参数)"""
+    config_params = {k: v for k, v in params.items() if k in CONFIG_FIELDS}
+    strategy_params = {k: v for k, v in params.items() if k not in CONFIG_FIELDS}
+    return config_params, strategy_params
+
+
+def format_params(params):
+    return ", ".join(f"{k}={v}" for k, v in params.items())
+
+
+# 子进程内的共享状态：数据集和策略代码在进程启动时只加载一次
+_worker_state = {}
+
+
+def _init_worker(code, df, base_config):
+    _worker_state["code"] = code
+    _worker_state["df"] = df
+    _worker_state["base_config"] = base_config
+
+
+def run_backtest(code, df, base_config, params, start=None, end=None, warmup_start=None):
+    """用给定参数在 df.iloc[start:end] 上回测一次，返回 BacktestResult
+
+    warmup_start: 可选的预热起点，df.iloc[warmup_start:start] 只用于预热策略指标，不参与交易
+    """
+    config_params, strategy_params = split_params(params)
+    config = replace(base_config, **config_params)
+    # 每个组合重新执行策略代码，避免上一个组合留下的全局状态
+    namespace = build_strategy_namespace(code, strategy_params)
+    engine = BacktestEngine(config, namespace.get('trade_signal'),
+                            batch_strategy=namespace.get('trade_signals'))
+    if warmup_start is not None and start is not None:
+        return engine.run(df.iloc[warmup_start:end], warmup_bars=start - warmup_start)
+    data = df if start is None and end is None else df.iloc[start:end]
+    return engine.run(data)
+
+
+def _run_combo(params, start=None, end=None):
+    """子进程中执行一个参数组合，返回结果行"""
+    row = {"params": params}
+    try:
+        result = run_backtest(_worker_state["code"], _worker_state["df"], _worker_state["base_config"],
+                              params, start, end)
+        row.update({key: result.summary[key] for key in SWEEP_METRICS})
+        row["error"] = str(result.error) if result.error else ""
+    except Exception as e:
+        row.update({key: 0 for key in SWEEP_METRICS})
+        row["error"] = str(e)
+    return row
+
+
+class ParameterSweep:
+    """在进程池上并行回测参数网格
+
+    每个子进程在启动时接收一次数据集和策略代码，之后只传递参数组合；
+    结果按完成顺序通过 on_result 回调流式返回。
+    """
+
+    def __init__(self, code, df, base_config, max_workers=None):
+        self.code = code
+        self.df = df
+        self.base_config = base_config
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.stop_requested = False
+
+    def stop(self):
+        """请求停止，尚未开始的组合会被取消"""
+        self.stop_requested = True
+
+    def executor(self):
+        # 使用 spawn 启动子进程，避免复制界面线程和 Tk 状态
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.code, self.df, self.base_config)
+        )
+
+    def run(self, combos, on_result=None):
+        """回测全部参数组合，combos 可以是参数网格字典或组合列表，返回结果行列表"""
+        if isinstance(combos, dict):
+            combos = expand_grid(combos)
+        self.stop_requested = False
+        rows = []
+
+        with self.executor() as pool:
+            futures = [pool.submit(_run_combo, params) for params in combos]
+            try:
+                for future in as_completed(futures):
+                    if self.stop_requested:
+                        break
+                    row = future.result()
+                    rows.append(row)
+                    if on_result:
+                        on_result(row)
+            finally:
+                for future in futures:
+                    future.cancel()
+        return rows
+
+
+def main(argv=None):
+    """命令行参数优化入口"""
+    parser = argparse.ArgumentParser(description="币安量化框架 - 多进程参数优化")
+    parser.add_argument("strategy", help="策略文件路径")
+    parser.add_argument("--grid", action="append", required=True,
+                        help='参数网格，如 "window=10,20,30" 或 "leverage=5:20:5"，可重复传入')
+    parser.add_argument("--symbol", default="BTCUSDT", help="交易对")
+    parser.add_argument("--interval", default="1h", help="时间周期")
+    parser.add_argument("--start", required=True, help="开始时间，格式 YYYY-MM-DD HH:MM:SS")
+    parser.add_argument("--end", default=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), help="结束时间")
+    parser.add_argument("--initial-margin", type=float, default=1000, help="初始保证金金额")
+    parser.add_argument("--fee-rate", type=float, default=0.05, help="手续费率(%%)")
+    parser.add_argument("--percentage-margin", type=float, default=None, help="按百分比保证金模式下单")
+    parser.add_argument("--fixed-margin", type=float, default=100, help="固定保证金模式下的下单保证金")
+    parser.add_argument("--leverage", type=float, default=10, help="杠杆倍数")
+    parser.add_argument("--param-model", default="开高低收", help="传参模型")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认使用全部CPU")
+    parser.add_argument("--sort", default="收益率", choices=SWEEP_METRICS, help="排序指标")
+    parser.add_argument("--top", type=int, default=20, help="输出前N个组合")
+    args = parser.parse_args(argv)
+
+    from 数据服务 import load_klines
+
+    grid = {}
+    for text in args.grid:
+        grid.update(parse_grid(text))
+    combos = expand_grid(grid)
+
+    start_ms = int(datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+    end_ms = int(datetime.strptime(args.end, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+    df, _ = load_klines(args.symbol, args.interval, start_ms, end_ms)
+    if df.empty:
+        print("未获取到数据")
+        return 1
+
+    code, _ = read_strategy_source(args.strategy)
+    base_config = BacktestConfig(
+        symbol=args.symbol,
+        initial_margin=args.initial_margin,
+        fee_rate=args.fee_rate,
+        order_mode=PERCENT_MARGIN_MODE if args.percentage_margin is not None else FIXED_MARGIN_MODE,
+        fixed_margin=args.fixed_margin,
+        percentage_margin=args.percentage_margin or 10,
+        leverage=args.leverage,
+        param_model=args.param_model
+    )
+
+    print(f"共 {len(combos)} 个参数组合，{len(df)} 根K线")
+    done = [0]
+
+    def report(row):
+        done[0] += 1
+        sys.stdout.write(f"\r已完成 {done[0]}/{len(combos)}")
+        sys.stdout.flush()
+
+    rows = ParameterSweep(code, df, base_config, args.workers).run(combos, on_result=report)
+    print()
+    rows.sort(key=lambda row: row[args.sort], reverse=args.sort != "最大回撤")
+    for row in rows[:args.top]:
+        metrics = "  ".join(f"{key}={row[key]}" for key in SWEEP_METRICS)
+        error = f"  错误: {row['error']}" if row["error"] else ""
+        print(f"{format_params(row['params'])}  |  {metrics}{error}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
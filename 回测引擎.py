@@ -0,0 +1,732 @@
+import os
+import sys
+import ast
+import math
+import argparse
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+import numpy as np
+from 持仓账本 import PositionBook, CLOSE_SIDE
+from 交易规则 import ExchangeInfoCache
+from 绩效统计 import EquityCurve, equity_metrics
+
+logger = logging.getLogger(__name__)
+
+FIXED_MARGIN_MODE = "固定保证金模式"
+PERCENT_MARGIN_MODE = "百分比保证金模式（滚仓）"
+PARAM_MODELS = ["开高低收", "开低高收", "仅收盘价"]
+
+# 每种传参模型下一根K线拆出的价格顺序
+PARAM_MODEL_PHASES = {
+    "开高低收": ("open", "high", "low", "close"),
+    "开低高收": ("open", "low", "high", "close"),
+    "仅收盘价": ("close",)
+}
+
+# 批量策略 trade_signals 返回的信号编码，也可以直接返回信号字符串数组
+SIGNAL_NONE, SIGNAL_LONG, SIGNAL_SHORT, SIGNAL_CLOSE_LONG, SIGNAL_CLOSE_SHORT = 0, 1, 2, 3, 4
+SIGNAL_NAMES = [None, "做多", "做空", "平多", "平空"]
+SIGNAL_CODES = {None: SIGNAL_NONE, "不操作": SIGNAL_NONE, "做多": SIGNAL_LONG, "做空": SIGNAL_SHORT,
+                "平多": SIGNAL_CLOSE_LONG, "平空": SIGNAL_CLOSE_SHORT}
+
+BACKTEST_RESULT_KEYS = [
+    "初始金额", "结算金额", "收益率",
+    "最大回撤", "夏普比率", "标准差",
+    "交易次数", "胜率", "最大盈利", "最大亏损",
+    "水下时间", "最长水下", "持仓时间"
+]
+# 以百分比显示的汇总指标
+PERCENT_RESULT_KEYS = ["收益率", "最大回撤", "胜率", "水下时间", "持仓时间"]
+
+
+def calculate_liquidation_price(action, entry_price, margin, leverage):
+    """计算强平价格"""
+    try:
+        if action == "做多":
+            return entry_price * (1 - (margin * leverage) / (margin * leverage + margin))
+        else:  # 做空
+            return entry_price * (1 + (margin * leverage) / (margin * leverage + margin))
+    except Exception:
+        return 0
+
+
+def calculate_profit(action, open_price, close_price, control_funds):
+    """计算盈亏"""
+    if action == "做多":
+        return control_funds * (close_price - open_price) / open_price
+    else:  # 做空
+        return control_funds * (open_price - close_price) / open_price
+
+
+class TickArrays:
+    """按传参模型展开后的tick序列
+
+    prices 为交错排列的价格数组（第 i 根K线的第 j 个价格位于 i * k + j），
+    bar_times 为每根K线的开盘时间，phases 为每根K线内的价格顺序。
+    迭代时按需生成 (时间字符串, 价格)，不会预先构造全部字符串。
+    """
+
+    def __init__(self, bar_times, price_matrix, phases):
+        self.bar_times = bar_times
+        self.price_matrix = price_matrix
+        self.phases = phases
+        self.prices = price_matrix.ravel()
+
+    def __len__(self):
+        return len(self.prices)
+
+    @property
+    def timestamps(self):
+        """每个tick对应的K线开盘时间（毫秒时间戳）"""
+        return np.repeat(self.bar_times.astype("datetime64[ms]").astype("int64"), len(self.phases))
+
+    @property
+    def phase_index(self):
+        """每个tick在K线内的序号，对应 phases 中的价格类型"""
+        return np.tile(np.arange(len(self.phases), dtype=np.int8), len(self.bar_times))
+
+    def bar_labels(self):
+        if len(self.bar_times) == 0:
+            return []
+        seconds = self.bar_times.astype("datetime64[s]")
+        return np.char.replace(np.datetime_as_string(seconds, unit="s"), "T", " ").tolist()
+
+    def label(self, i):
+        """第 i 个tick的时间字符串，与迭代产出的一致"""
+        k = len(self.phases)
+        bar = np.datetime_as_string(self.bar_times[i // k].astype("datetime64[s]"), unit="s")
+        return f"{str(bar).replace('T', ' ')} {self.phases[i % k]}"
+
+    def __iter__(self):
+        suffixes = [f" {phase}" for phase in self.phases]
+        for label, row in zip(self.bar_labels(), self.price_matrix.tolist()):
+            for suffix, price in zip(suffixes, row):
+                yield label + suffix, price
+
+
+def expand_ohlc(df, param_model):
+    """用数组运算把K线按传参模型展开成tick序列，未知模型按仅收盘价处理"""
+    phases = PARAM_MODEL_PHASES.get(param_model, PARAM_MODEL_PHASES["仅收盘价"])
+    price_matrix = np.column_stack([df[phase].to_numpy(dtype="float64") for phase in phases]) \
+        if len(df) else np.empty((0, len(phases)))
+    return TickArrays(df.index.to_numpy(dtype="datetime64[ns]"), price_matrix, phases)
+
+
+def normalize_signals(signals, length):
+    """把批量策略返回的信号转换为 int8 编码数组"""
+    signals = np.asarray(signals)
+    if signals.shape != (length,):
+        raise ValueError(f"trade_signals 返回了 {signals.size} 个信号，与K线数量 {length} 不一致")
+
+    if signals.dtype.kind in "iub":
+        codes = signals.astype(np.int8)
+        if len(codes) and (codes.min() < SIGNAL_NONE or codes.max() > SIGNAL_CLOSE_SHORT):
+            raise ValueError("trade_signals 返回了无法识别的信号编码")
+        return codes
+
+    codes = np.zeros(length, dtype=np.int8)
+    for name, code in SIGNAL_CODES.items():
+        if name is not None and code != SIGNAL_NONE:
+            codes[signals == name] = code
+    return codes
+
+
+def compute_batch_signals(batch_strategy, df):
+    """调用批量策略，对每根K线返回一个信号编码"""
+    volumes = df["volume"].to_numpy(dtype="float64") if "volume" in df else np.zeros(len(df))
+    signals = batch_strategy(
+        df.index.to_numpy(dtype="datetime64[ms]").astype("int64"),
+        df["open"].to_numpy(dtype="float64"),
+        df["high"].to_numpy(dtype="float64"),
+        df["low"].to_numpy(dtype="float64"),
+        df["close"].to_numpy(dtype="float64"),
+        volumes
+    )
+    return normalize_signals(signals, len(df))
+
+
+def read_strategy_source(file_path):
+    """尝试多种编码读取策略文件，返回 (代码, 使用的编码)"""
+    for encoding in ['utf-8', 'gbk', 'latin-1', 'utf-16']:
+        try:
+            with open(file_path, 'r', encoding=encoding) as f:
+                return f.read(), encoding
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("无法使用任何支持的编码格式读取文件，请将文件保存为UTF-8格式后重试")
+
+
+def inject_strategy_params(code, params):
+    """把策略文件顶层对参数名的赋值替换为注入的参数值，返回可执行的代码对象
+
+    例如参数 {"window": 30} 会把策略中的 `window = 20` 改为使用 30，
+    这样在导入时就依赖该参数构造的对象（如指标实例）也会使用新值。
+    """
+    tree = ast.parse(code)
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target = node.targets[0]
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            target = node.target
+        else:
+            continue
+        if isinstance(target, ast.Name) and target.id in params:
+            node.value = ast.copy_location(ast.Subscript(
+                value=ast.Name(id="__strategy_params__", ctx=ast.Load()),
+                slice=ast.Constant(value=target.id),
+                ctx=ast.Load()
+            ), node.value)
+    ast.fix_missing_locations(tree)
+    return compile(tree, "<strategy>", "exec")
+
+
+def build_strategy_namespace(code, params=None):
+    """执行策略代码并返回其命名空间
+
+    params: 可选的策略参数字典，会覆盖策略文件顶层同名变量的赋值
+    """
+    namespace = {}
+    if params:
+        namespace.update(params)
+        namespace["__strategy_params__"] = dict(params)
+        code = inject_strategy_params(code, params)
+    exec(code, namespace)
+    return namespace
+
+
+def load_strategy_namespace(file_path):
+    """读取并执行策略文件，trade_signal 和 trade_signals 都没有时抛出 ValueError"""
+    code, _ = read_strategy_source(file_path)
+    if code == '':
+        raise ValueError("文件内容为空")
+
+    namespace = build_strategy_namespace(code)
+    if 'trade_signal' not in namespace and 'trade_signals' not in namespace:
+        raise ValueError("策略文件中未找到 trade_signal 或 trade_signals 函数")
+    return namespace
+
+
+@dataclass
+class BacktestConfig:
+    """回测参数，与界面上的账户设置和交易规则设置一一对应"""
+    symbol: str = "BTCUSDT"
+    initial_margin: float = 1000
+    fee_rate: float = 0.05  # 百分比，0.05 表示 0.05%
+    order_mode: str = FIXED_MARGIN_MODE
+    fixed_margin: float = 100
+    percentage_margin: float = 10  # 百分比
+    leverage: float = 10
+    param_model: str = "开高低收"
+    enable_liquidation: bool = True
+    # {交易对: SymbolFilters}，提供时开仓数量按交易所规则取整，与实盘下单一致
+    symbol_filters: dict = None
+
+
+class BacktestResult:
+    """回测结果：汇总指标、已平仓订单和未平仓订单"""
+
+    def __init__(self, config):
+        self.config = config
+        self.summary = {key: 0 for key in BACKTEST_RESULT_KEYS}
+        self.trade_orders = []
+        self.open_orders = []
+        self.final_margin = config.initial_margin
+        self.margin_max = config.initial_margin
+        self.margin_min = config.initial_margin
+        self.ticks = 0
+        # 逐tick权益（可用保证金 + 占用保证金 + 未实现盈亏）和是否持仓，float64 / bool 数组
+        self.equity = None
+        self.exposure = None
+        self.bankrupt = False
+        self.stopped = False
+        self.error = None
+
+    def format_summary(self):
+        lines = []
+        for key, value in self.summary.items():
+            suffix = '%' if key in PERCENT_RESULT_KEYS else ''
+            lines.append(f"{key}: {value}{suffix}")
+        return "\n".join(lines)
+
+
+class BacktestEngine:
+    """不依赖界面的回测引擎
+
+    输入回测参数、K线数据和策略函数，输出 BacktestResult。
+    strategy 为逐tick调用的 trade_signal(time, price)；
+    batch_strategy 为可选的批量接口 trade_signals(timestamps, opens, highs, lows, closes, volumes)，
+    提供时优先使用：一次性算出每根K线的信号，在该K线收盘价处执行，其余tick只做强平检查，
+    并走 run_vectorized 快速路径，只逐个处理开平仓和强平的tick。
+    log / on_trade 为可选回调，分别接收日志文本和平仓订单记录，不传时不产生任何输出开销。
+    metrics 可设为 绩效统计.MetricsAccumulator，每笔平仓和每个tick的权益随之增量更新（实测使用）。
+    """
+
+    def __init__(self, config, strategy=None, log=None, on_trade=None, batch_strategy=None):
+        if strategy is None and batch_strategy is None:
+            raise ValueError("需要提供 trade_signal 或 trade_signals 策略函数")
+        self.config = config
+        self.strategy = strategy
+        self.batch_strategy = batch_strategy
+        self.log = log
+        self.on_trade = on_trade
+        self.metrics = None
+        self.stop_requested = False
+
+    def stop(self):
+        """请求停止回测，当前tick处理完后生效"""
+        self.stop_requested = True
+
+    def expand_ticks(self, df):
+        """把K线按传参模型拆成 (时间, 价格) 序列"""
+        return expand_ohlc(df, self.config.param_model)
+
+    def run(self, df, warmup_bars=0):
+        """执行回测
+
+        warmup_bars: df 开头用于预热的K线数。预热K线只交给策略计算指标、不下单，也不计入回测结果：
+        逐tick策略按传参模型把预热K线喂一遍并忽略返回的信号，批量策略连同预热K线一起计算信号后只取其后的部分。
+        """
+        warmup, data = df.iloc[:warmup_bars], df.iloc[warmup_bars:]
+        ticks = self.expand_ticks(data)
+        if self.batch_strategy is None:
+            try:
+                self.warm_up(warmup)
+            except Exception as e:
+                return self.failed(e, "策略预热出错")
+            return self.run_ticks(ticks)
+        try:
+            bar_signals = compute_batch_signals(self.batch_strategy, df)[len(warmup):]
+        except Exception as e:
+            return self.failed(e, "批量策略计算出错")
+        return self.run_vectorized(ticks, bar_signals)
+
+    def warm_up(self, df):
+        """把预热K线按传参模型逐tick交给策略，忽略返回的信号"""
+        if len(df) == 0:
+            return
+        for time, price in self.expand_ticks(df):
+            self.strategy(time, price)
+
+    def failed(self, error, message):
+        """策略在开始回测前出错时，返回只带错误的空结果"""
+        result = self.begin()
+        result.error = error
+        if self.log:
+            self.log(f"{message}: {str(error)}\n")
+        self.summarize(result)
+        return result
+
+    def begin(self):
+        """新建回测结果并初始化账户和持仓"""
+        result = BacktestResult(self.config)
+        self.stop_requested = False
+        self.reset(result)
+        self.positions = PositionBook()
+        self.symbol = self.config.symbol
+        self.curve = EquityCurve()
+        self._equity_state = None
+        return result
+
+    def run_ticks(self, ticks, tick_signals=None):
+        """按 (时间, 价格) 序列执行回测
+
+        ticks 可以是K线展开的 TickArrays，也可以是逐笔回放的 ReplayTicks 这类只能迭代一次的流；
+        tick_signals 为逐tick信号编码，不传时逐tick调用 trade_signal。
+        """
+        if tick_signals is None and self.strategy is None:
+            raise ValueError("逐tick回测需要提供 trade_signal 策略函数")
+        result = self.begin()
+        log = self.log
+
+        for i, (time, price) in enumerate(ticks):
+            if self.stop_requested:
+                result.stopped = True
+                if log:
+                    log("回测已停止\n")
+                break
+
+            try:
+                if tick_signals is None:
+                    signal = self.strategy(time, price)
+                else:
+                    signal = SIGNAL_NAMES[tick_signals[i]]
+                result.ticks += 1
+                if log:
+                    log(f"{time}，价格: {price}，信号: {signal}\n")
+
+                self.process_signal(time, signal, price)
+                self.record_equity(price)
+
+                # 检查是否爆仓
+                if self.margin <= 0:
+                    result.bankrupt = True
+                    if log:
+                        log("账户爆仓，回测结束\n")
+                    break
+
+            except Exception as e:
+                result.error = e
+                if log:
+                    log(f"回测过程出错: {str(e)}\n")
+                break
+
+        self.finish_curve(result)
+        result.final_margin = self.margin
+        result.open_orders = self.positions.to_list()
+        self.summarize(result)
+        if log:
+            log("回测完成\n")
+        return result
+
+    def record_equity(self, price):
+        """记录当前tick处理完后的权益和是否持仓；持仓只在成交时变化，权益系数按需重算"""
+        state = (self.order_sequence, len(self.trade_orders))
+        if state != self._equity_state:
+            self._equity_state = state
+            self._equity_terms = self.positions.equity_terms()
+            self._exposed = bool(self.positions)
+        slope, offset = self._equity_terms
+        equity = price * slope + offset + self.margin
+        self.curve.append(equity, self._exposed)
+        if self.metrics is not None:
+            self.metrics.update_equity(equity, self._exposed)
+
+    def finish_curve(self, result):
+        result.equity = self.curve.equity
+        result.exposure = self.curve.exposed
+
+    def run_vectorized(self, ticks, bar_signals, block=65536):
+        """按批量信号快速回测K线展开的tick序列，结果与 run_ticks 逐tick处理一致
+
+        只有两类tick需要逐个处理：有信号的收盘价tick，以及价格触及持仓强平价边界的tick
+        （在两个信号之间的价格段上用数组比较一次找出）。开平仓、手续费和强平仍调用同样的记账方法，
+        百分比保证金模式按每次开仓时的余额滚动计算，成交顺序和金额与 run_ticks 完全相同。
+        两次成交之间持仓不变，逐tick权益是价格的线性函数，按段用数组运算写入 result.equity 和 result.exposure。
+        日志只输出有信号的tick和成交，不逐tick输出。
+        """
+        result = self.begin()
+        log = self.log
+        prices = ticks.prices
+        n = len(prices)
+        k = len(ticks.phases)
+        positions = self.positions
+        enable_liquidation = self.config.enable_liquidation
+        equity = np.empty(n)
+        exposure = np.empty(n, dtype=bool)
+
+        bars = np.flatnonzero(bar_signals)
+        # 收盘价总是每根K线的最后一个tick，末尾加一个哨兵表示序列结束
+        signal_ticks = (bars * k + k - 1).tolist() + [n]
+        signal_codes = np.asarray(bar_signals)[bars].tolist() + [SIGNAL_NONE]
+
+        filled = 0  # equity 已写入的位置
+
+        def fill_equity(end):
+            nonlocal filled
+            slope, offset = positions.equity_terms()
+            equity[filled:end] = prices[filled:end] * slope + (offset + self.margin)
+            exposure[filled:end] = bool(positions)
+            filled = end
+
+        start = 0  # 下一个待检查强平的tick
+        try:
+            for tick, code in zip(signal_ticks, signal_codes):
+                # 上一个信号之后到本信号之前的价格段只需检查强平
+                while enable_liquidation and positions and start < tick:
+                    end = min(tick, start + block)
+                    hit = positions.first_touch(prices[start:end])
+                    if hit < 0:
+                        start = end
+                        continue
+                    i = start + hit
+                    fill_equity(i)
+                    result.ticks = i + 1
+                    self.check_liquidation(ticks.label(i), float(prices[i]))
+                    start = i + 1
+                    if self.margin <= 0:
+                        break
+                if self.margin <= 0:
+                    result.bankrupt = True
+                    if log:
+                        log("账户爆仓，回测结束\n")
+                    break
+                if tick == n:
+                    result.ticks = n
+                    break
+                if self.stop_requested:
+                    result.ticks = tick
+                    result.stopped = True
+                    if log:
+                        log("回测已停止\n")
+                    break
+
+                fill_equity(tick)
+                result.ticks = tick + 1
+                time, price, signal = ticks.label(tick), float(prices[tick]), SIGNAL_NAMES[code]
+                if log:
+                    log(f"{time}，价格: {price}，信号: {signal}\n")
+                self.process_signal(time, signal, price)
+                start = tick + 1
+
+                if self.margin <= 0:
+                    result.bankrupt = True
+                    if log:
+                        log("账户爆仓，回测结束\n")
+                    break
+
+        except Exception as e:
+            result.error = e
+            if log:
+                log(f"回测过程出错: {str(e)}\n")
+
+        fill_equity(result.ticks)
+        result.equity = equity[:result.ticks]
+        result.exposure = exposure[:result.ticks]
+        result.final_margin = self.margin
+        result.open_orders = positions.to_list()
+        self.summarize(result)
+        if log:
+            log("回测完成\n")
+        return result
+
+    def reset(self, result):
+        """初始化账户状态"""
+        self.margin = self.config.initial_margin
+        self.trade_orders = result.trade_orders
+        self.order_sequence = 1
+        self.fee_rate = self.config.fee_rate / 100
+        self.rules = self.symbol_rules(self.config.symbol)
+        self.result = result
+
+    def symbol_rules(self, symbol):
+        """交易对的下单规则，未提供时返回 None"""
+        filters = self.config.symbol_filters
+        return filters.get(symbol) if filters else None
+
+    @staticmethod
+    def batch_tick_signals(batch_strategy, df, ticks):
+        """计算批量策略信号并放到每根K线的收盘价tick上，返回逐tick信号编码列表"""
+        bar_signals = compute_batch_signals(batch_strategy, df)
+        # 收盘价总是每根K线的最后一个tick
+        tick_signals = np.zeros(len(ticks), dtype=np.int8)
+        tick_signals[len(ticks.phases) - 1::len(ticks.phases)] = bar_signals
+        return tick_signals.tolist()
+
+    def process_signal(self, time, signal, price):
+        """按信号开平仓，并检查当前持仓是否触发强平"""
+        if signal in ["做多", "做空"]:
+            self.open_position(time, signal, price)
+        elif signal in ["平多", "平空"]:
+            self.close_position(time, signal, price)
+
+        # 检查强平
+        if self.config.enable_liquidation:
+            self.check_liquidation(time, price)
+
+    def order_margin(self):
+        """按下单模式计算本次开仓的保证金"""
+        if self.config.order_mode == FIXED_MARGIN_MODE:
+            return self.config.fixed_margin
+        return self.margin * self.config.percentage_margin / 100
+
+    def update_margin(self, new_margin):
+        self.margin = new_margin
+        self.result.margin_max = max(self.result.margin_max, new_margin)
+        self.result.margin_min = min(self.result.margin_min, new_margin)
+
+    def open_position(self, time, signal, price, quantity=None):
+        """按下单模式开仓；quantity 为实际成交数量（实盘），不传时按保证金和交易规则计算"""
+        order_margin = self.order_margin()
+
+        # 检查保证金是否充足
+        if self.margin < order_margin:
+            if self.log:
+                self.log("保证金不足，无法开仓\n")
+            return
+
+        # 计算手续费和控制资金
+        leverage = self.config.leverage
+        actual_control_funds = order_margin * leverage
+        if quantity is None and self.rules is not None:
+            # 下单数量按步长向下取整，控制资金和占用保证金随之按实际数量计算
+            quantity = self.rules.adjust_quantity(actual_control_funds / price, price)
+            if quantity <= 0:
+                if self.log:
+                    self.log("下单数量低于交易规则的最小值，无法开仓\n")
+                return
+        if quantity is not None:
+            actual_control_funds = quantity * price
+            order_margin = actual_control_funds / leverage
+        fee = actual_control_funds * self.fee_rate
+        liquidation_price = calculate_liquidation_price(signal, price, self.margin, leverage)
+
+        self.update_margin(self.margin - order_margin - fee)
+        self.positions.open(
+            signal, order_margin, actual_control_funds, price,
+            liquidation_price=liquidation_price, fee=fee, sequence=self.order_sequence,
+            time=time, symbol=self.symbol, leverage=leverage
+        )
+
+        if self.log:
+            self.log(f"订单 {self.order_sequence}: {signal}，价格 {price}，保证金 {order_margin}，杠杆 {leverage}，"
+                     f"手续费 {fee}，控制资金 {actual_control_funds}，强平价 {liquidation_price}\n")
+        self.order_sequence += 1
+
+    def settle(self, order, time, action, price):
+        """结算一笔持仓并记录平仓订单"""
+        fee = order["actual_control_funds"] * self.fee_rate
+        profit = calculate_profit(order["action"], order["open_price"], price, order["actual_control_funds"])
+        self.update_margin(self.margin + order["margin"] + profit - fee)
+
+        trade = {
+            "sequence": order["sequence"],
+            "time": time,
+            "action": action,
+            "symbol": order.get("symbol", self.symbol),
+            "profit": profit,
+            "margin": order["margin"],
+            "actual_control_funds": order["actual_control_funds"],
+            "open_price": order["open_price"],
+            "close_price": price,
+            "total_fee": order["fee"] + fee
+        }
+        self.trade_orders.append(trade)
+        if self.metrics is not None:
+            self.metrics.add_trade(profit)
+        if self.on_trade:
+            self.on_trade(trade)
+        return trade
+
+    def close_position(self, time, signal, price):
+        """平掉最早开仓的一笔同方向持仓"""
+        order = self.positions.close_first(CLOSE_SIDE[signal])
+        if order is None:
+            return
+        trade = self.settle(order, time, signal, price)
+        if self.log:
+            self.log(f"订单 {order['sequence']}: {signal}，平仓价 {price}，盈亏 {trade['profit']}，"
+                     f"手续费 {trade['total_fee']}，余额 {self.margin}\n")
+
+    def check_liquidation(self, time, price):
+        for slot in self.positions.liquidations(price):
+            order = self.positions.remove(slot)
+            action = f"强平{order['action'][:-1]}"
+            trade = self.settle(order, time, action, price)
+            if self.log:
+                self.log(f"订单 {order['sequence']}: {action}，价格 {price}，盈亏 {trade['profit']}，余额 {self.margin}\n")
+            if self.margin <= 0:
+                break
+
+    @staticmethod
+    def summarize(result):
+        """计算回测汇总指标"""
+        summary = result.summary
+        trade_orders = result.trade_orders
+        final_margin = result.final_margin
+        initial = result.config.initial_margin
+
+        summary["初始金额"] = round(initial, 2)
+        summary["结算金额"] = round(final_margin, 2)
+        summary["收益率"] = round((final_margin - initial) / initial * 100, 2) if initial != 0 else 0
+        if result.equity is not None:
+            # 按逐tick权益计算峰值到谷底的回撤、水下时间和持仓时间
+            summary.update(equity_metrics(result.equity, result.exposure, initial))
+        else:
+            summary["最大回撤"] = round((initial - result.margin_min) / initial * 100, 2) if initial != 0 else 0
+        summary["交易次数"] = len(trade_orders)
+
+        # 计算胜率
+        winning_trades = [t for t in trade_orders if t["profit"] > 0]
+        summary["胜率"] = round(len(winning_trades) / len(trade_orders) * 100, 2) if trade_orders else 0
+
+        # 计算最大盈利和亏损
+        if trade_orders:
+            summary["最大盈利"] = round(max(t["profit"] for t in trade_orders), 2)
+            summary["最大亏损"] = round(min(t["profit"] for t in trade_orders), 2)
+
+        # 计算夏普比率和标准差（简化版）
+        if len(trade_orders) >= 2:
+            profits = [t["profit"] for t in trade_orders]
+            mean_profit = sum(profits) / len(profits)
+            std_dev = math.sqrt(sum((p - mean_profit) ** 2 for p in profits) / len(profits))
+            summary["标准差"] = round(std_dev, 4)
+            summary["夏普比率"] = round(mean_profit / std_dev * math.sqrt(252), 2) if std_dev != 0 else 0
+        return summary
+
+
+def main(argv=None):
+    """命令行回测入口"""
+    parser = argparse.ArgumentParser(description="币安量化框架 - 命令行回测")
+    parser.add_argument("strategy", help="策略文件路径（需包含 trade_signal 或 trade_signals 函数）")
+    parser.add_argument("--symbol", default="BTCUSDT", help="交易对")
+    parser.add_argument("--interval", default="1h", help="时间周期，如 1m/5m/1h")
+    parser.add_argument("--start", help="开始时间，格式 YYYY-MM-DD HH:MM:SS（使用 --replay 时不需要）")
+    parser.add_argument("--end", default=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), help="结束时间")
+    parser.add_argument("--initial-margin", type=float, default=1000, help="初始保证金金额")
+    parser.add_argument("--fee-rate", type=float, default=0.05, help="手续费率(%%)")
+    parser.add_argument("--percentage-margin", type=float, default=None,
+                        help="按百分比保证金模式（滚仓）下单，取值为百分比；不传则为固定保证金模式")
+    parser.add_argument("--fixed-margin", type=float, default=100, help="固定保证金模式下的下单保证金")
+    parser.add_argument("--leverage", type=float, default=10, help="杠杆倍数")
+    parser.add_argument("--param-model", default="开高低收", choices=PARAM_MODELS, help="传参模型")
+    parser.add_argument("--no-liquidation", action="store_true", help="关闭强平机制")
+    parser.add_argument("--exchange-rules", action="store_true", help="按交易所的数量步长和最小下单额取整开仓数量")
+    parser.add_argument("--replay", nargs="+", metavar="FILE",
+                        help="改用本地逐笔成交(aggTrades)或盘口(bookTicker)归档逐笔回测，CSV 或 ZIP，按给出的顺序回放")
+    parser.add_argument("--replay-type", choices=["aggTrades", "bookTicker"], default=None,
+                        help="归档类型，不传时按文件名判断")
+    parser.add_argument("--bucket-ms", type=int, default=0,
+                        help="逐笔回放时按该毫秒数分桶抽稀，每桶保留首尾和最高/最低价，0 为不抽稀")
+    parser.add_argument("--verbose", action="store_true", help="输出逐tick日志")
+    args = parser.parse_args(argv)
+    if not args.replay and not args.start:
+        parser.error("需要 --start 或 --replay")
+
+    config = BacktestConfig(
+        symbol=args.symbol,
+        initial_margin=args.initial_margin,
+        fee_rate=args.fee_rate,
+        order_mode=PERCENT_MARGIN_MODE if args.percentage_margin is not None else FIXED_MARGIN_MODE,
+        fixed_margin=args.fixed_margin,
+        percentage_margin=args.percentage_margin or 10,
+        leverage=args.leverage,
+        param_model=args.param_model,
+        enable_liquidation=not args.no_liquidation,
+        symbol_filters=ExchangeInfoCache().select([args.symbol]) if args.exchange_rules else None
+    )
+    namespace = load_strategy_namespace(args.strategy)
+    log = (lambda text: sys.stdout.write(text)) if args.verbose else None
+    engine = BacktestEngine(config, namespace.get('trade_signal'), log=log,
+                            batch_strategy=namespace.get('trade_signals'))
+
+    if args.replay:
+        from 逐笔回放 import ReplayTicks
+
+        if namespace.get('trade_signal') is None:
+            print("逐笔回放需要策略提供 trade_signal 函数")
+            return 1
+        ticks = ReplayTicks(args.replay, kind=args.replay_type, bucket_ms=args.bucket_ms)
+        print(f"{os.path.basename(args.strategy)} 逐笔回放 {args.symbol}，共 {len(args.replay)} 个文件")
+        result = engine.run_ticks(ticks)
+        print(f"共 {result.ticks} 个tick")
+        print(result.format_summary())
+        return 0
+
+    from 数据服务 import load_klines
+
+    start_ms = int(datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+    end_ms = int(datetime.strptime(args.end, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+    df, _ = load_klines(args.symbol, args.interval, start_ms, end_ms)
+    if df.empty:
+        print("未获取到数据")
+        return 1
+
+    print(f"{os.path.basename(args.strategy)} 回测 {args.symbol} {args.interval}，共 {len(df)} 根K线")
+    result = engine.run(df)
+    print(result.format_summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,11 +7,28 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import os
 import importlib.util
-import math
 import threading
 from binance.client import Client
 from binance.enums import *
 import logging
+from 数据服务 import KlineCache, KlineDownloader, INTERVAL_MS, load_klines, load_portfolio_klines
+from 持仓账本 import PositionBook, CLOSE_SIDE
+from 价格服务 import PriceService, fetch_ticker_price
+from 网络请求 import HTTP_STATS_KEYS, get_default_client
+from 行情推送 import FEED_MODES, TRIGGER_MODES, MarketDataFeed, TickConflator, format_event_time
+from 账户推送 import AccountMirror, UserDataStream
+from 交易规则 import ExchangeInfoCache, fetch_exchange_info
+from 日志输出 import LogBuffer, LogView
+from 订单表格 import OrderTable
+from 事件引擎 import FILL, EventEngine, poll_events, snapshot_events
+from 行情录制 import DEFAULT_TICK_LOG_DIR, TRADE, TickLog, TickRecorder, recorded_events
+from 延迟统计 import LATENCY_STATS_KEYS, LatencyRecorder
+from 组合回测 import PortfolioBacktestEngine, PortfolioBacktestResult
+from 参数优化 import ParameterSweep, SWEEP_METRICS, expand_grid, format_params, parse_grid
+from 滚动优化 import WalkForward
+from 回测引擎 import (BacktestConfig, BacktestEngine, PERCENT_RESULT_KEYS, calculate_liquidation_price,
+                  calculate_profit, expand_ohlc, build_strategy_namespace, read_strategy_source)
+from 绩效统计 import MetricsAccumulator, decimate_minmax
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -32,10 +49,38 @@ class TradingEngine:
         self.data_queue = deque(maxlen=10000)
         self.df = pd.DataFrame()
         self.strategy = None
+        self.batch_strategy = None
+        self.strategy_code = None
         self.strategy_name = ""
-        self.order_list = []
+        self.positions = PositionBook()
         self.trade_orders = []
         self.order_sequence = 1
+        # 全部 REST 请求（K线、价格、python-binance 客户端）共用一个连接池
+        self.http = get_default_client()
+        self.kline_cache = KlineCache()
+        self.kline_downloader = KlineDownloader(session=self.http)
+        self.backtest_engine = None
+        self.backtest_thread = None
+        self.backtest_result_obj = None
+        self.sweep = None
+        self.sweep_thread = None
+        self.sweep_window = None
+        self.walk_forward = None
+        self.walk_forward_thread = None
+        self.walk_forward_window = None
+        self.market_feed = None
+        self.tick_received = None
+        # 实盘各阶段耗时，开始实盘时清空
+        self.latency = LatencyRecorder()
+        self.account_mirror = AccountMirror()
+        self.user_stream = None
+        self.price_service = PriceService(fetch=lambda symbol: fetch_ticker_price(symbol, session=self.http))
+        self.exchange_rules = ExchangeInfoCache(fetch=lambda: fetch_exchange_info(session=self.http))
+        self.simulation_engine = None
+        self.tick_recorder = None
+        # 实测/实盘的增量绩效指标，交易线程写入，结果线程直接读取快照
+        self.simulation_metrics = None
+        self.live_metrics = None
         
         # 创建界面
         self.create_main_ui()
@@ -95,6 +140,7 @@ class TradingEngine:
         
         self.fetch_button = ttk.Button(row1_frame, text="获取数据", command=self.fetch_data)
         self.fetch_button.pack(side="left", padx=10)
+        ttk.Button(row1_frame, text="接口统计", command=self.show_http_stats).pack(side="left", padx=5)
         
         # 状态和进度条
         self.status_frame = ttk.Frame(self.data_frame)
@@ -191,10 +237,30 @@ class TradingEngine:
                                         values=["开高低收", "开低高收", "仅收盘价"], width=10)  # 增加"仅收盘价"选项
         param_model_combo.pack(side="left", padx=5)
         
+        # 实测/实盘的行情来源：定时轮询按时间周期取一次价格，WebSocket推送实时接收成交、标记价格和K线收盘
+        ttk.Label(self.param_frame, text="行情来源:").pack(side="left", padx=5)
+        self.feed_mode = tk.StringVar(value=FEED_MODES[0])
+        ttk.Combobox(self.param_frame, textvariable=self.feed_mode, values=FEED_MODES, width=14,
+                     state="readonly").pack(side="left", padx=5)
+        ttk.Label(self.param_frame, text="价格缓存(秒):").pack(side="left", padx=5)
+        self.price_ttl = tk.DoubleVar(value=2)
+        ttk.Entry(self.param_frame, textvariable=self.price_ttl, width=5).pack(side="left", padx=5)
+        ttk.Label(self.param_frame, text="推送触发策略:").pack(side="left", padx=5)
+        self.trigger_mode = tk.StringVar(value=TRIGGER_MODES[0])
+        ttk.Combobox(self.param_frame, textvariable=self.trigger_mode, values=TRIGGER_MODES, width=10,
+                     state="readonly").pack(side="left", padx=5)
+        # 实测/实盘收到的每条行情写入 tick_logs，之后可以在实测中加速回放
+        self.record_ticks = tk.IntVar(value=0)
+        ttk.Checkbutton(self.param_frame, text="录制行情", variable=self.record_ticks).pack(side="left", padx=5)
+        
         # 输出区域
         self.output_frame = ttk.LabelFrame(self.root, text="输出日志")
         self.output_frame.pack(fill="both", expand=True, padx=10, pady=5)
         
+        self.log_to_file = tk.IntVar(value=0)
+        ttk.Checkbutton(self.output_frame, text="日志写入文件", variable=self.log_to_file,
+                        command=self.toggle_log_file).pack(side="top", anchor="e", padx=5)
+        
         self.output_text = tk.Text(self.output_frame, height=10)
         self.output_text.pack(side="left", fill="both", expand=True, padx=5, pady=5)
         
@@ -202,10 +268,27 @@ class TradingEngine:
         scrollbar.pack(side="right", fill="y")
         self.output_text.config(yscrollcommand=scrollbar.set)
         
+        # 各线程的日志先写入环形缓冲，界面每100毫秒批量刷新一次，最多显示5000行
+        self.log_buffer = LogBuffer()
+        self.log_view = LogView(self.root, self.output_text, self.log_buffer)
+        self.log_view.start()
+        
         # 订单列表
         self.order_list_frame = ttk.LabelFrame(self.root, text="交易订单列表")
         self.order_list_frame.pack(fill="x", padx=10, pady=5)
         
+    def log(self, text):
+        """写入输出日志，可在任意线程调用"""
+        self.log_buffer.write(text)
+    
+    def toggle_log_file(self):
+        """开启或关闭完整日志写入 logs/运行日志.log（按10MB轮转，保留5个）"""
+        if self.log_to_file.get():
+            self.log_buffer.open_file(os.path.join("logs", "运行日志.log"))
+            self.log("完整日志写入 logs/运行日志.log\n")
+        else:
+            self.log_buffer.close_file()
+    
     def create_backtest_widgets(self):
         # 回测专用控制按钮
         self.backtest_control_frame = ttk.LabelFrame(self.root, text="回测控制")
@@ -213,12 +296,24 @@ class TradingEngine:
         
         ttk.Button(self.backtest_control_frame, text="开始回测", command=self.start_backtest).pack(side="left", padx=5)
         ttk.Button(self.backtest_control_frame, text="停止回测", command=self.stop_backtest).pack(side="left", padx=5)
+        ttk.Button(self.backtest_control_frame, text="参数优化", command=self.open_sweep_window).pack(side="left", padx=5)
+        ttk.Button(self.backtest_control_frame, text="滚动优化", command=self.open_walk_forward_window).pack(side="left", padx=5)
+        ttk.Button(self.backtest_control_frame, text="资金曲线", command=self.show_equity_curve).pack(side="left", padx=5)
+        
+        # 组合回测：多个交易对共用一个保证金账户
+        ttk.Button(self.backtest_control_frame, text="组合回测", command=self.start_portfolio_backtest).pack(side="left", padx=5)
+        ttk.Label(self.backtest_control_frame, text="组合交易对:").pack(side="left", padx=5)
+        self.portfolio_symbols_var = tk.StringVar(value=",".join(self.symbols))
+        ttk.Entry(self.backtest_control_frame, textvariable=self.portfolio_symbols_var, width=40).pack(side="left", padx=5)
         
         # 强平设置
         self.liquidation_frame = ttk.Frame(self.backtest_control_frame)
         self.liquidation_frame.pack(side="left", padx=20)
         self.enable_liquidation = tk.IntVar(value=1)
         ttk.Checkbutton(self.liquidation_frame, text="启用强平机制", variable=self.enable_liquidation).pack(side="left")
+        # 回测和实测的开仓数量按交易所的步长、最小下单量和最小名义价值取整，与实盘一致
+        self.use_exchange_rules = tk.IntVar(value=0)
+        ttk.Checkbutton(self.liquidation_frame, text="按交易规则取整", variable=self.use_exchange_rules).pack(side="left", padx=5)
         
         # 回测结果
         self.backtest_result_frame = ttk.LabelFrame(self.root, text="回测结果")
@@ -227,7 +322,8 @@ class TradingEngine:
         self.backtest_result = {
             "初始金额": 0, "结算金额": 0, "收益率": 0,
             "最大回撤": 0, "夏普比率": 0, "标准差": 0,
-            "交易次数": 0, "胜率": 0, "最大盈利": 0, "最大亏损": 0
+            "交易次数": 0, "胜率": 0, "最大盈利": 0, "最大亏损": 0,
+            "水下时间": 0, "最长水下": 0, "持仓时间": 0
         }
         
         self.backtest_result_labels = {}
@@ -242,11 +338,7 @@ class TradingEngine:
         
         # 回测订单表格
         columns = ("序列", "时间", "操作", "币种", "盈亏", "保证金", "控制资金", "开仓价", "平仓价", "手续费")
-        self.backtest_order_tree = ttk.Treeview(self.order_list_frame, columns=columns, show="headings")
-        for col in columns:
-            self.backtest_order_tree.heading(col, text=col)
-            width = 150 if col == "时间" else 100
-            self.backtest_order_tree.column(col, width=width)
+        self.backtest_order_table = OrderTable(self.order_list_frame, columns, widths={"时间": 150})
     
     def create_simulation_widgets(self):
         # 实测专用控制按钮
@@ -258,6 +350,10 @@ class TradingEngine:
         self.start_monitor_btn.pack(side="left", padx=5)
         self.stop_monitor_btn = ttk.Button(self.simulation_control_frame, text="停止监控价格", command=self.stop_price_monitor, state=tk.DISABLED)
         self.stop_monitor_btn.pack(side="left", padx=5)
+        ttk.Label(self.simulation_control_frame, text="回放倍速(0为最快):").pack(side="left", padx=5)
+        self.replay_speed = tk.DoubleVar(value=0)
+        ttk.Entry(self.simulation_control_frame, textvariable=self.replay_speed, width=6).pack(side="left", padx=5)
+        ttk.Button(self.simulation_control_frame, text="回放录制", command=self.start_tick_replay).pack(side="left", padx=5)
         
         # 实测结果
         self.simulation_result_frame = ttk.LabelFrame(self.root, text="实测结果")
@@ -266,7 +362,8 @@ class TradingEngine:
         self.simulation_result = {
             "已运行时长": 0, "已获取数据条数": 0, "初始金额": 0,
             "当前保证金余额": 0, "未实现盈亏": 0, "总权益": 0,
-            "收益率": 0, "最大回撤": 0, "夏普比率": 0, "标准差": 0
+            "收益率": 0, "最大回撤": 0, "夏普比率": 0, "标准差": 0,
+            "交易次数": 0, "胜率": 0, "盈亏比": 0, "持仓时间": 0
         }
         
         self.simulation_result_labels = {}
@@ -281,11 +378,7 @@ class TradingEngine:
         
         # 实测订单表格
         columns = ("序列", "时间", "操作", "币种", "平仓盈亏", "保证金", "控制资金", "开仓价", "当前价", "平仓价", "手续费", "未实现盈亏")
-        self.simulation_order_tree = ttk.Treeview(self.order_list_frame, columns=columns, show="headings")
-        for col in columns:
-            self.simulation_order_tree.heading(col, text=col)
-            width = 150 if col == "时间" else 100
-            self.simulation_order_tree.column(col, width=width)
+        self.simulation_order_table = OrderTable(self.order_list_frame, columns, widths={"时间": 150})
     
     def create_live_widgets(self):
         # 实盘API设置
@@ -310,6 +403,8 @@ class TradingEngine:
         ttk.Button(self.live_control_frame, text="开始实盘交易", command=self.start_live_trading).pack(side="left", padx=5)
         self.stop_live_btn = ttk.Button(self.live_control_frame, text="停止实盘交易", command=self.stop_live_trading, state=tk.DISABLED)
         self.stop_live_btn.pack(side="left", padx=5)
+        ttk.Button(self.live_control_frame, text="延迟统计", command=self.show_latency_stats).pack(side="left", padx=5)
+        ttk.Button(self.live_control_frame, text="导出延迟", command=self.export_latency).pack(side="left", padx=5)
         
         # 双向持仓设置
         self.dspc = tk.Checkbutton(self.live_control_frame, text="启用双向持仓模式", variable=tk.BooleanVar(value=False), command=self.toggle_dual_position)
@@ -322,7 +417,8 @@ class TradingEngine:
         self.live_result = {
             "已运行时长": 0, "交易次数": 0, "初始金额": 0,
             "当前保证金余额": 0, "未实现盈亏": 0, "总权益": 0,
-            "收益率": 0, "最大回撤": 0
+            "收益率": 0, "最大回撤": 0, "胜率": 0, "盈亏比": 0,
+            "夏普比率": 0, "标准差": 0, "持仓时间": 0
         }
         
         self.live_result_labels = {}
@@ -337,11 +433,7 @@ class TradingEngine:
         
         # 实盘订单表格
         columns = ("序列", "时间", "操作", "币种", "盈亏", "保证金", "控制资金", "开仓价", "平仓价", "手续费", "订单状态")
-        self.live_order_tree = ttk.Treeview(self.order_list_frame, columns=columns, show="headings")
-        for col in columns:
-            self.live_order_tree.heading(col, text=col)
-            width = 150 if col == "时间" else 100
-            self.live_order_tree.column(col, width=width)
+        self.live_order_table = OrderTable(self.order_list_frame, columns, widths={"时间": 150})
         
         # 实盘相关变量
         self.binance_client = None
@@ -374,16 +466,16 @@ class TradingEngine:
         if mode == 0:  # 回测
             self.backtest_control_frame.pack(fill="x", padx=10, pady=5)
             self.backtest_result_frame.pack(fill="x", padx=10, pady=5)
-            self.backtest_order_tree.pack(fill="both", expand=True)
+            self.backtest_order_table.pack(fill="both", expand=True)
         elif mode == 1:  # 实测
             self.simulation_control_frame.pack(fill="x", padx=10, pady=5)
             self.simulation_result_frame.pack(fill="x", padx=10, pady=5)
-            self.simulation_order_tree.pack(fill="both", expand=True)
+            self.simulation_order_table.pack(fill="both", expand=True)
         elif mode == 2:  # 实盘
             self.api_frame.pack(fill="x", padx=10, pady=5)
             self.live_control_frame.pack(fill="x", padx=10, pady=5)
             self.live_result_frame.pack(fill="x", padx=10, pady=5)
-            self.live_order_tree.pack(fill="both", expand=True)
+            self.live_order_table.pack(fill="both", expand=True)
     
     def update_order_mode(self, *args):
         """更新订单模式显示"""
@@ -429,43 +521,36 @@ class TradingEngine:
             return
         
         try:
-            code = None
-            encodings = ['utf-8', 'gbk', 'latin-1', 'utf-16']
-            used_encoding = None
-            
             # 尝试多种编码格式打开文件
-            for encoding in encodings:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        code = f.read()
-                    used_encoding = encoding
-                    break
-                except UnicodeDecodeError:
-                    continue
-                except Exception as e:
-                    messagebox.showerror("错误", f"读取文件时出错: {str(e)}")
-                    return
-            
-            # 检查是否成功读取文件
-            if code is None:
-                messagebox.showerror("错误", "无法使用任何支持的编码格式读取文件，请将文件保存为UTF-8格式后重试")
+            try:
+                code, used_encoding = read_strategy_source(file_path)
+            except ValueError as e:
+                messagebox.showerror("错误", str(e))
                 return
-            elif code == '':
+            except Exception as e:
+                messagebox.showerror("错误", f"读取文件时出错: {str(e)}")
+                return
+            
+            if code == '':
                 messagebox.showerror("错误", "文件内容为空")
                 return
-            else:
-                self.output_text.insert(tk.END, f"成功使用 {used_encoding} 编码读取文件\n")
+            self.log(f"成功使用 {used_encoding} 编码读取文件\n")
             
-            namespace = {}
-            exec(code, namespace)
+            namespace = build_strategy_namespace(code)
             
-            if 'trade_signal' in namespace:
-                self.strategy = namespace['trade_signal']
+            if 'trade_signal' in namespace or 'trade_signals' in namespace:
+                self.strategy = namespace.get('trade_signal')
+                self.batch_strategy = namespace.get('trade_signals')
+                self.strategy_code = code
                 self.strategy_name = os.path.basename(file_path)
                 self.strategy_status.set(f"已导入: {self.strategy_name}")
-                self.output_text.insert(tk.END, f"成功导入策略: {self.strategy_name}\n")
+                self.log(f"成功导入策略: {self.strategy_name}\n")
+                if self.batch_strategy is not None:
+                    self.log("检测到批量接口 trade_signals，回测将直接使用批量信号\n")
+                if self.strategy is None:
+                    self.log("策略未提供 trade_signal 函数，只能用于回测\n")
             else:
-                messagebox.showerror("错误", "策略文件中未找到 trade_signal 函数")
+                messagebox.showerror("错误", "策略文件中未找到 trade_signal 或 trade_signals 函数")
                 self.strategy_status.set("导入失败: 缺少trade_signal函数")
                 
         except Exception as e:
@@ -503,41 +588,7 @@ class TradingEngine:
             
             start_timestamp = int(start_time.timestamp() * 1000)
             end_timestamp = int(end_time.timestamp() * 1000)
-            
-            # 映射到Binance的时间间隔常量
-            interval_mapping = {
-                "1m": Client.KLINE_INTERVAL_1MINUTE,
-                "3m": Client.KLINE_INTERVAL_3MINUTE,
-                "5m": Client.KLINE_INTERVAL_5MINUTE,
-                "15m": Client.KLINE_INTERVAL_15MINUTE,
-                "30m": Client.KLINE_INTERVAL_30MINUTE,
-                "1h": Client.KLINE_INTERVAL_1HOUR,
-                "4h": Client.KLINE_INTERVAL_4HOUR,
-                "1d": Client.KLINE_INTERVAL_1DAY,
-                "1w": Client.KLINE_INTERVAL_1WEEK
-            }
-            
-            binance_interval = interval_mapping.get(interval, Client.KLINE_INTERVAL_1HOUR)
-            
-            # 调用币安API获取数据（处理分页）
-            url = "https://fapi.binance.com/fapi/v1/klines"
-            limit = 1500  # 最大限制
-            all_data = []
-            current_start = start_timestamp
-            total_points = 0
-            
-            # 计算时间间隔的毫秒数
-            interval_ms = {
-                "1m": 60 * 1000,
-                "3m": 3 * 60 * 1000,
-                "5m": 5 * 60 * 1000,
-                "15m": 15 * 60 * 1000,
-                "30m": 30 * 60 * 1000,
-                "1h": 60 * 60 * 1000,
-                "4h": 4 * 60 * 60 * 1000,
-                "1d": 24 * 60 * 60 * 1000,
-                "1w": 7 * 24 * 60 * 60 * 1000
-            }.get(interval, 60 * 60 * 1000)
+            interval_ms = INTERVAL_MS.get(interval, INTERVAL_MS["1h"])
             
             # 计算总点数以更新进度
             total_expected = (end_timestamp - start_timestamp) // interval_ms
@@ -546,72 +597,24 @@ class TradingEngine:
                 self.progress_bar["value"] = 0
                 return
             
-            while current_start < end_timestamp:
-                # 计算本次请求的结束时间
-                current_end = min(current_start + limit * interval_ms, end_timestamp)
-                
-                params = {
-                    "symbol": symbol,
-                    "interval": binance_interval,
-                    "startTime": current_start,
-                    "endTime": current_end,
-                    "limit": limit
-                }
-                
-                try:
-                    response = requests.get(url, params=params, timeout=10)
-                    response.raise_for_status()  # 抛出HTTP错误状态码
-                    data = response.json()
-                    
-                    if not data:
-                        break
-                        
-                    all_data.extend(data)
-                    total_points += len(data)
-                    
-                    # 更新进度
-                    progress = min(90 * total_points / total_expected + 10, 95)
-                    self.progress_bar["value"] = progress
-                    self.root.update_idletasks()
-                    
-                    # 准备下一次请求
-                    current_start = data[-1][6] + 1  # 使用最后一个数据点的close_time
-                    
-                    # 避免请求过于频繁
-                    time.sleep(0.1)
-                    
-                except requests.exceptions.RequestException as e:
-                    self.status_label.config(text=f"网络请求错误: {str(e)}", foreground="red")
-                    self.progress_bar["value"] = 0
-                    return
-                except Exception as e:
-                    self.status_label.config(text=f"处理数据时出错: {str(e)}", foreground="red")
-                    self.progress_bar["value"] = 0
-                    return
+            # 先读取本地缓存，只下载缓存未覆盖的首尾区间
+            def update_progress(fraction):
+                self.progress_bar["value"] = min(90 * fraction + 10, 95)
+                self.root.update_idletasks()
             
-            if not all_data:
-                self.status_label.config(text="未获取到数据", foreground="red")
+            try:
+                df, downloaded = load_klines(symbol, interval, start_timestamp, end_timestamp,
+                                             cache=self.kline_cache, downloader=self.kline_downloader,
+                                             progress=update_progress)
+            except requests.exceptions.RequestException as e:
+                self.status_label.config(text=f"网络请求错误: {str(e)}", foreground="red")
                 self.progress_bar["value"] = 0
                 return
             
-            # 处理数据
-            df = pd.DataFrame(all_data, columns=[
-                "timestamp", "open", "high", "low", "close", "volume",
-                "close_time", "quote_asset_volume", "number_of_trades",
-                "taker_buy_base_asset_volume", "taker_buy_quote_asset_volume", "ignore"
-            ])
-            
-            # 转换数据类型
-            df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
-            df = df.set_index("timestamp")
-            numeric_columns = ["open", "high", "low", "close", "volume"]
-            df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
-            
-            # 移除无效数据行
-            df = df.dropna(subset=numeric_columns)
-            
-            # 去重
-            df = df[~df.index.duplicated(keep='last')]
+            if df.empty:
+                self.status_label.config(text="未获取到数据", foreground="red")
+                self.progress_bar["value"] = 0
+                return
             
             self.df = df
             self.data_queue.clear()
@@ -619,303 +622,520 @@ class TradingEngine:
             # 更新状态
             self.status_label.config(text=f"成功获取 {len(df)} 条数据", foreground="green")
             self.progress_bar["value"] = 100
-            self.output_text.insert(tk.END, f"成功获取 {symbol} {interval} 数据，共 {len(df)} 条\n")
+            self.log(f"成功获取 {symbol} {interval} 数据，共 {len(df)} 条（新下载 {downloaded} 条）\n")
             
         except Exception as e:
             self.status_label.config(text=f"获取数据失败: {str(e)}", foreground="red")
             self.progress_bar["value"] = 0
-            self.output_text.insert(tk.END, f"获取数据失败: {str(e)}\n")
+            self.log(f"获取数据失败: {str(e)}\n")
+    
+    def load_symbol_filters(self, symbols):
+        """读取交易对的下单规则（首次读取时请求一次，之后后台定时刷新），未启用或获取失败时返回 None"""
+        if not self.use_exchange_rules.get():
+            return None
+        try:
+            filters = self.exchange_rules.select(symbols)
+            self.exchange_rules.start()
+            return filters
+        except Exception as e:
+            self.log(f"获取交易规则失败，下单数量不按交易规则取整: {str(e)}\n")
+            return None
+    
+    def build_backtest_config(self):
+        """从界面读取回测参数；交易规则可能需要请求接口，由 load_config_filters 在后台线程中加载"""
+        return BacktestConfig(
+            symbol=self.symbol_var.get(),
+            initial_margin=self.initial_margin.get(),
+            fee_rate=self.fee_rate.get(),
+            order_mode=self.order_mode.get(),
+            fixed_margin=self.fixed_margin.get(),
+            percentage_margin=self.percentage_margin.get(),
+            leverage=self.leverage.get(),
+            param_model=self.param_model.get(),
+            enable_liquidation=self.enable_liquidation.get() == 1
+        )
+    
+    def load_config_filters(self, config, symbols=None):
+        """在后台线程中把交易规则写入回测参数，symbols 默认为 config 的交易对"""
+        config.symbol_filters = self.load_symbol_filters(symbols or [config.symbol])
+        return config
     
     def start_backtest(self):
         """开始回测"""
-        if self.strategy is None:
+        if self.strategy is None and self.batch_strategy is None:
             messagebox.showerror("错误", "请先导入策略")
             return
         
+        if self.backtest_thread and self.backtest_thread.is_alive():
+            messagebox.showerror("错误", "回测正在进行中")
+            return
+        
         if self.df.empty:
             self.fetch_data()
             if self.df.empty:
                 return
         
         # 初始化回测参数
-        self.initial_margin_val = self.initial_margin.get()
+        self.log_view.clear()
+        self.log(f"{self.strategy_name} 回测开始...\n")
+        config = self.build_backtest_config()
+        self.initial_margin_val = config.initial_margin
         self.current_margin.set(self.initial_margin_val)
-        self.order_list = []
+        self.positions = PositionBook()
         self.trade_orders = []
-        self.order_sequence = 1
-        self.output_text.delete(1.0, tk.END)
-        self.output_text.insert(tk.END, f"{self.strategy_name} 回测开始...\n")
         
         # 清空订单表格
-        for item in self.backtest_order_tree.get_children():
-            self.backtest_order_tree.delete(item)
+        self.backtest_order_table.clear()
+        
+        # 回测在后台线程执行，日志和订单分别写入日志缓冲和订单表格，由界面定时批量刷新
+        self.backtest_engine = BacktestEngine(
+            config, self.strategy,
+            log=self.log,
+            on_trade=self.add_backtest_trade,
+            batch_strategy=self.batch_strategy
+        )
+        self.backtest_result_obj = None
+        df = self.df
+        
+        def run():
+            self.load_config_filters(config)
+            self.backtest_result_obj = self.backtest_engine.run(df)
+        
+        self.backtest_thread = threading.Thread(target=run, daemon=True)
+        self.backtest_thread.start()
+        self.root.after(100, self.poll_backtest)
+    
+    def add_backtest_trade(self, trade):
+        """回测线程的平仓回调：写入订单表格"""
+        self.backtest_order_table.append((
+            trade["sequence"], trade["time"], trade["action"], trade["symbol"],
+            round(trade["profit"], 4), round(trade["margin"], 4),
+            round(trade["actual_control_funds"], 4),
+            round(trade["open_price"], 4), round(trade["close_price"], 4),
+            round(trade["total_fee"], 4)
+        ))
+    
+    def poll_backtest(self):
+        """等待回测线程结束后输出结果（日志和订单由各自的缓冲定时刷新）"""
+        if self.backtest_thread.is_alive():
+            self.root.after(100, self.poll_backtest)
+            return
         
-
-        processed_data = []
-        for index, row in self.df.iterrows():
-            time_str = index.strftime("%Y-%m-%d %H:%M:%S")
-            if self.param_model.get() == "开高低收":
-                processed_data.extend([
-                    (f"{time_str} open", row['open']),
-                    (f"{time_str} high", row['high']),
-                    (f"{time_str} low", row['low']),
-                    (f"{time_str} close", row['close'])
-                ])
-            elif self.param_model.get() == "开低高收":  # 修改为elif结构
-                processed_data.extend([
-                    (f"{time_str} open", row['open']),
-                    (f"{time_str} low", row['low']),
-                    (f"{time_str} high", row['high']),
-                    (f"{time_str} close", row['close'])
-                ])
-            else:  # 仅收盘价模型
-                processed_data.extend([
-                    (f"{time_str} close", row['close'])  # 只添加收盘价数据
-                ])
-
+        result = self.backtest_result_obj
+        if result is not None:
+            if isinstance(result, PortfolioBacktestResult):
+                self.log(f"\n各交易对结果:\n{result.format_symbol_summary()}\n")
+            else:
+                self.positions = self.backtest_engine.positions
+            self.trade_orders = result.trade_orders
+            self.current_margin.set(round(result.final_margin, 4))
+            self.calculate_backtest_result(result)
+    
+    def start_portfolio_backtest(self):
+        """多交易对组合回测：并发加载各交易对K线，在后台线程中共用一个保证金账户回测"""
+        if self.strategy_code is None:
+            messagebox.showerror("错误", "请先导入策略")
+            return
         
-        # 执行回测
-        margin_max = self.initial_margin_val
-        margin_min = self.initial_margin_val
-        backtest_running = True
+        if self.backtest_thread and self.backtest_thread.is_alive():
+            messagebox.showerror("错误", "回测正在进行中")
+            return
         
-        for time, price in processed_data:
-            if not backtest_running:
-                break
-                
+        symbols = [s.strip().upper() for s in self.portfolio_symbols_var.get().split(",") if s.strip()]
+        if not symbols:
+            messagebox.showerror("错误", "请填写组合交易对，多个交易对用逗号分隔")
+            return
+        
+        try:
+            start_time = datetime.strptime(self.start_date_var.get(), "%Y-%m-%d %H:%M:%S")
+            end_time = datetime.strptime(self.end_date_var.get(), "%Y-%m-%d %H:%M:%S")
+        except ValueError as e:
+            messagebox.showerror("错误", f"时间格式错误: {str(e)}")
+            return
+        start_timestamp = int(start_time.timestamp() * 1000)
+        end_timestamp = int(end_time.timestamp() * 1000)
+        interval = self.interval_var.get()
+        
+        self.log_view.clear()
+        self.log(f"{self.strategy_name} 组合回测开始：{', '.join(symbols)}\n")
+        config = self.build_backtest_config()
+        self.initial_margin_val = config.initial_margin
+        self.current_margin.set(self.initial_margin_val)
+        self.trade_orders = []
+        
+        self.backtest_order_table.clear()
+        
+        self.backtest_engine = PortfolioBacktestEngine(
+            config, self.strategy_code,
+            log=self.log,
+            on_trade=self.add_backtest_trade
+        )
+        self.backtest_result_obj = None
+        
+        def run():
+            log = self.log
             try:
-                signal = self.strategy(time, price)
-                self.output_text.insert(tk.END, f"{time}，价格: {price}，信号: {signal}\n")
-                
-                if signal in ["做多", "做空"]:
-                    # 计算订单保证金
-                    if self.order_mode.get() == "固定保证金模式":
-                        order_margin = self.fixed_margin.get()
-                    else:
-                        percent = self.percentage_margin.get() / 100
-                        order_margin = self.current_margin.get() * percent
-                    
-                    # 检查保证金是否充足
-                    if self.current_margin.get() < order_margin:
-                        self.output_text.insert(tk.END, "保证金不足，无法开仓\n")
-                        continue
-                    
-                    # 计算手续费和控制资金
-                    leverage = self.leverage.get()
-                    fee_rate = self.fee_rate.get() / 100
-                    fee = order_margin * leverage * fee_rate
-                    actual_control_funds = order_margin * leverage
-                    
-                    # 计算强平价格
-                    liquidation_price = self.calculate_liquidation_price(
-                        signal, price, self.current_margin.get(), leverage)
-                    
-                    # 更新保证金
-                    new_margin = self.current_margin.get() - order_margin - fee
-                    self.current_margin.set(round(new_margin, 4))
-                    
-                    # 更新最大最小保证金
-                    margin_max = max(margin_max, new_margin)
-                    margin_min = min(margin_min, new_margin)
-                    
-                    # 记录订单
-                    self.order_list.append({
-                        "sequence": self.order_sequence,
-                        "time": time,
-                        "action": signal,
-                        "symbol": self.symbol_var.get(),
-                        "margin": order_margin,
-                        "leverage": leverage,
-                        "fee": fee,
-                        "actual_control_funds": actual_control_funds,
-                        "open_price": price,
-                        "liquidation_price": liquidation_price
-                    })
-                    
-                    # 输出日志
-                    mode_text = "固定保证金" if self.order_mode.get() == "固定保证金模式" else f"百分比保证金({self.percentage_margin.get()}%)"
-                    self.output_text.insert(tk.END, 
-                        f"订单 {self.order_sequence}: {signal}，价格 {price}，保证金 {order_margin}，杠杆 {leverage}，手续费 {fee}，控制资金 {actual_control_funds}，强平价 {liquidation_price}\n")
-                    
-                    self.order_sequence += 1
-                
-                elif signal in ["平多", "平空"]:
-                    # 平仓处理
-                    for order in self.order_list.copy():
-                        if (signal == "平多" and order["action"] == "做多") or (signal == "平空" and order["action"] == "做空"):
-                            # 计算盈亏和手续费
-                            fee = order["actual_control_funds"] * fee_rate
-                            profit = self.calculate_profit(
-                                order["action"], order["open_price"], price, order["actual_control_funds"])
-                            
-                            # 更新保证金
-                            new_margin = self.current_margin.get() + order["margin"] + profit - fee
-                            self.current_margin.set(round(new_margin, 4))
-                            
-                            # 更新最大最小保证金
-                            margin_max = max(margin_max, new_margin)
-                            margin_min = min(margin_min, new_margin)
-                            
-                            # 记录平仓订单
-                            self.trade_orders.append({
-                                "sequence": order["sequence"],
-                                "time": time,
-                                "action": signal,
-                                "symbol": self.symbol_var.get(),
-                                "profit": profit,
-                                "margin": order["margin"],
-                                "actual_control_funds": order["actual_control_funds"],
-                                "open_price": order["open_price"],
-                                "close_price": price,
-                                "total_fee": order["fee"] + fee
-                            })
-                            
-                            # 添加到表格
-                            self.backtest_order_tree.insert('', 'end', values=(
-                                order["sequence"], time, signal, self.symbol_var.get(),
-                                round(profit, 4), round(order["margin"], 4),
-                                round(order["actual_control_funds"], 4),
-                                round(order["open_price"], 4), round(price, 4),
-                                round(order["fee"] + fee, 4)
-                            ))
-                            
-                            # 输出日志
-                            self.output_text.insert(tk.END, 
-                                f"订单 {order['sequence']}: {signal}，平仓价 {price}，盈亏 {profit}，手续费 {order['fee'] + fee}，余额 {self.current_margin.get()}\n")
-                            
-                            self.order_list.remove(order)
-                            break
-                
-                # 检查强平
-                if self.enable_liquidation.get() == 1:
-                    for order in self.order_list.copy():
-                        if (order["action"] == "做多" and price <= order["liquidation_price"]) or \
-                           (order["action"] == "做空" and price >= order["liquidation_price"]):
-                            
-                            # 计算强平盈亏和手续费
-                            fee = order["actual_control_funds"] * fee_rate
-                            profit = self.calculate_profit(
-                                order["action"], order["open_price"], price, order["actual_control_funds"])
-                            
-                            # 更新保证金
-                            new_margin = self.current_margin.get() + order["margin"] + profit - fee
-                            self.current_margin.set(round(new_margin, 4))
-                            
-                            # 更新最大最小保证金
-                            margin_max = max(margin_max, new_margin)
-                            margin_min = min(margin_min, new_margin)
-                            
-                            # 记录强平订单
-                            self.trade_orders.append({
-                                "sequence": order["sequence"],
-                                "time": time,
-                                "action": f"强平{order['action'][:-1]}",
-                                "symbol": self.symbol_var.get(),
-                                "profit": profit,
-                                "margin": order["margin"],
-                                "actual_control_funds": order["actual_control_funds"],
-                                "open_price": order["open_price"],
-                                "close_price": price,
-                                "total_fee": order["fee"] + fee
-                            })
-                            
-                            # 添加到表格
-                            self.backtest_order_tree.insert('', 'end', values=(
-                                order["sequence"], time, f"强平{order['action'][:-1]}", self.symbol_var.get(),
-                                round(profit, 4), round(order["margin"], 4),
-                                round(order["actual_control_funds"], 4),
-                                round(order["open_price"], 4), round(price, 4),
-                                round(order["fee"] + fee, 4)
-                            ))
-                            
-                            # 输出日志
-                            self.output_text.insert(tk.END, 
-                                f"订单 {order['sequence']}: 强平{order['action'][:-1]}，价格 {price}，盈亏 {profit}，余额 {self.current_margin.get()}\n")
-                            
-                            self.order_list.remove(order)
-                            
-                            # 检查是否爆仓
-                            if self.current_margin.get() <= 0:
-                                self.output_text.insert(tk.END, "账户爆仓，回测结束\n")
-                                backtest_running = False
-                                break
-                
-                # 检查是否爆仓
-                if self.current_margin.get() <= 0:
-                    self.output_text.insert(tk.END, "账户爆仓，回测结束\n")
-                    backtest_running = False
-                    break
-                
-                # 刷新界面
-                self.root.update_idletasks()
-                
+                frames, downloaded = load_portfolio_klines(
+                    symbols, interval, start_timestamp, end_timestamp,
+                    cache=self.kline_cache, downloader=self.kline_downloader)
             except Exception as e:
-                self.output_text.insert(tk.END, f"回测过程出错: {str(e)}\n")
-                break
-        
-        # 计算回测结果
-        self.calculate_backtest_result(margin_max, margin_min)
-        self.output_text.insert(tk.END, "回测完成\n")
+                log(f"获取组合数据失败: {str(e)}\n")
+                return
+            for symbol, df in frames.items():
+                log(f"{symbol} {interval} 共 {len(df)} 条" + ("，无数据已跳过" if df.empty else "") + "\n")
+            log(f"新下载 {downloaded} 条\n")
+            self.load_config_filters(config, symbols)
+            self.backtest_result_obj = self.backtest_engine.run(frames)
+        
+        self.backtest_thread = threading.Thread(target=run, daemon=True)
+        self.backtest_thread.start()
+        self.root.after(100, self.poll_backtest)
     
     def stop_backtest(self):
         """停止回测"""
-        # 在实际实现中，需要设置一个标志位来终止回测循环
-        self.output_text.insert(tk.END, "回测已停止\n")
+        if self.backtest_engine is not None and self.backtest_thread and self.backtest_thread.is_alive():
+            self.backtest_engine.stop()
+        else:
+            self.log("回测已停止\n")
+    
+    def open_sweep_window(self):
+        """打开参数优化窗口"""
+        if self.strategy_code is None:
+            messagebox.showerror("错误", "请先导入策略")
+            return
+        
+        if self.sweep_window is not None and self.sweep_window.winfo_exists():
+            self.sweep_window.lift()
+            return
+        
+        self.sweep_window = tk.Toplevel(self.root)
+        self.sweep_window.title(f"参数优化 - {self.strategy_name}")
+        self.sweep_window.geometry("1000x600")
+        
+        control_frame = ttk.Frame(self.sweep_window)
+        control_frame.pack(fill="x", padx=10, pady=5)
+        
+        ttk.Label(control_frame, text="参数网格:").pack(side="left", padx=5)
+        self.init_sweep_vars()
+        ttk.Entry(control_frame, textvariable=self.sweep_grid_var, width=50).pack(side="left", padx=5)
+        
+        ttk.Label(control_frame, text="进程数:").pack(side="left", padx=5)
+        ttk.Entry(control_frame, textvariable=self.sweep_workers_var, width=5).pack(side="left", padx=5)
+        
+        ttk.Button(control_frame, text="开始优化", command=self.start_sweep).pack(side="left", padx=5)
+        ttk.Button(control_frame, text="停止优化", command=self.stop_sweep).pack(side="left", padx=5)
+        
+        self.sweep_status = ttk.Label(self.sweep_window, text="参数名与回测参数（如 leverage、fee_rate）同名时作用于回测设置，其余注入策略文件的同名全局变量；支持 起:止:步长 写法")
+        self.sweep_status.pack(fill="x", padx=10)
+        
+        # 结果表格，点击表头排序
+        columns = ("参数",) + tuple(SWEEP_METRICS) + ("错误",)
+        self.sweep_tree = ttk.Treeview(self.sweep_window, columns=columns, show="headings")
+        for col in columns:
+            self.sweep_tree.heading(col, text=col, command=lambda c=col: self.sort_sweep_table(c))
+            width = 300 if col == "参数" else 90
+            self.sweep_tree.column(col, width=width)
+        self.sweep_tree.pack(fill="both", expand=True, padx=10, pady=5)
+        self.sweep_rows = []
+        self.sweep_sort = ("收益率", True)
+    
+    def init_sweep_vars(self):
+        """参数优化和滚动优化共用参数网格和进程数设置"""
+        if not hasattr(self, "sweep_grid_var"):
+            self.sweep_grid_var = tk.StringVar(value="window=10,20,30; std_multiplier=1.5,2,2.5")
+            self.sweep_workers_var = tk.IntVar(value=os.cpu_count() or 1)
+    
+    def start_sweep(self):
+        """在后台进程池中运行参数优化"""
+        if self.sweep_thread and self.sweep_thread.is_alive():
+            messagebox.showerror("错误", "参数优化正在进行中")
+            return
+        
+        try:
+            combos = expand_grid(parse_grid(self.sweep_grid_var.get()))
+            workers = max(int(self.sweep_workers_var.get()), 1)
+        except Exception as e:
+            messagebox.showerror("错误", f"参数网格格式错误: {str(e)}")
+            return
+        
+        if self.df.empty:
+            self.fetch_data()
+            if self.df.empty:
+                return
+        
+        self.sweep_rows = []
+        self.sweep_total = len(combos)
+        self.sweep_pending_rows = deque()
+        for item in self.sweep_tree.get_children():
+            self.sweep_tree.delete(item)
+        
+        self.sweep = ParameterSweep(self.strategy_code, self.df, self.build_backtest_config(), workers)
+        
+        def run():
+            self.load_config_filters(self.sweep.base_config)
+            self.sweep.run(combos, on_result=self.sweep_pending_rows.append)
+        
+        self.sweep_thread = threading.Thread(target=run, daemon=True)
+        self.sweep_thread.start()
+        self.sweep_status.config(text=f"参数优化开始，共 {len(combos)} 个组合，{workers} 个进程")
+        self.root.after(200, self.poll_sweep)
+    
+    def stop_sweep(self):
+        """停止参数优化"""
+        if self.sweep is not None:
+            self.sweep.stop()
+    
+    def poll_sweep(self):
+        """把子进程返回的结果批量刷新到表格"""
+        if self.sweep_window is None or not self.sweep_window.winfo_exists():
+            return
+        
+        new_rows = []
+        while self.sweep_pending_rows:
+            new_rows.append(self.sweep_pending_rows.popleft())
+        if new_rows:
+            self.sweep_rows.extend(new_rows)
+            self.sort_sweep_table(self.sweep_sort[0], toggle=False)
+        
+        running = self.sweep_thread.is_alive()
+        state = "进行中" if running else ("已停止" if self.sweep.stop_requested else "已完成")
+        self.sweep_status.config(text=f"参数优化{state}：{len(self.sweep_rows)}/{self.sweep_total}")
+        if running or self.sweep_pending_rows:
+            self.root.after(200, self.poll_sweep)
+    
+    def sort_sweep_table(self, column, toggle=True):
+        """按列排序并重绘参数优化结果"""
+        sort_column, reverse = self.sweep_sort
+        if toggle:
+            reverse = not reverse if column == sort_column else True
+        self.sweep_sort = (column, reverse)
+        
+        if column == "参数":
+            key = lambda row: format_params(row["params"])
+        elif column == "错误":
+            key = lambda row: row["error"]
+        else:
+            key = lambda row: row[column]
+        self.sweep_rows.sort(key=key, reverse=reverse)
+        
+        self.sweep_tree.delete(*self.sweep_tree.get_children())
+        for row in self.sweep_rows:
+            self.sweep_tree.insert('', 'end', values=(
+                format_params(row["params"]), *(row[key] for key in SWEEP_METRICS), row["error"]))
+    
+    def open_walk_forward_window(self):
+        """打开滚动优化窗口"""
+        if self.strategy_code is None:
+            messagebox.showerror("错误", "请先导入策略")
+            return
+        
+        if self.walk_forward_window is not None and self.walk_forward_window.winfo_exists():
+            self.walk_forward_window.lift()
+            return
+        
+        self.walk_forward_window = tk.Toplevel(self.root)
+        self.walk_forward_window.title(f"滚动优化 - {self.strategy_name}")
+        self.walk_forward_window.geometry("1100x700")
+        
+        self.init_sweep_vars()
+        if not hasattr(self, "wf_train_var"):
+            self.wf_train_var = tk.IntVar(value=500)
+            self.wf_test_var = tk.IntVar(value=100)
+            self.wf_metric_var = tk.StringVar(value="收益率")
+            self.wf_anchored_var = tk.IntVar(value=0)
+        
+        control_frame = ttk.Frame(self.walk_forward_window)
+        control_frame.pack(fill="x", padx=10, pady=5)
+        ttk.Label(control_frame, text="参数网格:").pack(side="left", padx=5)
+        ttk.Entry(control_frame, textvariable=self.sweep_grid_var, width=40).pack(side="left", padx=5)
+        ttk.Label(control_frame, text="样本内K线:").pack(side="left", padx=5)
+        ttk.Entry(control_frame, textvariable=self.wf_train_var, width=6).pack(side="left", padx=5)
+        ttk.Label(control_frame, text="样本外K线:").pack(side="left", padx=5)
+        ttk.Entry(control_frame, textvariable=self.wf_test_var, width=6).pack(side="left", padx=5)
+        ttk.Label(control_frame, text="选参指标:").pack(side="left", padx=5)
+        ttk.Combobox(control_frame, textvariable=self.wf_metric_var, values=SWEEP_METRICS, width=8,
+                     state="readonly").pack(side="left", padx=5)
+        ttk.Checkbutton(control_frame, text="固定起点", variable=self.wf_anchored_var).pack(side="left", padx=5)
+        ttk.Label(control_frame, text="进程数:").pack(side="left", padx=5)
+        ttk.Entry(control_frame, textvariable=self.sweep_workers_var, width=5).pack(side="left", padx=5)
+        ttk.Button(control_frame, text="开始", command=self.start_walk_forward).pack(side="left", padx=5)
+        ttk.Button(control_frame, text="停止", command=self.stop_walk_forward).pack(side="left", padx=5)
+        
+        self.wf_status = ttk.Label(self.walk_forward_window, text="每个窗口在样本内选出最优参数，再用该参数回测紧随其后的样本外区间；使用「获取数据」得到的K线")
+        self.wf_status.pack(fill="x", padx=10)
+        
+        columns = ("窗口", "样本外开始", "参数", "样本内指标") + tuple(SWEEP_METRICS) + ("错误",)
+        self.wf_tree = ttk.Treeview(self.walk_forward_window, columns=columns, show="headings", height=12)
+        for col in columns:
+            self.wf_tree.heading(col, text=col)
+            width = 260 if col == "参数" else (140 if col == "样本外开始" else 80)
+            self.wf_tree.column(col, width=width)
+        self.wf_tree.pack(fill="both", expand=True, padx=10, pady=5)
+        
+        # 拼接后的样本外资金曲线
+        self.wf_canvas = tk.Canvas(self.walk_forward_window, height=220, background="white")
+        self.wf_canvas.pack(fill="x", padx=10, pady=5)
+    
+    def start_walk_forward(self):
+        """在后台进程池中运行滚动优化"""
+        if self.walk_forward_thread and self.walk_forward_thread.is_alive():
+            messagebox.showerror("错误", "滚动优化正在进行中")
+            return
+        
+        try:
+            combos = expand_grid(parse_grid(self.sweep_grid_var.get()))
+            workers = max(int(self.sweep_workers_var.get()), 1)
+            train_bars = int(self.wf_train_var.get())
+            test_bars = int(self.wf_test_var.get())
+        except Exception as e:
+            messagebox.showerror("错误", f"参数格式错误: {str(e)}")
+            return
+        
+        if self.df.empty:
+            self.fetch_data()
+            if self.df.empty:
+                return
+        
+        try:
+            self.walk_forward = WalkForward(
+                self.strategy_code, self.df, self.build_backtest_config(), train_bars, test_bars,
+                anchored=self.wf_anchored_var.get() == 1, metric=self.wf_metric_var.get(), max_workers=workers)
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        
+        self.wf_tree.delete(*self.wf_tree.get_children())
+        self.wf_canvas.delete("all")
+        self.wf_pending_windows = deque()
+        self.wf_done = 0
+        self.wf_result = None
+        total = len(self.walk_forward.windows)
+        
+        def run():
+            try:
+                self.load_config_filters(self.walk_forward.base_config)
+                self.wf_result = self.walk_forward.run(combos, on_window=self.wf_pending_windows.append)
+            except Exception as e:
+                logger.error(f"滚动优化出错: {e}")
+                self.wf_result = e
+        
+        self.walk_forward_thread = threading.Thread(target=run, daemon=True)
+        self.walk_forward_thread.start()
+        self.wf_status.config(text=f"滚动优化开始，共 {total} 个窗口，每个窗口 {len(combos)} 个组合，{workers} 个进程")
+        self.root.after(200, self.poll_walk_forward)
+    
+    def stop_walk_forward(self):
+        """停止滚动优化"""
+        if self.walk_forward is not None:
+            self.walk_forward.stop()
+    
+    def poll_walk_forward(self):
+        """把完成的窗口刷新到表格，全部完成后绘制样本外资金曲线"""
+        if self.walk_forward_window is None or not self.walk_forward_window.winfo_exists():
+            return
+        
+        metric = self.walk_forward.metric
+        while self.wf_pending_windows:
+            window = self.wf_pending_windows.popleft()
+            self.wf_done += 1
+            oos = window["样本外"] or {key: "" for key in SWEEP_METRICS + ["error"]}
+            self.wf_tree.insert('', 'end', values=(
+                window["窗口"], window["样本外时间"],
+                format_params(window["参数"]) if window["参数"] else "",
+                window["样本内"][metric] if window["样本内"] else "",
+                *(oos[key] for key in SWEEP_METRICS),
+                oos["error"] if window["样本外"] else "样本内回测全部出错"))
+        
+        total = len(self.walk_forward.windows)
+        if self.walk_forward_thread.is_alive() or self.wf_pending_windows:
+            self.wf_status.config(text=f"滚动优化进行中：{self.wf_done}/{total} 个窗口")
+            self.root.after(200, self.poll_walk_forward)
+            return
+        
+        if isinstance(self.wf_result, Exception):
+            self.wf_status.config(text=f"滚动优化出错: {self.wf_result}")
+            return
+        if self.wf_result is None:
+            return
+        
+        windows, curve, summary = self.wf_result
+        state = "已停止" if self.walk_forward.stop_requested else "已完成"
+        text = "，".join(f"{key}: {value}{'%' if key in ['样本外收益率', '样本外最大回撤', '样本外胜率'] else ''}"
+                        for key, value in summary.items())
+        self.wf_status.config(text=f"滚动优化{state}：{text}")
+        self.draw_equity_curve(self.wf_canvas, [equity for _, equity in curve])
+    
+    def draw_equity_curve(self, canvas, values, empty_text="样本外没有回测数据"):
+        """在画布上绘制资金曲线，点数多于画布宽度时按每段最小/最大值抽稀"""
+        canvas.delete("all")
+        canvas.update_idletasks()
+        width = max(canvas.winfo_width(), 200)
+        height = max(canvas.winfo_height(), 100)
+        if len(values) < 2:
+            canvas.create_text(width / 2, height / 2, text=empty_text)
+            return
+        if len(values) > width:
+            values = [float(values[i]) for i in decimate_minmax(values, width)]
+        
+        pad = 20
+        low, high = min(values), max(values)
+        span = (high - low) or 1
+        step = (width - 2 * pad) / (len(values) - 1)
+        points = []
+        for i, value in enumerate(values):
+            points.extend((pad + i * step, height - pad - (value - low) / span * (height - 2 * pad)))
+        canvas.create_line(*points, fill="blue")
+        canvas.create_text(pad, pad / 2, anchor="w", text=f"最高 {round(high, 2)}")
+        canvas.create_text(pad, height - pad / 2, anchor="w", text=f"最低 {round(low, 2)}")
     
     def calculate_liquidation_price(self, action, entry_price, margin, leverage):
         """计算强平价格"""
-        try:
-            if action == "做多":
-                return entry_price * (1 - (margin * leverage) / (margin * leverage + margin))
-            else:  # 做空
-                return entry_price * (1 + (margin * leverage) / (margin * leverage + margin))
-        except:
-            return 0
+        return calculate_liquidation_price(action, entry_price, margin, leverage)
     
     def calculate_profit(self, action, open_price, close_price, control_funds):
         """计算盈亏"""
-        if action == "做多":
-            return control_funds * (close_price - open_price) / open_price
-        else:  # 做空
-            return control_funds * (open_price - close_price) / open_price
-    
-    def calculate_backtest_result(self, margin_max, margin_min):
-        """计算回测结果"""
-        final_margin = self.current_margin.get()
-        initial = self.initial_margin_val
-        
-        # 计算基本结果
-        self.backtest_result["初始金额"] = round(initial, 2)
-        self.backtest_result["结算金额"] = round(final_margin, 2)
-        self.backtest_result["收益率"] = round((final_margin - initial) / initial * 100, 2) if initial != 0 else 0
-        self.backtest_result["最大回撤"] = round((initial - margin_min) / initial * 100, 2) if initial != 0 else 0
-        self.backtest_result["交易次数"] = len(self.trade_orders)
-        
-        # 计算胜率
-        winning_trades = [t for t in self.trade_orders if t["profit"] > 0]
-        self.backtest_result["胜率"] = round(len(winning_trades) / len(self.trade_orders) * 100, 2) if self.trade_orders else 0
-        
-        # 计算最大盈利和亏损
-        if self.trade_orders:
-            self.backtest_result["最大盈利"] = round(max(t["profit"] for t in self.trade_orders), 2)
-            self.backtest_result["最大亏损"] = round(min(t["profit"] for t in self.trade_orders), 2)
-        
-        # 计算夏普比率和标准差（简化版）
-        if len(self.trade_orders) >= 2:
-            profits = [t["profit"] for t in self.trade_orders]
-            mean_profit = sum(profits) / len(profits)
-            std_dev = math.sqrt(sum((p - mean_profit) **2 for p in profits) / len(profits))
-            self.backtest_result["标准差"] = round(std_dev, 4)
-            self.backtest_result["夏普比率"] = round(mean_profit / std_dev * math.sqrt(252), 2) if std_dev != 0 else 0
+        return calculate_profit(action, open_price, close_price, control_funds)
+    
+    def calculate_backtest_result(self, result):
+        """展示回测结果"""
+        self.backtest_result.update(result.summary)
         
         # 更新界面
         for key, value in self.backtest_result.items():
-            self.backtest_result_labels[key].config(text=f"{value}{'%' if key in ['收益率', '最大回撤', '胜率'] else ''}")
+            self.backtest_result_labels[key].config(text=f"{value}{'%' if key in PERCENT_RESULT_KEYS else ''}")
+    
+    def show_equity_curve(self):
+        """在新窗口中绘制最近一次回测的逐tick权益曲线"""
+        result = self.backtest_result_obj
+        if result is None or result.equity is None or len(result.equity) < 2:
+            messagebox.showerror("错误", "请先完成一次回测")
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title(f"资金曲线 - {self.strategy_name}")
+        window.geometry("1000x400")
+        summary = result.summary
+        ttk.Label(window, text=f"共 {len(result.equity)} 个tick，最大回撤 {summary['最大回撤']}%，"
+                               f"水下时间 {summary['水下时间']}%，最长水下 {summary['最长水下']} 个tick，"
+                               f"持仓时间 {summary['持仓时间']}%").pack(fill="x", padx=10, pady=5)
+        canvas = tk.Canvas(window, background="white")
+        canvas.pack(fill="both", expand=True, padx=10, pady=5)
+        window.update_idletasks()
+        self.draw_equity_curve(canvas, result.equity)
+    
+    def check_streaming_strategy(self):
+        """实测、实盘和预热需要逐tick调用的 trade_signal 函数"""
+        if self.strategy is None:
+            if self.batch_strategy is not None:
+                messagebox.showerror("错误", "当前策略只提供 trade_signals，实测、实盘和预热需要 trade_signal 函数")
+            else:
+                messagebox.showerror("错误", "请先导入策略")
+            return False
+        return True
     
     def preheat(self):
         """盘前预热"""
-        if self.strategy is None:
-            messagebox.showerror("错误", "请先导入策略")
+        if not self.check_streaming_strategy():
             return
         
         if self.df.empty:
@@ -923,341 +1143,288 @@ class TradingEngine:
             if self.df.empty:
                 return
         
-        self.output_text.insert(tk.END, "开始盘前预热...\n")
+        self.log("开始盘前预热...\n")
         
         # 处理数据并预热策略
-        processed_data = []
-        for index, row in self.df.iterrows():
-            time_str = index.strftime("%Y-%m-%d %H:%M:%S")
-            if self.param_model.get() == "开高低收":
-                processed_data.extend([
-                    (f"{time_str} open", row['open']),
-                    (f"{time_str} high", row['high']),
-                    (f"{time_str} low", row['low']),
-                    (f"{time_str} close", row['close'])
-                ])
-            else:
-                processed_data.extend([
-                    (f"{time_str} open", row['open']),
-                    (f"{time_str} low", row['low']),
-                    (f"{time_str} high", row['high']),
-                    (f"{time_str} close", row['close'])
-                ])
+        processed_data = expand_ohlc(self.df, self.param_model.get())
         
         # 执行预热
         for time, price in processed_data:
             try:
                 signal = self.strategy(time, price)
             except Exception as e:
-                self.output_text.insert(tk.END, f"预热过程出错: {str(e)}\n")
+                self.log(f"预热过程出错: {str(e)}\n")
                 return
         
-        self.output_text.insert(tk.END, "盘前预热完成\n")
+        self.log("盘前预热完成\n")
     
     def start_price_monitor(self):
         """开始价格监控（实测）"""
-        if self.strategy is None:
-            messagebox.showerror("错误", "请先导入策略")
+        if not self.check_streaming_strategy():
             return
         
+        self.begin_simulation("开始价格监控和模拟交易...\n")
+        
+        # 启动监控线程
+        threading.Thread(target=self.price_monitor_thread, daemon=True).start()
+        # 启动结果更新线程
+        threading.Thread(target=self.update_simulation_results_thread, daemon=True).start()
+    
+    def start_tick_replay(self):
+        """在实测中回放录制的行情，倍速为 0 时以最快速度回放"""
+        if not self.check_streaming_strategy():
+            return
+        if self.price_monitor_running:
+            messagebox.showerror("错误", "请先停止价格监控")
+            return
+        
+        file_path = filedialog.askopenfilename(
+            initialdir=DEFAULT_TICK_LOG_DIR if os.path.isdir(DEFAULT_TICK_LOG_DIR) else None,
+            filetypes=[("行情录制", "*.ticks"), ("所有文件", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            tick_log = TickLog(file_path)
+        except Exception as e:
+            messagebox.showerror("错误", f"读取录制文件失败: {str(e)}")
+            return
+        
+        self.begin_simulation(f"回放 {os.path.basename(file_path)}，{tick_log.symbol} 共 {len(tick_log)} 条行情，"
+                              f"录制时长 {tick_log.duration / 3600:.2f} 小时\n", tick_log.symbol)
+        threading.Thread(target=self.tick_replay_thread, args=(tick_log,), daemon=True).start()
+        threading.Thread(target=self.update_simulation_results_thread, daemon=True).start()
+    
+    def begin_simulation(self, message, symbol=None):
+        """重置实测账户和表格，创建驱动实测的事件引擎；symbol 为回放录制时的交易对，默认为当前交易对"""
         self.price_monitor_running = True
         self.start_monitor_btn.config(state=tk.DISABLED)
         self.stop_monitor_btn.config(state=tk.NORMAL)
         
         # 初始化参数
+        self.price_service.ttl = self.price_ttl.get()
         self.current_margin.set(self.initial_margin.get())
-        self.order_list = []
-        self.trade_orders = []
-        self.order_sequence = 1
         self.start_time = datetime.now()
-        self.data_count = 0
         
         # 清空订单表格
-        for item in self.simulation_order_tree.get_children():
-            self.simulation_order_tree.delete(item)
-        
-        self.output_text.delete(1.0, tk.END)
-        self.output_text.insert(tk.END, "开始价格监控和模拟交易...\n")
-        
-        # 启动监控线程
-        threading.Thread(target=self.price_monitor_thread, daemon=True).start()
-        # 启动结果更新线程
-        threading.Thread(target=self.update_simulation_results_thread, daemon=True).start()
+        self.simulation_order_table.clear()
+        
+        self.log_view.clear()
+        self.log(message)
+        
+        # 开平仓、手续费和强平由事件驱动引擎按回测的口径计算，交易规则在行情线程开始时查一次
+        config = self.build_backtest_config()
+        if symbol:
+            config.symbol = symbol
+        engine = EventEngine(config, self.strategy, log=self.log,
+                             on_trade=self.add_simulation_trade, stop_on_error=False)
+        self.simulation_engine = engine
+        engine.metrics = self.simulation_metrics = MetricsAccumulator(config.initial_margin)
+        self.simulation_result_obj = engine.begin()
+        self.positions = engine.positions
+        self.trade_orders = engine.trade_orders
+        engine.bus.subscribe(FILL, lambda event: self.current_margin.set(round(engine.margin, 4)))
     
     def stop_price_monitor(self):
         """停止价格监控"""
         self.price_monitor_running = False
         self.start_monitor_btn.config(state=tk.NORMAL)
         self.stop_monitor_btn.config(state=tk.DISABLED)
-        self.output_text.insert(tk.END, "已停止价格监控\n")
+        self.log("已停止价格监控\n")
     
     def price_monitor_thread(self):
-        """价格监控线程"""
+        """价格监控线程：把推送或轮询得到的行情交给事件驱动引擎"""
         symbol = self.symbol_var.get()
         interval = self.interval_var.get()
+        is_running = lambda: self.price_monitor_running
         
-        interval_seconds = {
-            "1m": 60, "3m": 180, "5m": 300, "15m": 900,
-            "30m": 1800, "1h": 3600, "4h": 14400, "1d": 86400, "1w": 604800
-        }.get(interval, 3600)
-        
-        while self.price_monitor_running:
+        if self.feed_mode.get() == "WebSocket推送":
+            source = snapshot_events(self.market_snapshots(symbol, interval, is_running), symbol,
+                                     self.trigger_mode.get())
+        else:
+            interval_seconds = {
+                "1m": 60, "3m": 180, "5m": 300, "15m": 900,
+                "30m": 1800, "1h": 3600, "4h": 14400, "1d": 86400, "1w": 604800
+            }.get(interval, 3600)
+            source = poll_events(lambda: self.poll_price(symbol), interval_seconds, is_running, symbol,
+                                 on_error=lambda e: self.log(f"监控过程出错: {str(e)}\n"))
+        
+        # 数据源在加入事件队列时就会取第一条行情，录制文件需要先创建
+        self.open_tick_recorder(symbol)
+        engine = self.simulation_engine
+        self.load_config_filters(engine.config)
+        try:
+            engine.bus.add_source(source)
+            result = engine.finish(self.simulation_result_obj)
+        finally:
+            # 爆仓提前结束时关闭数据源，断开行情推送
+            source.close()
+            self.close_tick_recorder()
+        if result.bankrupt:
+            self.price_monitor_running = False
+    
+    def tick_replay_thread(self, tick_log):
+        """回放线程：把录制的行情按倍速交给事件引擎，结束后输出回测口径的汇总"""
+        engine = self.simulation_engine
+        self.load_config_filters(engine.config)
+        speed = max(self.replay_speed.get(), 0)
+        started = time.perf_counter()
+        engine.bus.add_source(recorded_events(tick_log, self.trigger_mode.get(), speed,
+                                              lambda: self.price_monitor_running))
+        result = engine.finish(self.simulation_result_obj)
+        self.log(f"回放结束，处理 {result.ticks} 个tick，用时 {time.perf_counter() - started:.2f} 秒\n"
+                 f"{result.format_summary()}\n")
+        self.price_monitor_running = False
+        self.root.after(0, lambda: (self.start_monitor_btn.config(state=tk.NORMAL),
+                                    self.stop_monitor_btn.config(state=tk.DISABLED)))
+    
+    def open_tick_recorder(self, symbol):
+        """勾选「录制行情」时创建录制文件"""
+        if not self.record_ticks.get():
+            return
+        file_path = os.path.join(DEFAULT_TICK_LOG_DIR, f"{symbol}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ticks")
+        try:
+            self.tick_recorder = TickRecorder(file_path, symbol)
+            self.log(f"行情录制到 {file_path}\n")
+        except Exception as e:
+            self.log(f"创建录制文件失败: {str(e)}\n")
+    
+    def close_tick_recorder(self):
+        recorder, self.tick_recorder = self.tick_recorder, None
+        if recorder is not None:
+            recorder.close()
+            self.log(f"行情录制结束，共 {recorder.recorded} 条\n")
+    
+    def poll_price(self, symbol):
+        """定时轮询取一次最新价（与结果线程共用价格服务），录制时写入录制文件"""
+        price = self.price_service.get(symbol)
+        recorder = self.tick_recorder
+        if recorder is not None:
+            recorder.record(TRADE, int(time.time() * 1000), price)
+        return price
+    
+    def add_simulation_trade(self, trade):
+        """实测的平仓/强平回调：更新保证金并写入订单表格"""
+        self.current_margin.set(round(self.simulation_engine.margin, 4))
+        self.simulation_order_table.append((
+            trade["sequence"], trade["time"], trade["action"], trade["symbol"],
+            round(trade["profit"], 4), round(trade["margin"], 4),
+            round(trade["actual_control_funds"], 4),
+            round(trade["open_price"], 4), trade["close_price"], trade["close_price"],
+            round(trade["total_fee"], 4), 0
+        ), key=trade["sequence"])
+    
+    def stream_market_data(self, symbol, interval, is_running, on_price):
+        """用 WebSocket 推送驱动实盘，直到 is_running() 返回 False
+        
+        策略触发为「逐笔成交」时每次取到新成交就以最新价调用 on_price，处理不过来的成交会被合并；
+        为「K线收盘」时每根收盘K线以收盘价调用一次。
+        """
+        trigger = self.trigger_mode.get()
+        for snapshot in self.market_snapshots(symbol, interval, is_running):
             try:
-                # 获取最新价格数据
-                url = f"https://fapi.binance.com/fapi/v1/ticker/price?symbol={symbol}"
-                response = requests.get(url)
-                data = response.json()
-                
-                if "price" in data:
-                    price = float(data["price"])
-                    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    self.data_count += 1
-                    
-                    # 处理交易信号
-                    signal = self.strategy(current_time, price)
-                    self.output_text.insert(tk.END, f"{current_time}，价格: {price}，信号: {signal}\n")
-                    self.output_text.see(tk.END)
-                    
-                    # 处理交易信号
-                    if signal in ["做多", "做空"]:
-                        # 计算订单保证金
-                        if self.order_mode.get() == "固定保证金模式":
-                            order_margin = self.fixed_margin.get()
-                        else:
-                            percent = self.percentage_margin.get() / 100
-                            order_margin = self.current_margin.get() * percent
-                        
-                        # 检查保证金是否充足
-                        if self.current_margin.get() < order_margin:
-                            self.output_text.insert(tk.END, "保证金不足，无法开仓\n")
-                            self.output_text.see(tk.END)
-                            time.sleep(interval_seconds)
-                            continue
-                        
-                        # 计算手续费和控制资金
-                        leverage = self.leverage.get()
-                        fee_rate = self.fee_rate.get() / 100
-                        fee = order_margin * leverage * fee_rate
-                        actual_control_funds = order_margin * leverage
-                        
-                        # 计算强平价格
-                        liquidation_price = self.calculate_liquidation_price(
-                            signal, price, self.current_margin.get(), leverage)
-                        
-                        # 更新保证金
-                        new_margin = self.current_margin.get() - order_margin - fee
-                        self.current_margin.set(round(new_margin, 4))
-                        
-                        # 记录订单
-                        self.order_list.append({
-                            "sequence": self.order_sequence,
-                            "time": current_time,
-                            "action": signal,
-                            "symbol": symbol,
-                            "margin": order_margin,
-                            "leverage": leverage,
-                            "fee": fee,
-                            "actual_control_funds": actual_control_funds,
-                            "open_price": price,
-                            "liquidation_price": liquidation_price
-                        })
-                        
-                        # 输出日志
-                        self.output_text.insert(tk.END, 
-                            f"订单 {self.order_sequence}: {signal}，价格 {price}，保证金 {order_margin}，杠杆 {leverage}\n")
-                        self.output_text.see(tk.END)
-                        
-                        self.order_sequence += 1
-                    
-                    elif signal in ["平多", "平空"]:
-                        # 平仓处理
-                        for order in self.order_list.copy():
-                            if (signal == "平多" and order["action"] == "做多") or (signal == "平空" and order["action"] == "做空"):
-                                # 计算盈亏和手续费
-                                fee = order["actual_control_funds"] * fee_rate
-                                profit = self.calculate_profit(
-                                    order["action"], order["open_price"], price, order["actual_control_funds"])
-                                
-                                # 更新保证金
-                                new_margin = self.current_margin.get() + order["margin"] + profit - fee
-                                self.current_margin.set(round(new_margin, 4))
-                                
-                                # 记录平仓订单
-                                self.trade_orders.append({
-                                    "sequence": order["sequence"],
-                                    "time": current_time,
-                                    "action": signal,
-                                    "symbol": symbol,
-                                    "profit": profit,
-                                    "margin": order["margin"],
-                                    "actual_control_funds": order["actual_control_funds"],
-                                    "open_price": order["open_price"],
-                                    "close_price": price,
-                                    "total_fee": order["fee"] + fee
-                                })
-                                
-                                # 添加到表格
-                                self.root.after(0, lambda o=order, t=current_time, p=price, pr=profit, f=order["fee"] + fee: 
-                                    self.simulation_order_tree.insert('', 'end', values=(
-                                        o["sequence"], t, signal, symbol,
-                                        round(pr, 4), round(o["margin"], 4),
-                                        round(o["actual_control_funds"], 4),
-                                        round(o["open_price"], 4), p, p,
-                                        round(f, 4), 0
-                                    ))
-                                )
-                                
-                                # 输出日志
-                                self.output_text.insert(tk.END, 
-                                    f"订单 {order['sequence']}: {signal}，平仓价 {price}，盈亏 {profit}，余额 {self.current_margin.get()}\n")
-                                self.output_text.see(tk.END)
-                                
-                                self.order_list.remove(order)
-                                break
-                
-                # 检查强平
-                for order in self.order_list.copy():
-                    if (order["action"] == "做多" and price <= order["liquidation_price"]) or \
-                       (order["action"] == "做空" and price >= order["liquidation_price"]):
-                        
-                        # 计算强平盈亏和手续费
-                        fee = order["actual_control_funds"] * fee_rate
-                        profit = self.calculate_profit(
-                            order["action"], order["open_price"], price, order["actual_control_funds"])
-                        
-                        # 更新保证金
-                        new_margin = self.current_margin.get() + order["margin"] + profit - fee
-                        self.current_margin.set(round(new_margin, 4))
-                        
-                        # 记录强平订单
-                        self.trade_orders.append({
-                            "sequence": order["sequence"],
-                            "time": current_time,
-                            "action": f"强平{order['action'][:-1]}",
-                            "symbol": symbol,
-                            "profit": profit,
-                            "margin": order["margin"],
-                            "actual_control_funds": order["actual_control_funds"],
-                            "open_price": order["open_price"],
-                            "close_price": price,
-                            "total_fee": order["fee"] + fee
-                        })
-                        
-                        # 添加到表格
-                        self.root.after(0, lambda o=order, t=current_time, p=price, pr=profit, f=order["fee"] + fee: 
-                            self.simulation_order_tree.insert('', 'end', values=(
-                                o["sequence"], t, f"强平{o['action'][:-1]}", symbol,
-                                round(pr, 4), round(o["margin"], 4),
-                                round(o["actual_control_funds"], 4),
-                                round(o["open_price"], 4), p, p,
-                                round(f, 4), 0
-                            ))
-                        )
-                        
-                        # 输出日志
-                        self.output_text.insert(tk.END, 
-                            f"订单 {order['sequence']}: 强平{order['action'][:-1]}，价格 {price}，盈亏 {profit}，余额 {self.current_margin.get()}\n")
-                        self.output_text.see(tk.END)
-                        
-                        self.order_list.remove(order)
-                        
-                        # 检查是否爆仓
-                        if self.current_margin.get() <= 0:
-                            self.output_text.insert(tk.END, "账户爆仓，停止监控\n")
-                            self.output_text.see(tk.END)
-                            self.price_monitor_running = False
-                            break
-                
-                # 休眠到下一个周期
-                time.sleep(interval_seconds)
-                
+                if trigger == "K线收盘":
+                    for kline in snapshot["klines"]:
+                        on_price(format_event_time(kline["close_time"]), kline["close"])
+                elif snapshot["price"] is not None:
+                    on_price(format_event_time(snapshot["time"]), snapshot["price"])
             except Exception as e:
-                self.output_text.insert(tk.END, f"监控过程出错: {str(e)}\n")
-                self.output_text.see(tk.END)
-                time.sleep(5)
+                self.log(f"处理行情出错: {str(e)}\n")
+    
+    def market_snapshots(self, symbol, interval, is_running):
+        """订阅 WebSocket 推送，逐个产出 TickConflator 快照，直到 is_running() 返回 False"""
+        conflator = TickConflator()
+        
+        def on_event(event):
+            recorder = self.tick_recorder
+            if recorder is not None:
+                recorder.record_event(event)
+            conflator.push(event)
+            # 推送的成交价同时写入价格服务，结果线程读取时不必再请求接口
+            if event["type"] == "trade":
+                self.price_service.update(symbol, event["price"])
+        
+        feed = MarketDataFeed(symbol, interval, on_event,
+                              on_status=lambda text: self.log(text + "\n"))
+        self.market_feed = feed
+        trigger = self.trigger_mode.get()
+        feed.start()
+        try:
+            while is_running():
+                snapshot = conflator.take(timeout=1)
+                if snapshot is None:
+                    continue
+                # 收到最新成交的时刻，实盘据此统计行情在队列中等待的时间
+                self.tick_received = snapshot["received"] if trigger != "K线收盘" else None
+                yield snapshot
+        finally:
+            feed.stop()
     
     def update_simulation_results_thread(self):
-        """更新实测结果线程"""
+        """更新实测结果线程：回撤、夏普比率等由引擎在每笔成交和每个tick增量更新，这里只读取快照"""
         initial_margin = self.initial_margin.get()
-        margin_max = initial_margin
-        margin_min = initial_margin
         
         while self.price_monitor_running:
             try:
                 current_time = datetime.now()
                 run_time = current_time - self.start_time
-                hours = run_time.total_seconds() / 3600
                 
                 current_margin_val = self.current_margin.get()
-                margin_max = max(margin_max, current_margin_val)
-                margin_min = min(margin_min, current_margin_val)
                 
-                # 计算未实现盈亏
+                # 本轮只取一次价格，未实现盈亏和订单表格共用
+                current_price = float(self.get_current_price())
+                
+                # 计算未实现盈亏（对全部持仓做一次向量计算）
                 unrealized = 0
-                for order in self.order_list:
-                    if order["action"] == "做多":
-                        unrealized += self.calculate_profit(
-                            "做多", order["open_price"], float(self.get_current_price()), order["actual_control_funds"])
-                    else:
-                        unrealized += self.calculate_profit(
-                            "做空", order["open_price"], float(self.get_current_price()), order["actual_control_funds"])
+                if self.positions and current_price > 0:
+                    unrealized = self.positions.unrealized_pnl(current_price)
                 
                 self.unrealized_profit.set(round(unrealized, 4))
                 total_equity = current_margin_val + unrealized
                 
                 # 计算收益率
                 return_rate = (current_margin_val - initial_margin) / initial_margin * 100 if initial_margin != 0 else 0
-                
-                # 计算最大回撤
-                max_drawdown = (initial_margin - margin_min) / initial_margin * 100 if initial_margin != 0 else 0
+                metrics = self.simulation_metrics.snapshot()
                 
                 # 更新结果
                 self.simulation_result["已运行时长"] = f"{int(run_time.total_seconds() // 3600)}h{int((run_time.total_seconds() % 3600) // 60)}m"
-                self.simulation_result["已获取数据条数"] = self.data_count
+                self.simulation_result["已获取数据条数"] = self.simulation_result_obj.ticks
                 self.simulation_result["初始金额"] = round(initial_margin, 2)
                 self.simulation_result["当前保证金余额"] = round(current_margin_val, 2)
                 self.simulation_result["未实现盈亏"] = round(unrealized, 2)
                 self.simulation_result["总权益"] = round(total_equity, 2)
                 self.simulation_result["收益率"] = round(return_rate, 2)
-                self.simulation_result["最大回撤"] = round(max_drawdown, 2)
+                for key in ["最大回撤", "夏普比率", "标准差", "交易次数", "胜率", "盈亏比", "持仓时间"]:
+                    self.simulation_result[key] = metrics[key]
                 
                 # 更新界面
                 for key, value in self.simulation_result.items():
                     self.root.after(0, lambda k=key, v=value: 
-                        self.simulation_result_labels[k].config(text=f"{v}{'%' if k in ['收益率', '最大回撤'] else ''}")
+                        self.simulation_result_labels[k].config(
+                            text=f"{v}{'%' if k in ['收益率', '最大回撤', '胜率', '持仓时间'] else ''}")
                     )
                 
-                # 更新未平仓订单的当前价格和未实现盈亏
-                current_price = float(self.get_current_price())
-                for item in self.simulation_order_tree.get_children():
-                    values = self.simulation_order_tree.item(item, "values")
-                    if values[2] in ["做多", "做空"] and values[9] == "":  # 未平仓
-                        seq = int(values[0])
-                        for order in self.order_list:
-                            if order["sequence"] == seq:
-                                profit = self.calculate_profit(
-                                    order["action"], order["open_price"], current_price, order["actual_control_funds"])
-                                self.root.after(0, lambda i=item, cp=current_price, p=profit: 
-                                    self.simulation_order_tree.item(i, values=(*values[:8], cp, values[9], values[10], round(p, 4)))
-                                )
-                                break
+                # 更新未平仓订单的当前价格和未实现盈亏：按持仓账本逐笔提交，表格中没有的行会被忽略，
+                # 变化在表格的下一次刷新中批量应用
+                if current_price > 0:
+                    for order in self.positions:
+                        profit = self.calculate_profit(
+                            order["action"], order["open_price"], current_price, order["actual_control_funds"])
+                        self.simulation_order_table.update(
+                            order["sequence"], {"当前价": current_price, "未实现盈亏": round(profit, 4)})
                 
                 time.sleep(10)  # 每10秒更新一次结果
                 
             except Exception as e:
-                self.output_text.insert(tk.END, f"更新结果出错: {str(e)}\n")
-                self.output_text.see(tk.END)
+                self.log(f"更新结果出错: {str(e)}\n")
                 time.sleep(10)
     
     def get_current_price(self):
-        """获取当前价格"""
+        """获取当前价格（经价格服务缓存，获取失败返回0）"""
         try:
-            symbol = self.symbol_var.get()
-            url = f"https://fapi.binance.com/fapi/v1/ticker/price?symbol={symbol}"
-            response = requests.get(url)
-            data = response.json()
-            return data.get("price", 0)
-        except:
+            return self.price_service.get(self.symbol_var.get())
+        except Exception as e:
+            logger.warning(f"获取当前价格失败: {e}")
             return 0
     
     def bind_api(self):
@@ -1270,17 +1437,53 @@ class TradingEngine:
             return
         
         try:
-            self.binance_client = Client(api_key, api_secret)
+            self.binance_client = self.http.bind_binance_client(Client(api_key, api_secret))
             # 测试API连接
             self.binance_client.futures_account()
             messagebox.showinfo("成功", "API绑定成功")
-            self.output_text.insert(tk.END, "API绑定成功\n")
+            self.log("API绑定成功\n")
             self.update_account_info()
         except Exception as e:
             messagebox.showerror("错误", f"API绑定失败: {str(e)}")
-            self.output_text.insert(tk.END, f"API绑定失败: {str(e)}\n")
+            self.log(f"API绑定失败: {str(e)}\n")
             self.binance_client = None
     
+    def show_http_stats(self):
+        """在输出区列出各接口的请求次数、失败次数和延迟"""
+        stats = self.http.stats()
+        if not stats:
+            self.log("暂无接口请求记录\n")
+            return
+        lines = ["接口统计:"]
+        for endpoint, summary in stats.items():
+            lines.append(f"{endpoint}  " + "，".join(f"{key}: {summary[key]}" for key in HTTP_STATS_KEYS))
+        self.log("\n".join(lines) + "\n")
+    
+    def show_latency_stats(self):
+        """在输出区列出实盘各阶段的耗时分位数"""
+        stats = self.latency.summary()
+        if not stats:
+            self.log("暂无延迟记录\n")
+            return
+        lines = ["延迟统计:"]
+        for (kind, stage), summary in stats.items():
+            lines.append(f"{kind}/{stage}  " + "，".join(f"{key}: {summary[key]}" for key in LATENCY_STATS_KEYS))
+        self.log("\n".join(lines) + "\n")
+    
+    def export_latency(self):
+        """把每次循环/订单的分阶段耗时导出为 CSV"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv", filetypes=[("CSV文件", "*.csv")],
+            initialfile=f"延迟统计_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        )
+        if not file_path:
+            return
+        try:
+            count = self.latency.export_csv(file_path)
+            self.log(f"已导出 {count} 条延迟记录到 {file_path}\n")
+        except Exception as e:
+            messagebox.showerror("错误", f"导出延迟统计失败: {str(e)}")
+    
     def update_account_info(self):
         """更新实盘账户信息（修正版）"""
         if not self.binance_client:
@@ -1307,26 +1510,51 @@ class TradingEngine:
             
             # 4. 更新当前保证金余额
             current_balance = float(usdt_balance['balance'])
-            self.current_margin.set(round(current_balance, 2))
-            
-            # 5. 初始化初始金额（首次更新时）
-            if self.live_result["初始金额"] == 0:
-                self.live_result["初始金额"] = round(current_balance, 2)
-                self.live_result_labels["初始金额"]["text"] = f"{current_balance:.2f}"
+            self.apply_account_balance(current_balance)
             
-            # 6. 输出成功日志
-            self.output_text.insert(tk.END, f"账户信息更新成功：当前保证金 {current_balance:.2f} USDT\n")
-            self.output_text.see(tk.END)
+            # 5. 输出成功日志
+            self.log(f"账户信息更新成功：当前保证金 {current_balance:.2f} USDT\n")
             
         except KeyError as e:
             # 明确提示缺少的字段，便于调试
-            self.output_text.insert(tk.END, f"更新账户信息失败：API返回数据中缺少字段 {str(e)}\n")
+            self.log(f"更新账户信息失败：API返回数据中缺少字段 {str(e)}\n")
         except StopIteration:
-            self.output_text.insert(tk.END, "更新账户信息失败：未找到指定资产（如USDT）\n")
+            self.log("更新账户信息失败：未找到指定资产（如USDT）\n")
         except Exception as e:
-            self.output_text.insert(tk.END, f"更新账户信息失败：{str(e)}\n")
-        finally:
-            self.output_text.see(tk.END)
+            self.log(f"更新账户信息失败：{str(e)}\n")
+    
+    def apply_account_balance(self, current_balance):
+        """把账户余额写入界面，首次更新时同时记录初始金额"""
+        self.current_margin.set(round(current_balance, 2))
+        if self.live_result["初始金额"] == 0:
+            self.live_result["初始金额"] = round(current_balance, 2)
+            self.live_result_labels["初始金额"]["text"] = f"{current_balance:.2f}"
+    
+    def sync_account_mirror(self):
+        """账户推送（重）连接后已用接口同步镜像，刷新界面上的余额"""
+        balance = self.account_mirror.balance("USDT")
+        if balance is not None:
+            self.apply_account_balance(balance)
+    
+    def on_account_event(self, event):
+        """账户推送事件：余额变动时刷新界面"""
+        if event.get("e") == "ACCOUNT_UPDATE":
+            self.sync_account_mirror()
+    
+    def start_user_stream(self):
+        """启动用户数据流，等待首次同步完成；同步失败时退回接口查询余额"""
+        if self.user_stream is not None:
+            self.user_stream.stop()
+        self.account_mirror = AccountMirror()
+        self.user_stream = UserDataStream(
+            self.binance_client, self.account_mirror,
+            on_event=self.on_account_event, on_sync=self.sync_account_mirror,
+            on_status=lambda text: self.log(text + "\n")
+        )
+        self.user_stream.start()
+        if not self.account_mirror.ready.wait(5):
+            self.log("账户推送尚未同步，改用接口查询余额\n")
+            self.update_account_info()
     
     def toggle_dual_position(self):
         """切换双向持仓模式"""
@@ -1338,9 +1566,9 @@ class TradingEngine:
             current_state = self.dspc.variable.get()
             self.binance_client.futures_change_position_mode(dualSidePosition=current_state)
             status = "启用" if current_state else "禁用"
-            self.output_text.insert(tk.END, f"{status}双向持仓模式成功\n")
+            self.log(f"{status}双向持仓模式成功\n")
         except Exception as e:
-            self.output_text.insert(tk.END, f"切换双向持仓模式失败: {str(e)}\n")
+            self.log(f"切换双向持仓模式失败: {str(e)}\n")
     
     def start_live_trading(self):
         """开始实盘交易"""
@@ -1348,36 +1576,38 @@ class TradingEngine:
             messagebox.showerror("错误", "请先绑定API")
             return
         
-        if self.strategy is None:
-            messagebox.showerror("错误", "请先导入策略")
+        if not self.check_streaming_strategy():
             return
         
         self.live_trading_running = True
         self.stop_live_btn.config(state=tk.NORMAL)
         
         # 初始化参数
-        self.update_account_info()
-        self.order_list = []
+        self.price_service.ttl = self.price_ttl.get()
+        self.start_user_stream()
+        self.positions = PositionBook()
         self.trade_orders = []
         self.order_sequence = 1
         self.start_time = datetime.now()
         self.trade_count = 0
+        self.latency.reset()
+        # 回撤从第一次记录的账户权益算起，与界面上的初始金额无关
+        self.live_metrics = MetricsAccumulator()
         
         # 清空订单表格
-        for item in self.live_order_tree.get_children():
-            self.live_order_tree.delete(item)
+        self.live_order_table.clear()
         
-        self.output_text.delete(1.0, tk.END)
-        self.output_text.insert(tk.END, "开始实盘交易...\n")
+        self.log_view.clear()
+        self.log("开始实盘交易...\n")
         
         # 设置杠杆
         try:
             symbol = self.symbol_var.get()
             leverage = int(self.leverage.get())
             self.binance_client.futures_change_leverage(symbol=symbol, leverage=leverage)
-            self.output_text.insert(tk.END, f"设置杠杆为 {leverage} 倍成功\n")
+            self.log(f"设置杠杆为 {leverage} 倍成功\n")
         except Exception as e:
-            self.output_text.insert(tk.END, f"设置杠杆失败: {str(e)}\n")
+            self.log(f"设置杠杆失败: {str(e)}\n")
         
         # 启动实盘交易线程
         self.live_thread = threading.Thread(target=self.live_trading_thread, daemon=True)
@@ -1389,13 +1619,41 @@ class TradingEngine:
         """停止实盘交易"""
         self.live_trading_running = False
         self.stop_live_btn.config(state=tk.DISABLED)
-        self.output_text.insert(tk.END, "已停止实盘交易\n")
+        if self.user_stream is not None:
+            self.user_stream.stop()
+            self.user_stream = None
+        self.log("已停止实盘交易\n")
     
     def live_trading_thread(self):
         """实盘交易线程"""
+        self.prefetch_exchange_rules(self.symbol_var.get())
+        self.open_tick_recorder(self.symbol_var.get())
+        try:
+            self.run_live_trading()
+        finally:
+            self.close_tick_recorder()
+    
+    def run_live_trading(self):
         symbol = self.symbol_var.get()
         interval = self.interval_var.get()
         
+        if self.feed_mode.get() == "WebSocket推送":
+            def on_price(current_time, price):
+                # 从收到成交推送开始计时，K线收盘触发时从取到快照开始
+                trace = self.latency.begin(start=self.tick_received)
+                trace.mark("行情等待")
+                signal = self.strategy(current_time, price)
+                trace.mark("策略计算")
+                self.log(f"{current_time}，价格: {price}，信号: {signal}\n")
+                if signal in ["做多", "做空", "平多", "平空"]:
+                    self.live_signal(symbol, current_time, price, signal, trace)
+                self.latency.finish(trace)
+                self.record_live_equity(symbol, price)
+            
+            # 实盘的强平由交易所执行，这里不做本地强平检查
+            self.stream_market_data(symbol, interval, lambda: self.live_trading_running, on_price)
+            return
+        
         interval_seconds = {
             "1m": 60, "3m": 180, "5m": 300, "15m": 900,
             "30m": 1800, "1h": 3600, "4h": 14400, "1d": 86400, "1w": 604800
@@ -1404,170 +1662,197 @@ class TradingEngine:
         while self.live_trading_running:
             try:
                 # 获取最新价格
-                ticker = self.binance_client.futures_symbol_ticker(symbol=symbol)
-                price = float(ticker['price'])
+                trace = self.latency.begin()
+                price = self.poll_price(symbol)
                 current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                trace.mark("获取价格")
                 
-                # 获取账户余额
-                self.update_account_info()
-                
+                # 账户余额由账户推送实时更新，这里不再查询
                 # 处理交易信号
                 signal = self.strategy(current_time, price)
-                self.output_text.insert(tk.END, f"{current_time}，价格: {price}，信号: {signal}\n")
-                self.output_text.see(tk.END)
+                trace.mark("策略计算")
+                self.log(f"{current_time}，价格: {price}，信号: {signal}\n")
+                self.live_signal(symbol, current_time, price, signal, trace)
+                self.latency.finish(trace)
+                self.record_live_equity(symbol, price)
                 
-                if signal in ["做多", "做空"]:
-                    # 计算订单保证金
-                    if self.order_mode.get() == "固定保证金模式":
-                        order_margin = self.fixed_margin.get()
-                    else:
-                        percent = self.percentage_margin.get() / 100
-                        order_margin = self.current_margin.get() * percent
-                    
-                    # 检查保证金是否充足
-                    if self.current_margin.get() < order_margin:
-                        self.output_text.insert(tk.END, "保证金不足，无法开仓\n")
-                        self.output_text.see(tk.END)
-                        time.sleep(interval_seconds)
-                        continue
-                    
-                    # 计算下单数量
-                    leverage = self.leverage.get()
-                    quantity = order_margin * leverage / price
-                    # 调整数量精度
-                    quantity = self.adjust_quantity(symbol, quantity)
+                # 休眠到下一个周期
+                time.sleep(interval_seconds)
+                
+            except Exception as e:
+                self.log(f"实盘交易出错: {str(e)}\n")
+                time.sleep(5)
+    
+    def prefetch_exchange_rules(self, symbol):
+        """预先加载交易规则，下单时只做一次字典查找；实盘下单总是按交易规则取整，与回测的勾选项无关"""
+        try:
+            self.exchange_rules.select([symbol])
+            self.exchange_rules.start()
+        except Exception as e:
+            self.log(f"预加载交易规则失败，下单时重新获取: {str(e)}\n")
+    
+    def record_live_equity(self, symbol, price):
+        """按保证金余额和账户镜像中的未实现盈亏更新实盘的回撤和持仓时间"""
+        equity = self.current_margin.get() + self.account_mirror.unrealized_pnl(symbol, price)
+        self.live_metrics.update_equity(equity, bool(self.positions))
+    
+    def adjust_quantity(self, symbol, quantity, price=None):
+        """按交易所规则调整下单数量（步长向下取整、最大/最小下单量、最小名义价值），无法下单时返回0"""
+        try:
+            rules = self.exchange_rules.get(symbol)
+        except Exception as e:
+            self.log(f"获取交易规则失败: {str(e)}\n")
+            return 0
+        if rules is None:
+            self.log(f"未找到 {symbol} 的交易规则\n")
+            return 0
+        return rules.adjust_quantity(quantity, price)
+    
+    def live_signal(self, symbol, current_time, price, signal, trace=None):
+        """实盘：按信号下单开平仓
+        
+        trace 为本次循环的 LatencyTrace，下单时依次记录数量计算、下单请求和成交回报的耗时，
+        并把类型改为开仓/平仓，与不下单的循环分开统计；开仓的成交回报在推送到达时由账户镜像回调补记。
+        """
+        if trace is None:
+            trace = self.latency.begin()
+        if signal in ["做多", "做空"]:
+            # 计算订单保证金
+            if self.order_mode.get() == "固定保证金模式":
+                order_margin = self.fixed_margin.get()
+            else:
+                percent = self.percentage_margin.get() / 100
+                order_margin = self.current_margin.get() * percent
+            
+            # 检查保证金是否充足
+            if self.current_margin.get() < order_margin:
+                self.log("保证金不足，无法开仓\n")
+                return
+            
+            # 计算下单数量
+            leverage = self.leverage.get()
+            quantity = order_margin * leverage / price
+            # 按交易规则调整数量精度
+            quantity = self.adjust_quantity(symbol, quantity, price)
+            
+            if quantity <= 0:
+                self.log("计算下单数量错误，无法下单\n")
+                return
+            trace.mark("数量计算")
+            trace.kind = "开仓"
+            
+            # 下单
+            side = Client.SIDE_BUY if signal == "做多" else Client.SIDE_SELL
+            position_side = "LONG" if signal == "做多" else "SHORT"
+            
+            try:
+                order = self.binance_client.futures_create_order(
+                    symbol=symbol,
+                    side=side,
+                    type=Client.ORDER_TYPE_MARKET,
+                    quantity=quantity,
+                    positionSide=position_side
+                )
+                trace.mark("下单请求")
+                
+                # 成交回报的耗时在账户推送到达时补记，交易线程不等待推送
+                sent = trace.last
+                self.account_mirror.watch_order(
+                    order['orderId'],
+                    lambda fill: self.latency.add_stage(trace, "成交回报", max(fill["received"] - sent, 0.0))
+                )
+                
+                self.log(f"下单成功: {order}\n")
+                self.trade_count += 1
+                
+                # 记录订单（控制资金和保证金按取整后的数量计算）
+                order_margin = quantity * price / leverage
+                fee = quantity * price * (self.fee_rate.get() / 100)
+                self.positions.open(
+                    signal, order_margin, order_margin * leverage, price,
+                    fee=fee, sequence=self.order_sequence,
+                    time=current_time, symbol=symbol, leverage=leverage,
+                    quantity=quantity, order_id=order['orderId']
+                )
+                
+                # 添加到表格
+                self.live_order_table.append((
+                    self.order_sequence, current_time, signal, symbol, 0, order_margin,
+                    order_margin * leverage, price, "", fee, "已成交"
+                ), key=self.order_sequence)
+                
+                self.order_sequence += 1
+                
+            except Exception as e:
+                self.log(f"下单失败: {str(e)}\n")
+        
+        elif signal in ["平多", "平空"]:
+            # 平仓处理
+            position_side = "LONG" if signal == "平多" else "SHORT"
+            side = Client.SIDE_SELL if signal == "平多" else Client.SIDE_BUY
+            
+            # 持仓信息来自账户推送维护的镜像
+            position = self.account_mirror.position(symbol, position_side)
+            
+            if position:
+                quantity = abs(position['amount'])
+                trace.mark("数量计算")
+                trace.kind = "平仓"
+                
+                try:
+                    # 平仓
+                    order = self.binance_client.futures_create_order(
+                        symbol=symbol,
+                        side=side,
+                        type=Client.ORDER_TYPE_MARKET,
+                        quantity=quantity,
+                        positionSide=position_side
+                    )
                     
-                    if quantity <= 0:
-                        self.output_text.insert(tk.END, "计算下单数量错误，无法下单\n")
-                        self.output_text.see(tk.END)
-                        time.sleep(interval_seconds)
-                        continue
+                    trace.mark("下单请求")
+                    self.log(f"平仓成功: {order}\n")
+                    self.trade_count += 1
                     
-                    # 下单
-                    side = Client.SIDE_BUY if signal == "做多" else Client.SIDE_SELL
-                    position_side = "LONG" if signal == "做多" else "SHORT"
+                    # 盈亏和手续费取成交推送中的实际值，推送未及时到达时按当前价估算
+                    fill = self.account_mirror.wait_order(order['orderId'], timeout=5)
+                    if fill is not None:
+                        trace.mark("成交回报")
+                    if fill is not None and fill["filled"] > 0:
+                        price = fill["avg_price"]
+                        profit = fill["realized_profit"]
+                        fee = fill["commission"]
+                    else:
+                        profit = position['amount'] * (price - position['entry_price'])
+                        fee = quantity * price * (self.fee_rate.get() / 100)
                     
-                    try:
-                        order = self.binance_client.futures_create_order(
-                            symbol=symbol,
-                            side=side,
-                            type=Client.ORDER_TYPE_MARKET,
-                            quantity=quantity,
-                            positionSide=position_side
-                        )
-                        
-                        self.output_text.insert(tk.END, f"下单成功: {order}\n")
-                        self.trade_count += 1
-                        
-                        # 记录订单
-                        fee = order_margin * leverage * (self.fee_rate.get() / 100)
-                        self.order_list.append({
-                            "sequence": self.order_sequence,
+                    # 查找对应的开仓订单（最早开仓的一笔）
+                    open_order = self.positions.close_first(CLOSE_SIDE[signal])
+                    if open_order is not None:
+                        # 记录平仓订单
+                        self.trade_orders.append({
+                            "sequence": open_order["sequence"],
                             "time": current_time,
                             "action": signal,
                             "symbol": symbol,
-                            "margin": order_margin,
-                            "leverage": leverage,
-                            "fee": fee,
-                            "quantity": quantity,
-                            "open_price": price,
-                            "order_id": order['orderId']
+                            "profit": profit,
+                            "margin": open_order["margin"],
+                            "actual_control_funds": open_order["margin"] * open_order["leverage"],
+                            "open_price": open_order["open_price"],
+                            "close_price": price,
+                            "total_fee": open_order["fee"] + fee
                         })
+                        self.live_metrics.add_trade(profit)
                         
-                        # 添加到表格
-                        self.root.after(0, lambda seq=self.order_sequence, t=current_time, a=signal, p=price: 
-                            self.live_order_tree.insert('', 'end', values=(
-                                seq, t, a, symbol, 0, order_margin, 
-                                order_margin * leverage, p, "", fee, "已成交"
-                            ))
-                        )
-                        
-                        self.order_sequence += 1
-                        
-                    except Exception as e:
-                        self.output_text.insert(tk.END, f"下单失败: {str(e)}\n")
-                        self.output_text.see(tk.END)
-                
-                elif signal in ["平多", "平空"]:
-                    # 平仓处理
-                    position_side = "LONG" if signal == "平多" else "SHORT"
-                    side = Client.SIDE_SELL if signal == "平多" else Client.SIDE_BUY
-                    
-                    # 获取持仓信息
-                    positions = self.binance_client.futures_position_information(symbol=symbol)
-                    position = next((p for p in positions if p['positionSide'] == position_side and float(p['positionAmt']) != 0), None)
+                        # 更新表格
+                        self.live_order_table.update(open_order["sequence"], {
+                            "操作": signal, "盈亏": round(profit, 4), "平仓价": price,
+                            "手续费": round(open_order["fee"] + fee, 4), "订单状态": "已平仓"
+                        })
                     
-                    if position:
-                        quantity = abs(float(position['positionAmt']))
-                        open_price = float(position['entryPrice'])
-                        order_id = position['orderId'] if 'orderId' in position else ""
-                        
-                        try:
-                            # 平仓
-                            order = self.binance_client.futures_create_order(
-                                symbol=symbol,
-                                side=side,
-                                type=Client.ORDER_TYPE_MARKET,
-                                quantity=quantity,
-                                positionSide=position_side
-                            )
-                            
-                            self.output_text.insert(tk.END, f"平仓成功: {order}\n")
-                            self.trade_count += 1
-                            
-                            # 计算盈亏
-                            profit = float(position['unRealizedProfit'])
-                            fee = float(position['commission'])
-                            
-                            # 查找对应的开仓订单
-                            for open_order in self.order_list.copy():
-                                if (signal == "平多" and open_order["action"] == "做多") or \
-                                   (signal == "平空" and open_order["action"] == "做空"):
-                                    
-                                    # 记录平仓订单
-                                    self.trade_orders.append({
-                                        "sequence": open_order["sequence"],
-                                        "time": current_time,
-                                        "action": signal,
-                                        "symbol": symbol,
-                                        "profit": profit,
-                                        "margin": open_order["margin"],
-                                        "actual_control_funds": open_order["margin"] * open_order["leverage"],
-                                        "open_price": open_order["open_price"],
-                                        "close_price": price,
-                                        "total_fee": open_order["fee"] + fee
-                                    })
-                                    
-                                    # 更新表格
-                                    for item in self.live_order_tree.get_children():
-                                        values = self.live_order_tree.item(item, "values")
-                                        if int(values[0]) == open_order["sequence"]:
-                                            self.root.after(0, lambda i=item, p=price, pr=profit, f=open_order["fee"] + fee: 
-                                                self.live_order_tree.item(i, values=(
-                                                    values[0], values[1], signal, values[3],
-                                                    round(pr, 4), values[5], values[6],
-                                                    values[7], p, round(f, 4), "已平仓"
-                                                ))
-                                            )
-                                            break
-                                    
-                                    self.order_list.remove(open_order)
-                                    break
-                            
-                        except Exception as e:
-                            self.output_text.insert(tk.END, f"平仓失败: {str(e)}\n")
-                            self.output_text.see(tk.END)
-                    else:
-                        self.output_text.insert(tk.END, f"没有{signal}的持仓，无法平仓\n")
-                        self.output_text.see(tk.END)
-                
-                # 休眠到下一个周期
-                time.sleep(interval_seconds)
-                
-            except Exception as e:
-                self.output_text.insert(tk.END, f"实盘交易出错: {str(e)}\n")
-                self.output_text.see(tk.END)
-                time.sleep(5)
+                except Exception as e:
+                    self.log(f"平仓失败: {str(e)}\n")
+            else:
+                self.log(f"没有{signal}的持仓，无法平仓\n")
     
     def update_live_results_thread(self):
         """更新实盘结果线程"""
@@ -1578,17 +1863,13 @@ class TradingEngine:
             self.trade_count = 0
             
         initial_margin = self.initial_margin.get()
-        margin_max = initial_margin
-        margin_min = initial_margin
-        self.output_text.insert(tk.END, "实盘结果更新线程已启动\n")
-        self.output_text.see(tk.END)
+        self.log("实盘结果更新线程已启动\n")
         
         while self.live_trading_running:
             try:
                 # 检查Binance客户端是否有效
                 if not self.binance_client:
-                    self.output_text.insert(tk.END, "等待API绑定...\n")
-                    self.output_text.see(tk.END)
+                    self.log("等待API绑定...\n")
                     time.sleep(10)
                     continue
                     
@@ -1600,21 +1881,11 @@ class TradingEngine:
                 if current_margin_val <= 0:
                     current_margin_val = 0.01  # 避免除以零错误
                 
-                # 更新最大/最小保证金记录
-                margin_max = max(margin_max, current_margin_val)
-                margin_min = min(margin_min, current_margin_val)
-                
-                # 获取未实现盈亏（增加异常捕获）
-                unrealized_profit = 0.0
-                try:
-                    positions = self.binance_client.futures_position_information(symbol=self.symbol_var.get())
-                    # 过滤有效持仓数据
-                    valid_positions = [p for p in positions if float(p['positionAmt']) != 0]
-                    unrealized_profit = sum(float(p['unRealizedProfit']) for p in valid_positions)
-                    self.unrealized_profit.set(round(unrealized_profit, 4))
-                except Exception as pos_err:
-                    self.output_text.insert(tk.END, f"获取持仓信息失败: {str(pos_err)}\n")
-                    self.output_text.see(tk.END)
+                # 未实现盈亏按账户镜像中的持仓和缓存的最新价计算，不请求接口；
+                # 没有缓存价格时使用最近一次账户推送中的值
+                symbol = self.symbol_var.get()
+                unrealized_profit = self.account_mirror.unrealized_pnl(symbol, self.price_service.cached(symbol))
+                self.unrealized_profit.set(round(unrealized_profit, 4))
                 
                 # 计算总权益
                 total_equity = current_margin_val + unrealized_profit
@@ -1624,10 +1895,8 @@ class TradingEngine:
                 if initial_margin > 0:
                     return_rate = (current_margin_val - initial_margin) / initial_margin * 100
                 
-                # 计算最大回撤（增加零值保护）
-                max_drawdown = 0.0
-                if initial_margin > 0 and (initial_margin - margin_min) > 0:
-                    max_drawdown = (initial_margin - margin_min) / initial_margin * 100
+                # 回撤、胜率、夏普比率等由交易线程在每次循环和每笔平仓时增量更新，这里只读取快照
+                metrics = self.live_metrics.snapshot()
                 
                 # 更新实盘结果字典
                 self.live_result.update({
@@ -1638,31 +1907,27 @@ class TradingEngine:
                     "未实现盈亏": round(unrealized_profit, 2),
                     "总权益": round(total_equity, 2),
                     "收益率": round(return_rate, 2),
-                    "最大回撤": round(max_drawdown, 2)
+                    **{key: metrics[key] for key in ["最大回撤", "胜率", "盈亏比", "夏普比率", "标准差", "持仓时间"]}
                 })
                 
                 # 线程安全更新UI（使用after确保在主线程执行）
                 def update_ui():
                     for key, value in self.live_result.items():
-                        suffix = "%" if key in ["收益率", "最大回撤"] else ""
+                        suffix = "%" if key in ["收益率", "最大回撤", "胜率", "持仓时间"] else ""
                         self.live_result_labels[key]["text"] = f"{value}{suffix}"
                 
                 self.root.after(0, update_ui)
-                self.output_text.insert(tk.END, "实盘结果已更新\n")
-                self.output_text.see(tk.END)
                 
-                # 每30秒更新一次
-                time.sleep(30)
+                # 只读取内存中的镜像，可以较频繁地刷新
+                time.sleep(5)
                 
             except Exception as e:
                 # 详细错误日志
                 error_msg = f"更新实盘结果出错 [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]: {str(e)}\n"
-                self.root.after(0, lambda: self.output_text.insert(tk.END, error_msg))
-                self.root.after(0, lambda: self.output_text.see(tk.END))
+                self.log(error_msg)
                 time.sleep(30)  # 出错后延长等待时间
         
-        self.output_text.insert(tk.END, "实盘结果更新线程已停止\n")
-        self.output_text.see(tk.END)
+        self.log("实盘结果更新线程已停止\n")
 
 if __name__ == "__main__":
     root = tk.Tk()
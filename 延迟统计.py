@@ -0,0 +1,135 @@
+import csv
+import time
+import threading
+from collections import deque
+from datetime import datetime
+
+# 实盘一次循环/一笔订单依次经过的阶段，总耗时为从拿到价格到交易线程处理完毕；
+# 开仓的成交回报在账户推送到达时异步补记，不计入总耗时
+LATENCY_STAGES = ["获取价格", "行情等待", "策略计算", "数量计算", "下单请求", "成交回报", "总耗时"]
+LATENCY_STATS_KEYS = ["次数", "平均ms", "P50ms", "P95ms", "P99ms", "最大ms"]
+
+
+class LatencyStats:
+    """单个阶段的耗时统计，分位数按最近 window 次计算"""
+
+    def __init__(self, window=1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def summary(self):
+        recent = sorted(self.recent)
+
+        def percentile(q):
+            if not recent:
+                return 0
+            return round(recent[min(int(q * len(recent)), len(recent) - 1)] * 1000, 2)
+
+        return {
+            "次数": self.count,
+            "平均ms": round(self.total / self.count * 1000, 2) if self.count else 0,
+            "P50ms": percentile(0.5),
+            "P95ms": percentile(0.95),
+            "P99ms": percentile(0.99),
+            "最大ms": round(self.max * 1000, 2)
+        }
+
+
+class LatencyTrace:
+    """一次循环或一笔订单的分阶段计时，时间取 perf_counter（高精度单调时钟）"""
+
+    def __init__(self, kind, start=None):
+        self.kind = kind
+        self.time = datetime.now()
+        self.start = time.perf_counter() if start is None else start
+        self.last = self.start
+        self.stages = {}
+        self.finished = False
+
+    def mark(self, stage):
+        """记录上一个时间点到现在的耗时，计入 stage"""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    @property
+    def elapsed(self):
+        return self.last - self.start
+
+
+class LatencyRecorder:
+    """实盘延迟记录器
+
+    交易线程每次循环调用 begin 得到 LatencyTrace，在各阶段结束时 mark，最后 finish；
+    finish 把各阶段耗时计入按类型（循环/下单）分开的滚动统计，并保留最近 history 条明细用于导出。
+    """
+
+    def __init__(self, window=1000, history=10000):
+        self.window = window
+        self._stats = {}
+        self._traces = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def begin(self, kind="循环", start=None):
+        return LatencyTrace(kind, start)
+
+    def finish(self, trace):
+        trace.stages["总耗时"] = trace.elapsed
+        with self._lock:
+            trace.finished = True
+            for stage, seconds in trace.stages.items():
+                self._record(trace.kind, stage, seconds)
+            self._traces.append(trace)
+
+    def add_stage(self, trace, stage, seconds):
+        """补记异步到达的阶段（如成交回报），不计入总耗时；trace 已 finish 时直接计入统计"""
+        with self._lock:
+            trace.stages[stage] = seconds
+            if trace.finished:
+                self._record(trace.kind, stage, seconds)
+
+    def _record(self, kind, stage, seconds):
+        key = (kind, stage)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = LatencyStats(self.window)
+        stats.record(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._traces.clear()
+
+    def summary(self):
+        """返回 {(类型, 阶段): 统计字典}，按阶段顺序排列"""
+        with self._lock:
+            items = [(key, stats.summary()) for key, stats in self._stats.items()]
+        order = {stage: i for i, stage in enumerate(LATENCY_STAGES)}
+        return dict(sorted(items, key=lambda item: (item[0][0], order.get(item[0][1], len(order)))))
+
+    def export_csv(self, file_path):
+        """导出每次循环/订单的分阶段耗时明细（毫秒）和汇总统计，返回导出的明细条数"""
+        with self._lock:
+            traces = list(self._traces)
+        summary = self.summary()
+        with open(file_path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(["时间", "类型"] + LATENCY_STAGES)
+            for trace in traces:
+                writer.writerow([trace.time.strftime("%Y-%m-%d %H:%M:%S.%f"), trace.kind] + [
+                    round(trace.stages[stage] * 1000, 3) if stage in trace.stages else ""
+                    for stage in LATENCY_STAGES
+                ])
+            writer.writerow([])
+            writer.writerow(["类型", "阶段"] + LATENCY_STATS_KEYS)
+            for (kind, stage), stats in summary.items():
+                writer.writerow([kind, stage] + [stats[key] for key in LATENCY_STATS_KEYS])
+        return len(traces)
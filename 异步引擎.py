@@ -0,0 +1,484 @@
+import os
+import sys
+import hmac
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import logging
+import threading
+from urllib.parse import urlencode
+
+import aiohttp
+
+from 持仓账本 import CLOSE_SIDE, PositionBook
+from 交易规则 import ExchangeInfoCache
+from 回测引擎 import (BacktestConfig, BacktestEngine, BacktestResult, FIXED_MARGIN_MODE, PERCENT_MARGIN_MODE,
+                  build_strategy_namespace, read_strategy_source)
+from 行情推送 import (FEED_MODES, STREAM_URL, TRIGGER_MODES, TickConflator, format_event_time, parse_message,
+                  stream_names, stream_url)
+
+logger = logging.getLogger(__name__)
+
+REST_URL = "https://fapi.binance.com"
+SESSION_MODES = ["实测", "实盘"]
+SESSION_STATUS_KEYS = ["会话", "模式", "最新价", "保证金余额", "未实现盈亏", "持仓数", "交易次数", "收益率"]
+
+
+class AsyncBinanceREST:
+    """基于 aiohttp 的币安合约 REST 客户端
+
+    所有会话共用同一个 aiohttp 连接池；查询接口遇到网络错误或5xx时退避重试，下单接口不重试。
+    签名接口需要 api_key/api_secret，base_url 可以指向本地替身服务用于测试。
+    """
+
+    def __init__(self, api_key=None, api_secret=None, base_url=REST_URL, max_retries=3):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.http = None
+
+    def bind(self, http):
+        self.http = http
+
+    def sign(self, params):
+        params = dict(params, timestamp=int(time.time() * 1000), recvWindow=5000)
+        query = urlencode(params)
+        signature = hmac.new(self.api_secret.encode(), query.encode(), hashlib.sha256).hexdigest()
+        return f"{query}&signature={signature}"
+
+    async def request(self, method, path, params=None, signed=False):
+        if signed and not (self.api_key and self.api_secret):
+            raise ValueError("签名接口需要 API Key 和 Secret")
+        headers = {"X-MBX-APIKEY": self.api_key} if self.api_key else {}
+        retries = self.max_retries if method == "GET" else 0
+
+        for attempt in range(retries + 1):
+            # 每次重试都重新签名，时间戳保持最新
+            query = self.sign(params or {}) if signed else urlencode(params or {})
+            url = f"{self.base_url}{path}?{query}" if query else f"{self.base_url}{path}"
+            try:
+                async with self.http.request(method, url, headers=headers) as response:
+                    data = await response.json(content_type=None)
+                    if response.status < 400:
+                        return data
+                    if response.status < 500 or attempt >= retries:
+                        raise RuntimeError(f"{method} {path} 返回 {response.status}: {data}")
+                    reason = f"HTTP {response.status}"
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= retries:
+                    raise
+                reason = str(e) or type(e).__name__
+            backoff = min(2 ** attempt, 10) * (0.5 + random.random()) * 0.5
+            logger.warning(f"{method} {path} 请求失败（{reason}），{backoff:.1f}秒后重试")
+            await asyncio.sleep(backoff)
+
+    async def ticker_prices(self):
+        """一次请求取全部交易对的最新价，返回 {交易对: 价格}"""
+        data = await self.request("GET", "/fapi/v1/ticker/price")
+        return {item["symbol"]: float(item["price"]) for item in data}
+
+    async def change_leverage(self, symbol, leverage):
+        return await self.request("POST", "/fapi/v1/leverage", {"symbol": symbol, "leverage": leverage}, signed=True)
+
+    async def market_order(self, symbol, side, quantity, position_side):
+        """市价单，返回包含成交均价 avgPrice 和成交数量 executedQty 的订单结果"""
+        return await self.request("POST", "/fapi/v1/order", {
+            "symbol": symbol, "side": side, "type": "MARKET", "quantity": quantity,
+            "positionSide": position_side, "newOrderRespType": "RESULT"
+        }, signed=True)
+
+
+class TradingSession:
+    """一个 (交易对, 策略) 实测会话
+
+    每个会话有独立的策略命名空间、持仓账本和保证金账户；开平仓、手续费和强平的计算直接复用 BacktestEngine，
+    与回测和界面实测的口径一致。行情事件先合并进会话自己的 TickConflator，策略函数在线程池中执行，
+    处理较慢时不会阻塞事件循环，也不会拖慢其他会话；同一会话的策略调用仍按顺序逐个执行。
+    """
+
+    mode = "实测"
+
+    def __init__(self, name, code, config, interval="1h", trigger="逐笔成交", params=None, log=None):
+        namespace = build_strategy_namespace(code, params)
+        strategy = namespace.get("trade_signal")
+        if strategy is None:
+            raise ValueError(f"会话 {name} 的策略缺少逐tick调用的 trade_signal 函数")
+        if trigger not in TRIGGER_MODES:
+            raise ValueError(f"不支持的触发方式: {trigger}")
+
+        self.name = name
+        self.config = config
+        self.interval = interval
+        self.trigger = trigger
+        self.strategy = strategy
+        self._log = log
+        self.engine = BacktestEngine(config, strategy, log=self.log)
+        self.engine.reset(BacktestResult(config))
+        self.engine.positions = PositionBook()
+        self.engine.symbol = config.symbol
+        self.conflator = TickConflator()
+        self.ready = None
+        self.last_price = None
+        self.ticks = 0
+        self.stopped = False
+
+    @property
+    def symbol(self):
+        return self.config.symbol
+
+    def log(self, text):
+        if self._log:
+            self._log(f"[{self.name}] {text}")
+
+    def push(self, event):
+        """接收行情事件（在事件循环线程中调用）"""
+        if event["type"] == "kline" and event["interval"] != self.interval:
+            return
+        self.conflator.push(event)
+        if self.ready is not None:
+            self.ready.set()
+
+    async def prepare(self):
+        """会话启动前的准备工作"""
+
+    async def run(self):
+        self.ready = asyncio.Event()
+        while not self.stopped:
+            await self.ready.wait()
+            self.ready.clear()
+            snapshot = self.conflator.take_nowait()
+            if snapshot is None:
+                continue
+            try:
+                await self.handle_snapshot(snapshot)
+            except Exception as e:
+                self.log(f"处理行情出错: {str(e)}\n")
+
+    async def handle_snapshot(self, snapshot):
+        if self.trigger == "K线收盘":
+            for kline in snapshot["klines"]:
+                await self.on_price(format_event_time(kline["close_time"]), kline["close"])
+        elif snapshot["price"] is not None:
+            await self.on_price(format_event_time(snapshot["time"]), snapshot["price"])
+
+        if snapshot["low"] is not None and self.config.enable_liquidation:
+            event_time = format_event_time(snapshot["time"] or time.time() * 1000)
+            for price in {snapshot["low"], snapshot["high"]}:
+                self.engine.check_liquidation(event_time, price)
+        self.check_bankrupt()
+
+    async def on_price(self, current_time, price):
+        self.last_price = price
+        self.ticks += 1
+        # 策略是普通的同步函数，放到线程池执行，计算期间事件循环继续接收行情和处理其他会话
+        signal = await asyncio.to_thread(self.strategy, current_time, price)
+        if signal in ["做多", "做空", "平多", "平空"]:
+            self.log(f"{current_time}，价格: {price}，信号: {signal}\n")
+            await self.execute(current_time, signal, price)
+
+    async def execute(self, current_time, signal, price):
+        self.engine.process_signal(current_time, signal, price)
+
+    def check_bankrupt(self):
+        if self.engine.margin <= 0 and not self.stopped:
+            self.stopped = True
+            self.log("账户爆仓，会话停止\n")
+
+    def status(self):
+        engine = self.engine
+        unrealized = engine.positions.unrealized_pnl(self.last_price) if self.last_price else 0
+        initial = self.config.initial_margin
+        return {
+            "会话": self.name,
+            "模式": self.mode,
+            "最新价": self.last_price,
+            "保证金余额": round(engine.margin, 4),
+            "未实现盈亏": round(unrealized, 4),
+            "持仓数": len(engine.positions),
+            "交易次数": len(engine.trade_orders),
+            "收益率": round((engine.margin - initial) / initial * 100, 2) if initial else 0
+        }
+
+
+class LiveSession(TradingSession):
+    """实盘会话：按信号发送市价单，以成交均价记账；强平由交易所执行，本地不做强平检查
+
+    round_quantity(symbol, quantity, price) 把下单数量调整到交易所允许的精度（如 ExchangeInfoCache.round_quantity），
+    默认不做调整。
+    """
+
+    mode = "实盘"
+
+    def __init__(self, name, code, config, rest, interval="1h", trigger="逐笔成交", params=None, log=None,
+                 round_quantity=None):
+        super().__init__(name, code, config, interval, trigger, params, log)
+        self.rest = rest
+        self.round_quantity = round_quantity or (lambda symbol, quantity, price=None: quantity)
+        self.quantities = {}
+
+    async def prepare(self):
+        await self.rest.change_leverage(self.symbol, int(self.config.leverage))
+        self.log(f"设置杠杆为 {int(self.config.leverage)} 倍成功\n")
+
+    async def handle_snapshot(self, snapshot):
+        if self.trigger == "K线收盘":
+            for kline in snapshot["klines"]:
+                await self.on_price(format_event_time(kline["close_time"]), kline["close"])
+        elif snapshot["price"] is not None:
+            await self.on_price(format_event_time(snapshot["time"]), snapshot["price"])
+
+    async def execute(self, current_time, signal, price):
+        engine = self.engine
+        try:
+            if signal in ["做多", "做空"]:
+                order_margin = engine.order_margin()
+                if engine.margin < order_margin:
+                    self.log("保证金不足，无法开仓\n")
+                    return
+                quantity = self.round_quantity(self.symbol, order_margin * self.config.leverage / price, price)
+                if quantity <= 0:
+                    self.log("计算下单数量错误，无法下单\n")
+                    return
+                result = await self.rest.market_order(
+                    self.symbol, "BUY" if signal == "做多" else "SELL", quantity,
+                    "LONG" if signal == "做多" else "SHORT")
+                fill_price = float(result.get("avgPrice") or 0) or price
+                executed = float(result.get("executedQty") or quantity)
+                self.quantities[engine.order_sequence] = executed
+                engine.open_position(current_time, signal, fill_price, quantity=executed)
+                self.log(f"下单成功: 订单号 {result.get('orderId')}，成交均价 {fill_price}\n")
+
+            elif signal in ["平多", "平空"]:
+                order = engine.positions.first(CLOSE_SIDE[signal])
+                if order is None:
+                    self.log(f"没有{signal}的持仓，无法平仓\n")
+                    return
+                quantity = self.quantities.get(order["sequence"])
+                result = await self.rest.market_order(
+                    self.symbol, "SELL" if signal == "平多" else "BUY", quantity,
+                    "LONG" if signal == "平多" else "SHORT")
+                fill_price = float(result.get("avgPrice") or 0) or price
+                engine.close_position(current_time, signal, fill_price)
+                self.quantities.pop(order["sequence"], None)
+                self.log(f"平仓成功: 订单号 {result.get('orderId')}，成交均价 {fill_price}\n")
+        except Exception as e:
+            self.log(f"{signal}下单失败: {str(e)}\n")
+
+
+class AsyncTradingEngine:
+    """在一个事件循环中同时运行多个 (交易对, 策略) 会话
+
+    全部会话共用一条 WebSocket 组合订阅（或一次请求取全部最新价的轮询）和一个 aiohttp 连接池，
+    行情按交易对分发给各会话，每个会话在自己的协程中处理，互不阻塞。
+    可以在当前线程中 asyncio.run(engine.run())，也可以 start() 放到后台线程、stop() 线程安全地停止。
+    """
+
+    def __init__(self, feed_mode="WebSocket推送", stream_base=STREAM_URL, rest=None, poll_interval=5,
+                 heartbeat_timeout=30, max_backoff=60, log=None):
+        if feed_mode not in FEED_MODES:
+            raise ValueError(f"不支持的行情来源: {feed_mode}")
+        self.feed_mode = feed_mode
+        self.stream_base = stream_base
+        self.rest = rest or AsyncBinanceREST()
+        self.poll_interval = poll_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_backoff = max_backoff
+        self._log = log
+        self.sessions = []
+        self.messages = 0
+        self.reconnects = 0
+        self.loop = None
+        self._stop = None
+        self._thread = None
+
+    def log(self, text):
+        if self._log:
+            self._log(text)
+
+    def add_session(self, session):
+        self.sessions.append(session)
+        return session
+
+    def stream_url(self):
+        names = []
+        for session in self.sessions:
+            for name in stream_names(session.symbol, session.interval):
+                if name not in names:
+                    names.append(name)
+        return stream_url(self.stream_base, names)
+
+    def dispatch(self, event):
+        for session in self._by_symbol.get(event["symbol"], ()):
+            if not session.stopped:
+                session.push(event)
+
+    async def run(self):
+        if not self.sessions:
+            raise ValueError("没有可运行的会话")
+        self.loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._by_symbol = {}
+        for session in self.sessions:
+            self._by_symbol.setdefault(session.symbol, []).append(session)
+
+        connector = aiohttp.TCPConnector(limit=32, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10)) as http:
+            self.rest.bind(http)
+            for session in self.sessions:
+                try:
+                    await session.prepare()
+                except Exception as e:
+                    session.stopped = True
+                    session.log(f"会话启动失败: {str(e)}\n")
+
+            tasks = [asyncio.create_task(session.run()) for session in self.sessions]
+            if self.feed_mode == "WebSocket推送":
+                tasks.append(asyncio.create_task(self.stream_loop(http)))
+            else:
+                tasks.append(asyncio.create_task(self.poll_loop()))
+            self.log(f"异步引擎已启动，共 {len(self.sessions)} 个会话\n")
+
+            await self._stop.wait()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.log("异步引擎已停止\n")
+
+    async def stream_loop(self, http):
+        """订阅全部会话需要的行情流，断线或超时后退避重连"""
+        url = self.stream_url()
+        attempt = 0
+        while True:
+            try:
+                async with http.ws_connect(url, heartbeat=20, receive_timeout=self.heartbeat_timeout,
+                                           timeout=aiohttp.ClientWSTimeout(ws_close=2)) as ws:
+                    attempt = 0
+                    self.log(f"行情推送已连接，共订阅 {url.split('streams=')[1].count('/') + 1} 个流\n")
+                    async for message in ws:
+                        if message.type != aiohttp.WSMsgType.TEXT:
+                            continue
+                        self.messages += 1
+                        event = parse_message(message.data)
+                        if event is not None:
+                            self.dispatch(event)
+                    raise ConnectionError(f"连接已关闭（{ws.close_code}）")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                attempt += 1
+                self.reconnects += 1
+                backoff = min(2 ** attempt, self.max_backoff) * (0.5 + random.random())
+                self.log(f"行情推送断开（{str(e) or type(e).__name__}），{backoff:.1f}秒后重连\n")
+                await asyncio.sleep(backoff)
+
+    async def poll_loop(self):
+        """定时轮询：每个周期一次请求取全部交易对的最新价，按成交事件分发"""
+        while True:
+            try:
+                prices = await self.rest.ticker_prices()
+                now = int(time.time() * 1000)
+                for symbol in self._by_symbol:
+                    if symbol in prices:
+                        self.dispatch({"type": "trade", "symbol": symbol, "time": now, "price": prices[symbol]})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.log(f"获取最新价格失败: {str(e)}\n")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        """在后台线程中运行事件循环"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.run()), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """线程安全地停止引擎"""
+        if self.loop is not None and self._stop is not None:
+            self.loop.call_soon_threadsafe(self._stop.set)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, timeout=None):
+        """等待后台线程结束，返回引擎是否仍在运行"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.running
+
+    def status(self):
+        return [session.status() for session in self.sessions]
+
+
+def main(argv=None):
+    """命令行多会话实测/实盘入口"""
+    parser = argparse.ArgumentParser(description="币安量化框架 - 异步多交易对实测/实盘")
+    parser.add_argument("--session", action="append", required=True,
+                        help="会话，格式 交易对:策略文件[:周期]，如 BTCUSDT:策略示范.py:1h，可重复传入")
+    parser.add_argument("--mode", default="实测", choices=SESSION_MODES, help="实测为虚拟交易，实盘会真实下单")
+    parser.add_argument("--feed", default="WebSocket推送", choices=FEED_MODES, help="行情来源")
+    parser.add_argument("--trigger", default="逐笔成交", choices=TRIGGER_MODES, help="推送触发策略的方式")
+    parser.add_argument("--interval", default="1h", help="会话未指定周期时使用的K线周期")
+    parser.add_argument("--poll-interval", type=float, default=5, help="定时轮询的间隔秒数")
+    parser.add_argument("--initial-margin", type=float, default=1000, help="每个会话的初始保证金")
+    parser.add_argument("--fee-rate", type=float, default=0.05, help="手续费率(%%)")
+    parser.add_argument("--percentage-margin", type=float, default=None, help="按百分比保证金模式下单")
+    parser.add_argument("--fixed-margin", type=float, default=100, help="固定保证金模式下的下单保证金")
+    parser.add_argument("--leverage", type=float, default=10, help="杠杆倍数")
+    parser.add_argument("--report", type=float, default=60, help="输出会话状态的间隔秒数")
+    args = parser.parse_args(argv)
+
+    rest = AsyncBinanceREST(os.environ.get("BINANCE_API_KEY"), os.environ.get("BINANCE_API_SECRET"))
+    if args.mode == "实盘" and not (rest.api_key and rest.api_secret):
+        print("实盘模式需要设置环境变量 BINANCE_API_KEY 和 BINANCE_API_SECRET")
+        return 1
+
+    # 交易规则加载一次后在后台定时刷新，实测和实盘会话的下单数量按同样的规则取整
+    rules = ExchangeInfoCache()
+    rules.start()
+    log = lambda text: sys.stdout.write(text)
+    engine = AsyncTradingEngine(args.feed, rest=rest, poll_interval=args.poll_interval, log=log)
+    for spec in args.session:
+        parts = spec.split(":")
+        if len(parts) < 2:
+            print(f"会话格式错误: {spec}")
+            return 1
+        symbol, path = parts[0].upper(), parts[1]
+        interval = parts[2] if len(parts) > 2 else args.interval
+        config = BacktestConfig(
+            symbol=symbol,
+            initial_margin=args.initial_margin,
+            fee_rate=args.fee_rate,
+            order_mode=PERCENT_MARGIN_MODE if args.percentage_margin is not None else FIXED_MARGIN_MODE,
+            fixed_margin=args.fixed_margin,
+            percentage_margin=args.percentage_margin or 10,
+            leverage=args.leverage,
+            symbol_filters=rules.select([symbol])
+        )
+        code, _ = read_strategy_source(path)
+        name = f"{symbol}-{os.path.splitext(os.path.basename(path))[0]}"
+        if args.mode == "实盘":
+            session = LiveSession(name, code, config, rest, interval, args.trigger, log=log,
+                                  round_quantity=rules.round_quantity)
+        else:
+            session = TradingSession(name, code, config, interval, args.trigger, log=log)
+        engine.add_session(session)
+
+    engine.start()
+    try:
+        while engine.join(args.report):
+            for status in engine.status():
+                print("  ".join(f"{key}: {status[key]}" for key in SESSION_STATUS_KEYS))
+    except KeyboardInterrupt:
+        engine.stop()
+        engine.join(10)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
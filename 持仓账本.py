@@ -0,0 +1,195 @@
+from collections import deque
+import numpy as np
+
+LONG = 1
+SHORT = -1
+
+ACTION_SIDE = {"做多": LONG, "做空": SHORT}
+SIDE_ACTION = {LONG: "做多", SHORT: "做空"}
+CLOSE_SIDE = {"平多": LONG, "平空": SHORT}
+
+
+class PositionBook:
+    """按列存储的持仓账本
+
+    每笔持仓占用一个槽位，方向、保证金、控制资金、开仓价、强平价等分别存放在 numpy 数组中。
+    平仓按方向先进先出（O(1)），强平检查对全部持仓做一次向量比较；
+    并维护多头最高强平价和空头最低强平价，价格未触及时直接跳过扫描。
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = 0
+        self.side = np.zeros(0, dtype=np.int8)
+        self.margin = np.zeros(0)
+        self.notional = np.zeros(0)
+        self.entry_price = np.zeros(0)
+        self.liquidation_price = np.zeros(0)
+        self.fee = np.zeros(0)
+        self.sequence = np.zeros(0, dtype=np.int64)
+        self.active = np.zeros(0, dtype=bool)
+        # 不参与计算的附加信息（开仓时间、交易对、订单号等）
+        self.info = []
+        self._free = []
+        self._fifo = {LONG: deque(), SHORT: deque()}
+        self._by_sequence = {}
+        self._long_liq_max = -np.inf
+        self._short_liq_min = np.inf
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        extra = capacity - self.capacity
+        self.side = np.concatenate([self.side, np.zeros(extra, dtype=np.int8)])
+        self.margin = np.concatenate([self.margin, np.zeros(extra)])
+        self.notional = np.concatenate([self.notional, np.zeros(extra)])
+        self.entry_price = np.concatenate([self.entry_price, np.zeros(extra)])
+        self.liquidation_price = np.concatenate([self.liquidation_price, np.full(extra, np.nan)])
+        self.fee = np.concatenate([self.fee, np.zeros(extra)])
+        self.sequence = np.concatenate([self.sequence, np.zeros(extra, dtype=np.int64)])
+        self.active = np.concatenate([self.active, np.zeros(extra, dtype=bool)])
+        self.info.extend({} for _ in range(extra))
+        self._free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self._by_sequence)
+
+    def __bool__(self):
+        return bool(self._by_sequence)
+
+    def open(self, action, margin, notional, entry_price, liquidation_price=np.nan, fee=0.0, sequence=0, **info):
+        """记录一笔开仓，返回槽位号"""
+        if not self._free:
+            self._grow(max(self.capacity * 2, 64))
+        slot = self._free.pop()
+        side = ACTION_SIDE[action]
+
+        self.side[slot] = side
+        self.margin[slot] = margin
+        self.notional[slot] = notional
+        self.entry_price[slot] = entry_price
+        self.liquidation_price[slot] = liquidation_price
+        self.fee[slot] = fee
+        self.sequence[slot] = sequence
+        self.active[slot] = True
+        self.info[slot] = info
+
+        self._fifo[side].append((slot, sequence))
+        self._by_sequence[sequence] = slot
+        if liquidation_price == liquidation_price:  # 非 nan
+            if side == LONG:
+                self._long_liq_max = max(self._long_liq_max, liquidation_price)
+            else:
+                self._short_liq_min = min(self._short_liq_min, liquidation_price)
+        return slot
+
+    def order(self, slot):
+        """以字典形式返回槽位上的持仓，字段与原订单记录一致"""
+        order = {
+            "sequence": int(self.sequence[slot]),
+            "action": SIDE_ACTION[int(self.side[slot])],
+            "margin": float(self.margin[slot]),
+            "fee": float(self.fee[slot]),
+            "actual_control_funds": float(self.notional[slot]),
+            "open_price": float(self.entry_price[slot]),
+            "liquidation_price": float(self.liquidation_price[slot])
+        }
+        order.update(self.info[slot])
+        return order
+
+    def remove(self, slot):
+        """移除一笔持仓并返回其字典形式；FIFO队列中的槽位在出队时惰性跳过"""
+        order = self.order(slot)
+        self.active[slot] = False
+        self.info[slot] = {}
+        del self._by_sequence[order["sequence"]]
+        self._free.append(slot)
+        if not self._by_sequence:
+            self._reset()
+        return order
+
+    def close_first(self, side):
+        """取出某方向最早开仓的一笔持仓，没有持仓时返回 None"""
+        fifo = self._fifo[side]
+        while fifo:
+            slot, sequence = fifo.popleft()
+            # 槽位可能已被强平后复用，用序列号确认仍是同一笔持仓
+            if self.active[slot] and self.sequence[slot] == sequence:
+                return self.remove(slot)
+        return None
+
+    def first(self, side):
+        """查看某方向最早开仓的一笔持仓但不移除，没有持仓时返回 None"""
+        fifo = self._fifo[side]
+        while fifo:
+            slot, sequence = fifo[0]
+            if self.active[slot] and self.sequence[slot] == sequence:
+                return self.order(slot)
+            fifo.popleft()
+        return None
+
+    def find(self, sequence):
+        """按订单序列号查找持仓"""
+        slot = self._by_sequence.get(sequence)
+        return None if slot is None else self.order(slot)
+
+    def _reset(self):
+        for side in (LONG, SHORT):
+            self._fifo[side].clear()
+        self._long_liq_max = -np.inf
+        self._short_liq_min = np.inf
+
+    def liquidations(self, price):
+        """返回在当前价格下触发强平的槽位，按开仓顺序排列"""
+        if price > self._long_liq_max and price < self._short_liq_min:
+            return []
+
+        hit = self.active & (
+            ((self.side == LONG) & (price <= self.liquidation_price)) |
+            ((self.side == SHORT) & (price >= self.liquidation_price))
+        )
+        slots = np.flatnonzero(hit)
+        if len(slots) == 0:
+            # 边界值已过期（对应持仓已平），重新计算以恢复快速跳过
+            self._recompute_bounds()
+            return []
+        return slots[np.argsort(self.sequence[slots], kind="stable")].tolist()
+
+    def _recompute_bounds(self):
+        valid = self.active & ~np.isnan(self.liquidation_price)
+        self._long_liq_max = np.max(self.liquidation_price[valid & (self.side == LONG)], initial=-np.inf)
+        self._short_liq_min = np.min(self.liquidation_price[valid & (self.side == SHORT)], initial=np.inf)
+
+    def unrealized_pnl(self, price):
+        """按当前价格计算全部持仓的未实现盈亏"""
+        if not self._by_sequence:
+            return 0.0
+        mask = self.active
+        entry = self.entry_price[mask]
+        return float(np.sum(self.notional[mask] * self.side[mask] * (price - entry) / entry))
+
+    def first_touch(self, prices):
+        """按多头最高强平价和空头最低强平价，返回价格数组中第一个可能触发强平的位置，没有时返回 -1
+
+        边界可能已过期，命中后仍需用 liquidations 确认。
+        """
+        if not self._by_sequence or len(prices) == 0:
+            return -1
+        hit = (prices <= self._long_liq_max) | (prices >= self._short_liq_min)
+        i = int(hit.argmax())
+        return i if hit[i] else -1
+
+    def equity_terms(self):
+        """全部持仓按价格 p 计的权益（占用保证金 + 未实现盈亏）为 a * p + b，返回 (a, b)"""
+        if not self._by_sequence:
+            return 0.0, 0.0
+        mask = self.active
+        signed = self.notional[mask] * self.side[mask]
+        return float(np.sum(signed / self.entry_price[mask])), float(np.sum(self.margin[mask] - signed))
+
+    def to_list(self):
+        """按开仓顺序返回全部持仓的字典列表"""
+        slots = sorted(self._by_sequence.values(), key=lambda slot: self.sequence[slot])
+        return [self.order(slot) for slot in slots]
+
+    def __iter__(self):
+        return iter(self.to_list())
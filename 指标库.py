@@ -0,0 +1,327 @@
+# 流式指标库
+#
+# 供策略文件在 trade_signal 中逐tick更新指标使用：每个指标只保存固定长度的环形缓冲区，
+# 每次 update 的耗时与历史长度无关。用法示例：
+#
+#     from 指标库 import Bollinger
+#
+#     boll = Bollinger(window=20, std_multiplier=2)
+#
+#     def trade_signal(time, price):
+#         mid, upper, lower = boll.update(price)
+#         if mid is None:  # 数据量不足
+#             return "不操作"
+#         ...
+#
+# 所有指标在数据量不足时返回 None（多值指标返回由 None 组成的元组），ready 属性表示是否已可用。
+import math
+from collections import deque
+
+
+class RingBuffer:
+    """固定长度的环形缓冲区"""
+
+    def __init__(self, size):
+        if size <= 0:
+            raise ValueError("缓冲区长度必须大于0")
+        self.size = size
+        self._data = [0.0] * size
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def full(self):
+        return self._count == self.size
+
+    def append(self, value):
+        """追加一个值，缓冲区已满时返回被挤出的最旧值，否则返回 None"""
+        if self._count < self.size:
+            self._data[(self._start + self._count) % self.size] = value
+            self._count += 1
+            return None
+        evicted = self._data[self._start]
+        self._data[self._start] = value
+        self._start = (self._start + 1) % self.size
+        return evicted
+
+    def __getitem__(self, i):
+        """按时间顺序取值，支持负索引（-1 为最新值）"""
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("RingBuffer 索引越界")
+        return self._data[(self._start + i) % self.size]
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._data[(self._start + i) % self.size]
+
+
+class RollingMean:
+    """滚动均值"""
+
+    def __init__(self, window):
+        self.window = window
+        self.buffer = RingBuffer(window)
+        self._sum = 0.0
+        self._updates = 0
+        self.value = None
+
+    @property
+    def ready(self):
+        return self.buffer.full
+
+    def update(self, x):
+        evicted = self.buffer.append(x)
+        self._sum += x - (evicted if evicted is not None else 0.0)
+        self._updates += 1
+        # 定期按缓冲区重新求和，避免浮点误差累积
+        if self._updates % (self.window * 128) == 0:
+            self._sum = math.fsum(self.buffer)
+        self.value = self._sum / self.window if self.ready else None
+        return self.value
+
+
+class RollingStd:
+    """滚动均值和标准差（滑动窗口版 Welford 算法）
+
+    ddof 默认为1，与 pandas rolling().std() 一致。
+    """
+
+    def __init__(self, window, ddof=1):
+        if window <= ddof:
+            raise ValueError("窗口长度必须大于 ddof")
+        self.window = window
+        self.ddof = ddof
+        self.buffer = RingBuffer(window)
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._updates = 0
+        self.mean = None
+        self.value = None
+
+    @property
+    def ready(self):
+        return self.buffer.full
+
+    def update(self, x):
+        evicted = self.buffer.append(x)
+        n = len(self.buffer)
+        if evicted is None:
+            delta = x - self._mean
+            self._mean += delta / n
+            self._m2 += delta * (x - self._mean)
+        else:
+            # 同时加入新值、移除旧值，样本数不变
+            old_mean = self._mean
+            self._mean += (x - evicted) / n
+            self._m2 += (x - evicted) * (x - self._mean + evicted - old_mean)
+
+        self._updates += 1
+        if self._updates % (self.window * 128) == 0:
+            self._resync()
+        if self._m2 < 0:
+            self._m2 = 0.0
+
+        if self.ready:
+            self.mean = self._mean
+            self.value = math.sqrt(self._m2 / (n - self.ddof))
+        else:
+            self.mean = self.value = None
+        return self.value
+
+    def _resync(self):
+        """按缓冲区重新计算均值和平方和，避免浮点误差累积"""
+        values = list(self.buffer)
+        self._mean = math.fsum(values) / len(values)
+        self._m2 = math.fsum((v - self._mean) ** 2 for v in values)
+
+
+class EMA:
+    """指数移动平均，前 period 个值用简单平均作为初始值"""
+
+    def __init__(self, period, alpha=None):
+        self.period = period
+        self.alpha = alpha if alpha is not None else 2.0 / (period + 1)
+        self._count = 0
+        self._seed = 0.0
+        self.value = None
+
+    @property
+    def ready(self):
+        return self.value is not None
+
+    def update(self, x):
+        if self.value is None:
+            self._count += 1
+            self._seed += x
+            if self._count == self.period:
+                self.value = self._seed / self.period
+            return self.value
+        self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class WilderMA:
+    """Wilder 平滑（RSI、ATR 使用），等价于 alpha = 1 / period 的 EMA"""
+
+    def __init__(self, period):
+        self._ema = EMA(period, alpha=1.0 / period)
+
+    @property
+    def ready(self):
+        return self._ema.ready
+
+    @property
+    def value(self):
+        return self._ema.value
+
+    def update(self, x):
+        return self._ema.update(x)
+
+
+class ATR:
+    """平均真实波幅；逐tick策略只有价格时可以传 update(price, price, price)"""
+
+    def __init__(self, period=14):
+        self.period = period
+        self._avg = WilderMA(period)
+        self._prev_close = None
+        self.value = None
+
+    @property
+    def ready(self):
+        return self._avg.ready
+
+    def update(self, high, low, close):
+        if self._prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+        self._prev_close = close
+        self.value = self._avg.update(true_range)
+        return self.value
+
+
+class RSI:
+    """相对强弱指数（Wilder）"""
+
+    def __init__(self, period=14):
+        self.period = period
+        self._gain = WilderMA(period)
+        self._loss = WilderMA(period)
+        self._prev = None
+        self.value = None
+
+    @property
+    def ready(self):
+        return self.value is not None
+
+    def update(self, x):
+        if self._prev is None:
+            self._prev = x
+            return None
+        change = x - self._prev
+        self._prev = x
+        gain = self._gain.update(max(change, 0.0))
+        loss = self._loss.update(max(-change, 0.0))
+        if gain is None:
+            return None
+        if loss == 0:
+            self.value = 100.0 if gain > 0 else 50.0
+        else:
+            self.value = 100.0 - 100.0 / (1.0 + gain / loss)
+        return self.value
+
+
+class MACD:
+    """MACD，update 返回 (macd, signal, hist)"""
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self._fast = EMA(fast)
+        self._slow = EMA(slow)
+        self._signal = EMA(signal)
+        self.value = (None, None, None)
+
+    @property
+    def ready(self):
+        return self.value[1] is not None
+
+    def update(self, x):
+        fast = self._fast.update(x)
+        slow = self._slow.update(x)
+        if fast is None or slow is None:
+            return self.value
+        macd = fast - slow
+        signal = self._signal.update(macd)
+        hist = macd - signal if signal is not None else None
+        self.value = (macd, signal, hist)
+        return self.value
+
+
+class Bollinger:
+    """布林带，update 返回 (中轨, 上轨, 下轨)"""
+
+    def __init__(self, window=20, std_multiplier=2, ddof=1):
+        self.std_multiplier = std_multiplier
+        self._std = RollingStd(window, ddof=ddof)
+        self.value = (None, None, None)
+
+    @property
+    def ready(self):
+        return self._std.ready
+
+    def update(self, x):
+        std = self._std.update(x)
+        if std is None:
+            return self.value
+        mid = self._std.mean
+        self.value = (mid, mid + self.std_multiplier * std, mid - self.std_multiplier * std)
+        return self.value
+
+
+class Donchian:
+    """唐奇安通道，update 返回 (上轨, 下轨, 中轨)
+
+    用单调队列维护窗口内的最高/最低价，每次更新均摊 O(1)。
+    """
+
+    def __init__(self, window=20):
+        self.window = window
+        self._highs = deque()
+        self._lows = deque()
+        self._index = 0
+        self.value = (None, None, None)
+
+    @property
+    def ready(self):
+        return self._index >= self.window
+
+    def update(self, high, low=None):
+        if low is None:
+            low = high
+        i = self._index
+        self._index += 1
+
+        while self._highs and self._highs[-1][1] <= high:
+            self._highs.pop()
+        self._highs.append((i, high))
+        while self._lows and self._lows[-1][1] >= low:
+            self._lows.pop()
+        self._lows.append((i, low))
+
+        expired = i - self.window
+        while self._highs[0][0] <= expired:
+            self._highs.popleft()
+        while self._lows[0][0] <= expired:
+            self._lows.popleft()
+
+        if not self.ready:
+            return self.value
+        upper = self._highs[0][1]
+        lower = self._lows[0][1]
+        self.value = (upper, lower, (upper + lower) / 2)
+        return self.value
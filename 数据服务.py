@@ -0,0 +1,358 @@
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import requests
+
+from 网络请求 import get_default_client
+
+logger = logging.getLogger(__name__)
+
+KLINES_URL = "https://fapi.binance.com/fapi/v1/klines"
+
+# 每个时间周期对应的毫秒数
+INTERVAL_MS = {
+    "1m": 60 * 1000,
+    "3m": 3 * 60 * 1000,
+    "5m": 5 * 60 * 1000,
+    "15m": 15 * 60 * 1000,
+    "30m": 30 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "4h": 4 * 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+    "1w": 7 * 24 * 60 * 60 * 1000
+}
+
+KLINE_COLUMNS = [
+    "timestamp", "open", "high", "low", "close", "volume",
+    "close_time", "quote_asset_volume", "number_of_trades",
+    "taker_buy_base_asset_volume", "taker_buy_quote_asset_volume", "ignore"
+]
+NUMERIC_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+# 缓存目录默认放在框架同级目录下
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kline_cache")
+
+
+def klines_to_frame(rows):
+    """把币安K线原始数据转换为以开盘时间为索引的DataFrame"""
+    if not rows:
+        return pd.DataFrame(columns=NUMERIC_COLUMNS + ["close_time"],
+                            index=pd.DatetimeIndex([], name="timestamp"))
+
+    df = pd.DataFrame(rows, columns=KLINE_COLUMNS)
+    df["timestamp"] = pd.to_datetime(df["timestamp"].astype("int64"), unit="ms")
+    df = df.set_index("timestamp")
+    df[NUMERIC_COLUMNS] = df[NUMERIC_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    df["close_time"] = pd.to_numeric(df["close_time"], errors='coerce')
+
+    # 移除无效数据行并去重
+    df = df.dropna(subset=NUMERIC_COLUMNS)
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    return df
+
+
+def klines_request_weight(limit):
+    """按币安规则计算一次K线请求的权重"""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+class RequestWeightLimiter:
+    """按分钟统计请求权重，超出预算时阻塞到下一分钟
+
+    本地计数会用响应头 X-MBX-USED-WEIGHT-1M 中交易所返回的真实值校正；
+    收到429/418后所有线程都暂停到 Retry-After 指定的时间。
+    """
+
+    def __init__(self, weight_limit=2400, window=60):
+        self.weight_limit = weight_limit
+        self.window = window
+        self.used = 0
+        self.window_start = self._current_window()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _current_window(self):
+        return int(time.time() // self.window) * self.window
+
+    def acquire(self, weight):
+        while True:
+            with self._lock:
+                blocked = self.blocked_until - time.time()
+            if blocked > 0:
+                time.sleep(blocked)
+                continue
+            with self._lock:
+                window_start = self._current_window()
+                if window_start != self.window_start:
+                    self.window_start = window_start
+                    self.used = 0
+                if self.used + weight <= self.weight_limit:
+                    self.used += weight
+                    return
+                wait = self.window_start + self.window - time.time()
+            time.sleep(max(wait, 0.05))
+
+    def update(self, used_weight):
+        with self._lock:
+            self.used = max(self.used, used_weight)
+
+    def block_for(self, seconds):
+        """收到429/418时，暂停所有请求 seconds 秒"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.time() + seconds)
+        time.sleep(seconds)
+
+
+class KlineDownloader:
+    """把时间区间切成互相独立的窗口，用有限大小的线程池并行下载K线
+
+    每个窗口最多 limit 根K线，失败的窗口会按指数退避重试，
+    最终结果按开盘时间拼接去重。base_url 可以指向本地的HTTP替身服务用于测试。
+    session 为 网络请求.HttpClient，默认使用进程内共享的连接池。
+    """
+
+    def __init__(self, base_url=KLINES_URL, max_workers=4, weight_limit=2400,
+                 limit=1500, max_retries=5, timeout=10, session=None):
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.limit = limit
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.session = session or get_default_client()
+        self.limiter = RequestWeightLimiter(weight_limit)
+        self.weight = klines_request_weight(limit)
+
+    def split_windows(self, interval, start_ms, end_ms):
+        """把 [start_ms, end_ms) 切成每段最多 limit 根K线的窗口"""
+        span = self.limit * INTERVAL_MS.get(interval, INTERVAL_MS["1h"])
+        return [(s, min(s + span, end_ms) - 1) for s in range(start_ms, end_ms, span)]
+
+    def fetch_window(self, symbol, interval, window_start, window_end):
+        """下载单个窗口，带限速和重试"""
+        params = {
+            "symbol": symbol,
+            "interval": interval,
+            "startTime": window_start,
+            "endTime": window_end,
+            "limit": self.limit
+        }
+
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(self.weight)
+            try:
+                # 限频和重试在这里处理，连接池层不再重试
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout, retries=0)
+                used = response.headers.get("X-MBX-USED-WEIGHT-1M") or response.headers.get("X-MBX-USED-WEIGHT-1m")
+                if used:
+                    self.limiter.update(int(used))
+
+                if response.status_code in (418, 429):
+                    retry_after = float(response.headers.get("Retry-After", 2 ** attempt))
+                    logger.warning(f"K线请求触发限频({response.status_code})，{retry_after}秒后重试")
+                    self.limiter.block_for(retry_after)
+                    continue
+
+                response.raise_for_status()
+                return response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                backoff = min(2 ** attempt, 30) * (0.5 + random.random())
+                logger.warning(f"K线窗口 {window_start}-{window_end} 下载失败，{backoff:.1f}秒后重试: {e}")
+                time.sleep(backoff)
+
+        raise requests.exceptions.RetryError(f"K线窗口 {window_start}-{window_end} 重试次数已用完")
+
+    def download(self, symbol, interval, start_ms, end_ms, progress=None):
+        """并行下载 [start_ms, end_ms) 区间的K线原始数据，按开盘时间返回
+
+        progress: 可选回调，参数为已获取的条数，在调用线程中执行
+        """
+        windows = self.split_windows(interval, start_ms, end_ms)
+        if not windows:
+            return []
+
+        results = {}
+        fetched = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(self.fetch_window, symbol, interval, s, e): i
+                for i, (s, e) in enumerate(windows)
+            }
+            try:
+                for future in as_completed(futures):
+                    data = future.result()
+                    results[futures[future]] = data
+                    fetched += len(data)
+                    if progress:
+                        progress(fetched)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        # 按窗口顺序拼接，并按开盘时间去重
+        all_data = []
+        last_open = None
+        for i in range(len(windows)):
+            for row in results.get(i, []):
+                if last_open is not None and row[0] <= last_open:
+                    continue
+                all_data.append(row)
+                last_open = row[0]
+        return all_data
+
+
+class KlineCache:
+    """按 (交易对, 周期) 保存在本地磁盘的K线列式缓存
+
+    每个交易对/周期对应一个 .npz 文件，按列存放开盘时间和数值列。
+    缓存始终是一段连续的K线，只会在头部或尾部扩展，因此只需补齐缺失的首尾区间。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+
+    def path(self, symbol, interval):
+        return os.path.join(self.cache_dir, f"{symbol.upper()}_{interval}.npz")
+
+    def load(self, symbol, interval):
+        """读取缓存，不存在或损坏时返回空DataFrame"""
+        path = self.path(symbol, interval)
+        if not os.path.exists(path):
+            return klines_to_frame([])
+
+        try:
+            with np.load(path) as data:
+                index = pd.to_datetime(data["timestamp"], unit="ms")
+                index.name = "timestamp"
+                columns = {col: data[col] for col in NUMERIC_COLUMNS}
+                columns["close_time"] = data["close_time"]
+            return pd.DataFrame(columns, index=index)
+        except Exception as e:
+            logger.warning(f"读取K线缓存失败，将重新下载: {path} {e}")
+            return klines_to_frame([])
+
+    def save(self, symbol, interval, df):
+        """把DataFrame写入缓存，未收盘的K线不会被保存"""
+        now_ms = int(time.time() * 1000)
+        df = df[df["close_time"] < now_ms]
+        if df.empty:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(symbol, interval)
+        tmp_path = path + ".tmp.npz"
+        columns = {col: df[col].to_numpy(dtype="float64") for col in NUMERIC_COLUMNS}
+        with self._lock:
+            np.savez(tmp_path,
+                     timestamp=df.index.to_numpy(dtype="datetime64[ms]").astype("int64"),
+                     close_time=df["close_time"].to_numpy(dtype="int64"),
+                     **columns)
+            os.replace(tmp_path, path)
+
+    @staticmethod
+    def missing_ranges(cached, start_ms, end_ms, interval_ms):
+        """计算请求区间中缓存未覆盖的首尾区间，返回 [(start_ms, end_ms), ...]
+
+        缺口区间会一直延伸到缓存边界，保证合并后的缓存仍然连续。
+        """
+        if cached.empty:
+            return [(start_ms, end_ms)]
+
+        first_ms = int(cached.index[0].value // 10**6)
+        last_ms = int(cached.index[-1].value // 10**6)
+        ranges = []
+        if start_ms < first_ms:
+            ranges.append((start_ms, first_ms))
+        if end_ms > last_ms + interval_ms:
+            ranges.append((last_ms + interval_ms, end_ms))
+        return ranges
+
+    @staticmethod
+    def merge(cached, fresh):
+        """合并缓存与新下载的数据，按开盘时间排序去重"""
+        if cached.empty:
+            return fresh
+        if fresh.empty:
+            return cached
+        df = pd.concat([cached, fresh])
+        return df[~df.index.duplicated(keep='last')].sort_index()
+
+
+def slice_klines(df, start_ms, end_ms):
+    """截取开盘时间位于 [start_ms, end_ms) 的K线"""
+    start = pd.to_datetime(start_ms, unit="ms")
+    end = pd.to_datetime(end_ms, unit="ms")
+    return df[(df.index >= start) & (df.index < end)]
+
+
+def load_klines(symbol, interval, start_ms, end_ms, cache=None, downloader=None, progress=None):
+    """读取本地缓存并下载缺失的首尾区间，返回 ([start_ms, end_ms) 内的K线, 新下载条数)
+
+    progress: 可选回调，参数为 0~1 之间的下载进度
+    """
+    cache = cache or KlineCache()
+    downloader = downloader or KlineDownloader()
+    interval_ms = INTERVAL_MS.get(interval, INTERVAL_MS["1h"])
+
+    cached = cache.load(symbol, interval)
+    missing = cache.missing_ranges(cached, start_ms, end_ms, interval_ms)
+    missing_expected = max(sum((e - s) // interval_ms for s, e in missing), 1)
+
+    all_data = []
+    for range_start, range_end in missing:
+        done = len(all_data)
+        all_data.extend(downloader.download(
+            symbol, interval, range_start, range_end,
+            progress=(lambda n, done=done: progress(min((done + n) / missing_expected, 1))) if progress else None))
+
+    # 合并缓存并写回磁盘
+    merged = cache.merge(cached, klines_to_frame(all_data))
+    if all_data:
+        try:
+            cache.save(symbol, interval, merged)
+        except Exception as e:
+            logger.warning(f"写入K线缓存失败: {e}")
+
+    return slice_klines(merged, start_ms, end_ms), len(all_data)
+
+
+def load_portfolio_klines(symbols, interval, start_ms, end_ms, cache=None, downloader=None,
+                          max_workers=None, progress=None):
+    """并发加载多个交易对的K线，返回 ({交易对: K线}, 新下载总条数)
+
+    各交易对共用同一个下载器，因此也共用同一份请求权重预算，不会因为并发而超出限频。
+    progress: 可选回调，参数为 (交易对, 0~1 之间的进度)，在下载线程中执行
+    """
+    cache = cache or KlineCache()
+    downloader = downloader or KlineDownloader()
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}, 0
+
+    frames = {}
+    downloaded = 0
+    with ThreadPoolExecutor(max_workers=max_workers or min(len(symbols), 8)) as pool:
+        futures = {
+            pool.submit(load_klines, symbol, interval, start_ms, end_ms, cache, downloader,
+                        (lambda p, symbol=symbol: progress(symbol, p)) if progress else None): symbol
+            for symbol in symbols
+        }
+        for future in as_completed(futures):
+            df, count = future.result()
+            frames[futures[future]] = df
+            downloaded += count
+    return {symbol: frames[symbol] for symbol in symbols}, downloaded
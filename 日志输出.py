@@ -0,0 +1,140 @@
+import os
+import logging
+import threading
+import tkinter as tk
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+logger = logging.getLogger(__name__)
+
+
+class LogBuffer:
+    """线程安全的日志环形缓冲
+
+    任意线程调用 write 写入一段文本，界面按固定帧率调用 drain 批量取走；
+    积压超过 capacity 条时丢弃最旧的记录并计数，界面卡顿时内存也不会无限增长。
+    设置 file_path 后，全部日志（包括被丢弃的）每攒够 spill_batch 条批量写入按大小轮转的文件。
+    """
+
+    def __init__(self, capacity=100000, file_path=None, max_bytes=10 * 1024 * 1024, backup_count=5,
+                 spill_batch=1000):
+        self._pending = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.spill_batch = spill_batch
+        self._spill = []
+        self._file = None
+        if file_path:
+            self.open_file(file_path, max_bytes, backup_count)
+
+    def open_file(self, file_path, max_bytes=10 * 1024 * 1024, backup_count=5):
+        """开始把日志写入轮转文件"""
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(file_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        # 每条记录是已带换行的一批文本，不再追加换行
+        handler.terminator = ""
+        self.close_file()
+        self._file = handler
+
+    def close_file(self):
+        self.flush_file()
+        handler, self._file = self._file, None
+        if handler is not None:
+            handler.close()
+
+    def write(self, text):
+        spill = None
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(text)
+            if self._file is not None:
+                self._spill.append(text)
+                if len(self._spill) >= self.spill_batch:
+                    spill, self._spill = self._spill, []
+        if spill:
+            self._write_file(spill)
+
+    def drain(self):
+        """取走全部积压的日志，返回 (文本列表, 丢弃条数)"""
+        with self._lock:
+            lines = list(self._pending)
+            self._pending.clear()
+            dropped, self.dropped = self.dropped, 0
+        return lines, dropped
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self.dropped = 0
+
+    def flush_file(self):
+        with self._lock:
+            spill, self._spill = self._spill, []
+        if spill:
+            self._write_file(spill)
+
+    def _write_file(self, lines):
+        handler = self._file
+        if handler is None:
+            return
+        try:
+            # handle 会持有 handler 的锁，多个线程同时写入和轮转时不会冲突
+            handler.handle(logging.makeLogRecord({"msg": "".join(lines)}))
+        except Exception as e:
+            logger.warning(f"写入日志文件失败: {e}")
+
+
+class LogView:
+    """把 LogBuffer 按固定帧率刷新到 Text 控件
+
+    每帧只做一次插入，Text 中最多保留 max_lines 行，超出的旧行从顶部删除；
+    用户向上翻看时不自动滚动到底部。
+    """
+
+    def __init__(self, root, text, buffer, interval_ms=100, max_lines=5000):
+        self.root = root
+        self.text = text
+        self.buffer = buffer
+        self.interval_ms = interval_ms
+        self.max_lines = max_lines
+        self._job = None
+
+    def start(self):
+        if self._job is None:
+            self._job = self.root.after(self.interval_ms, self.poll)
+
+    def stop(self):
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+
+    def poll(self):
+        self.flush()
+        self._job = self.root.after(self.interval_ms, self.poll)
+
+    def flush(self):
+        lines, dropped = self.buffer.drain()
+        if not lines:
+            return
+        # 一帧内超过可见行数的部分反正会被裁掉，直接只插入最后 max_lines 条
+        if len(lines) > self.max_lines:
+            dropped += len(lines) - self.max_lines
+            lines = lines[-self.max_lines:]
+        follow = self.text.yview()[1] >= 0.999
+        if dropped:
+            self.text.insert(tk.END, f"……省略 {dropped} 条日志……\n")
+        self.text.insert(tk.END, "".join(lines))
+
+        # 日志以换行结尾，末尾总有一个空行
+        line_count = int(self.text.index("end-1c").split(".")[0]) - 1
+        if line_count > self.max_lines:
+            self.text.delete("1.0", f"{line_count - self.max_lines + 1}.0")
+        if follow:
+            self.text.see(tk.END)
+
+    def clear(self):
+        self.buffer.clear()
+        self.text.delete("1.0", tk.END)
@@ -0,0 +1,277 @@
+import sys
+import argparse
+import logging
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime
+
+from 回测引擎 import (BacktestConfig, FIXED_MARGIN_MODE, PARAM_MODEL_PHASES, PERCENT_MARGIN_MODE,
+                  read_strategy_source)
+from 参数优化 import (SWEEP_METRICS, ParameterSweep, _run_combo, _worker_state, expand_grid,
+                  format_params, parse_grid, run_backtest)
+
+logger = logging.getLogger(__name__)
+
+WALK_FORWARD_SUMMARY_KEYS = ["窗口数", "样本外收益率", "样本外最大回撤", "样本外交易次数", "样本外胜率", "平均效率"]
+
+
+def split_windows(n_bars, train_bars, test_bars, step_bars=None, anchored=False):
+    """切分滚动窗口，返回 [(样本内起, 样本内止, 样本外起, 样本外止)]，均为K线序号，左闭右开
+
+    step_bars 默认等于 test_bars，使各样本外区间首尾相接；anchored=True 时样本内起点固定为0。
+    """
+    if train_bars <= 0 or test_bars <= 0:
+        raise ValueError("样本内和样本外K线数必须大于0")
+    step_bars = step_bars or test_bars
+    windows = []
+    train_start = 0
+    while train_start + train_bars + test_bars <= n_bars:
+        train_end = train_start + train_bars
+        windows.append((0 if anchored else train_start, train_end, train_end, train_end + test_bars))
+        train_start += step_bars
+    return windows
+
+
+def is_better(metric, value, best):
+    """最大回撤越小越好，其余指标越大越好"""
+    if best is None:
+        return True
+    return value < best if metric == "最大回撤" else value > best
+
+
+def _run_out_of_sample(params, start, end, warmup_start=None):
+    """子进程中用选出的参数回测样本外区间，先用 warmup_start 起的样本内K线预热策略
+
+    额外返回逐tick权益（含未平仓持仓的浮动盈亏）、每根K线的tick数和逐笔已实现盈亏
+    """
+    row = {"params": params, "trades": [], "equity": [], "ticks_per_bar": 1}
+    try:
+        result = run_backtest(_worker_state["code"], _worker_state["df"], _worker_state["base_config"],
+                              params, start, end, warmup_start)
+        row.update({key: result.summary[key] for key in SWEEP_METRICS})
+        row["trades"] = [(t["time"], t["profit"] - t["total_fee"], t["profit"] > 0) for t in result.trade_orders]
+        if result.equity is not None:
+            row["equity"] = result.equity
+        row["ticks_per_bar"] = len(PARAM_MODEL_PHASES.get(result.config.param_model, PARAM_MODEL_PHASES["仅收盘价"]))
+        row["open_orders"] = len(result.open_orders)
+        row["error"] = str(result.error) if result.error else ""
+    except Exception as e:
+        row.update({key: 0 for key in SWEEP_METRICS})
+        row["open_orders"] = 0
+        row["error"] = str(e)
+    return row
+
+
+def stitch_equity(windows, initial_margin, bar_label=None):
+    """把各窗口样本外的逐tick权益按复利拼接为一条资金曲线
+
+    权益按最新价计入未平仓持仓，窗口结束时仍持有的仓位以浮动盈亏带入下一个窗口的起点。
+    每个窗口都从 initial_margin 开始回测，拼接时按窗口开始时的权益等比例缩放。
+    bar_label(i) 返回第 i 根K线的时间，不传时整个窗口都用样本外开始时间。返回 [(时间, 权益)]。
+    """
+    equity = initial_margin
+    curve = []
+    for window in windows:
+        oos = window.get("样本外")
+        if not oos or not len(oos["equity"]):
+            continue
+        scale = equity / initial_margin if initial_margin else 1
+        start_equity = equity
+        if not curve:
+            curve.append((window["样本外时间"], equity))
+        ticks_per_bar = oos["ticks_per_bar"]
+        label = window["样本外时间"]
+        for j, value in enumerate(oos["equity"]):
+            if bar_label and j % ticks_per_bar == 0:
+                label = bar_label(window["样本外起"] + j // ticks_per_bar)
+            equity = start_equity + (float(value) - initial_margin) * scale
+            curve.append((label, equity))
+    return curve
+
+
+def summarize_walk_forward(windows, curve, initial_margin):
+    """汇总样本外表现"""
+    summary = {key: 0 for key in WALK_FORWARD_SUMMARY_KEYS}
+    evaluated = [w for w in windows if w.get("样本外")]
+    summary["窗口数"] = len(evaluated)
+    if not curve or not initial_margin:
+        return summary
+
+    final = curve[-1][1]
+    summary["样本外收益率"] = round((final - initial_margin) / initial_margin * 100, 2)
+    peak = curve[0][1]
+    max_drawdown = 0
+    for _, equity in curve:
+        peak = max(peak, equity)
+        if peak > 0:
+            max_drawdown = max(max_drawdown, (peak - equity) / peak)
+    summary["样本外最大回撤"] = round(max_drawdown * 100, 2)
+
+    trades = [trade for w in evaluated for trade in w["样本外"]["trades"]]
+    summary["样本外交易次数"] = len(trades)
+    summary["样本外胜率"] = round(sum(1 for t in trades if t[2]) / len(trades) * 100, 2) if trades else 0
+
+    # 效率 = 样本外每根K线收益率 / 样本内每根K线收益率，衡量最优参数在样本外保留了多少表现
+    efficiencies = []
+    for w in evaluated:
+        train_return = w["样本内"]["收益率"] / max(w["样本内止"] - w["样本内起"], 1)
+        test_return = w["样本外"]["收益率"] / max(w["样本外止"] - w["样本外起"], 1)
+        if train_return > 0:
+            efficiencies.append(test_return / train_return)
+    summary["平均效率"] = round(sum(efficiencies) / len(efficiencies), 2) if efficiencies else 0
+    return summary
+
+
+class WalkForward(ParameterSweep):
+    """滚动（walk-forward）优化
+
+    每个窗口先在样本内区间回测全部参数组合，按 metric 选出最优参数，再用该参数回测紧随其后的样本外区间，
+    样本外回测前先用样本内K线预热策略指标。
+    各窗口互不依赖：全部样本内组合一次性提交到进程池，某个窗口的组合全部完成后立即提交它的样本外回测，
+    进程池始终保持满载。数据集在子进程启动时只传递一次，窗口只传递K线序号。
+    """
+
+    def __init__(self, code, df, base_config, train_bars, test_bars, step_bars=None, anchored=False,
+                 metric="收益率", max_workers=None):
+        super().__init__(code, df, base_config, max_workers)
+        if metric not in SWEEP_METRICS:
+            raise ValueError(f"不支持的优化指标: {metric}")
+        self.metric = metric
+        self.windows = split_windows(len(df), train_bars, test_bars, step_bars, anchored)
+        if not self.windows:
+            raise ValueError(f"数据只有 {len(df)} 根K线，不足一个样本内+样本外窗口")
+
+    def bar_label(self, i):
+        return self.df.index[i].strftime("%Y-%m-%d %H:%M:%S")
+
+    def run(self, combos, on_window=None):
+        """执行滚动优化，返回 (窗口结果列表, 样本外资金曲线, 汇总指标)
+
+        on_window: 可选回调，某个窗口的样本外回测完成时以窗口结果调用
+        """
+        if isinstance(combos, dict):
+            combos = expand_grid(combos)
+        if not combos:
+            raise ValueError("参数组合为空")
+        self.stop_requested = False
+
+        windows = []
+        for i, (train_start, train_end, test_start, test_end) in enumerate(self.windows):
+            windows.append({
+                "窗口": i + 1,
+                "样本内起": train_start, "样本内止": train_end,
+                "样本外起": test_start, "样本外止": test_end,
+                "样本外时间": self.bar_label(test_start),
+                "参数": None, "样本内": None, "样本外": None, "剩余": len(combos)
+            })
+
+        with self.executor() as pool:
+            pending = {}
+            for window in windows:
+                for params in combos:
+                    future = pool.submit(_run_combo, params, window["样本内起"], window["样本内止"])
+                    pending[future] = ("样本内", window)
+            try:
+                while pending and not self.stop_requested:
+                    done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, window = pending.pop(future)
+                        row = future.result()
+                        if stage == "样本外":
+                            window["样本外"] = row
+                            if on_window:
+                                on_window(window)
+                            continue
+
+                        window["剩余"] -= 1
+                        if not row["error"] and is_better(self.metric, row[self.metric],
+                                                          window["样本内"][self.metric] if window["样本内"] else None):
+                            window["样本内"] = row
+                            window["参数"] = row["params"]
+                        if window["剩余"] == 0:
+                            if window["参数"] is None:
+                                logger.warning(f"窗口 {window['窗口']} 的样本内回测全部出错，跳过样本外")
+                                if on_window:
+                                    on_window(window)
+                                continue
+                            future = pool.submit(_run_out_of_sample, window["参数"],
+                                                 window["样本外起"], window["样本外止"], window["样本内起"])
+                            pending[future] = ("样本外", window)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+        curve = stitch_equity(windows, self.base_config.initial_margin, self.bar_label)
+        return windows, curve, summarize_walk_forward(windows, curve, self.base_config.initial_margin)
+
+
+def main(argv=None):
+    """命令行滚动优化入口"""
+    parser = argparse.ArgumentParser(description="币安量化框架 - 滚动（walk-forward）优化")
+    parser.add_argument("strategy", help="策略文件路径")
+    parser.add_argument("--grid", action="append", required=True,
+                        help='参数网格，如 "window=10,20,30" 或 "leverage=5:20:5"，可重复传入')
+    parser.add_argument("--train-bars", type=int, required=True, help="样本内K线数")
+    parser.add_argument("--test-bars", type=int, required=True, help="样本外K线数")
+    parser.add_argument("--step-bars", type=int, default=None, help="窗口滚动步长，默认等于样本外K线数")
+    parser.add_argument("--anchored", action="store_true", help="样本内起点固定在数据开头")
+    parser.add_argument("--symbol", default="BTCUSDT", help="交易对")
+    parser.add_argument("--interval", default="1h", help="时间周期")
+    parser.add_argument("--start", required=True, help="开始时间，格式 YYYY-MM-DD HH:MM:SS")
+    parser.add_argument("--end", default=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), help="结束时间")
+    parser.add_argument("--initial-margin", type=float, default=1000, help="初始保证金金额")
+    parser.add_argument("--fee-rate", type=float, default=0.05, help="手续费率(%%)")
+    parser.add_argument("--percentage-margin", type=float, default=None, help="按百分比保证金模式下单")
+    parser.add_argument("--fixed-margin", type=float, default=100, help="固定保证金模式下的下单保证金")
+    parser.add_argument("--leverage", type=float, default=10, help="杠杆倍数")
+    parser.add_argument("--param-model", default="开高低收", help="传参模型")
+    parser.add_argument("--metric", default="收益率", choices=SWEEP_METRICS, help="样本内选参指标")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认使用全部CPU")
+    args = parser.parse_args(argv)
+
+    from 数据服务 import load_klines
+
+    grid = {}
+    for text in args.grid:
+        grid.update(parse_grid(text))
+    combos = expand_grid(grid)
+
+    start_ms = int(datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+    end_ms = int(datetime.strptime(args.end, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+    df, _ = load_klines(args.symbol, args.interval, start_ms, end_ms)
+    if df.empty:
+        print("未获取到数据")
+        return 1
+
+    code, _ = read_strategy_source(args.strategy)
+    base_config = BacktestConfig(
+        symbol=args.symbol,
+        initial_margin=args.initial_margin,
+        fee_rate=args.fee_rate,
+        order_mode=PERCENT_MARGIN_MODE if args.percentage_margin is not None else FIXED_MARGIN_MODE,
+        fixed_margin=args.fixed_margin,
+        percentage_margin=args.percentage_margin or 10,
+        leverage=args.leverage,
+        param_model=args.param_model
+    )
+
+    walk_forward = WalkForward(code, df, base_config, args.train_bars, args.test_bars, args.step_bars,
+                               args.anchored, args.metric, args.workers)
+    print(f"共 {len(walk_forward.windows)} 个窗口，每个窗口 {len(combos)} 个参数组合，{len(df)} 根K线")
+
+    def report(window):
+        oos = window["样本外"]
+        if oos is None:
+            print(f"窗口 {window['窗口']}：样本内回测全部出错")
+            return
+        metrics = "  ".join(f"{key}={oos[key]}" for key in SWEEP_METRICS)
+        print(f"窗口 {window['窗口']}（样本外自 {window['样本外时间']}）  {format_params(window['参数'])}  |  {metrics}")
+
+    windows, curve, summary = walk_forward.run(combos, on_window=report)
+    print()
+    for key, value in summary.items():
+        print(f"{key}: {value}{'%' if key in ['样本外收益率', '样本外最大回撤', '样本外胜率'] else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
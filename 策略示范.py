@@ -1,11 +1,11 @@
-import pandas as pd
+from 指标库 import Bollinger
 
 # 初始化参数
 window = 20  # 布林带计算的窗口大小
 std_multiplier = 2  # 标准差的倍数
 
-# 存储价格数据
-price_data = pd.Series()
+# 流式布林带指标：只保留最近 window 个价格，每次更新 O(1)
+boll = Bollinger(window=window, std_multiplier=std_multiplier)
 # 存储上一个时间点的布林带信息
 last_boll_mid = None
 last_boll_upper = None
@@ -28,22 +28,13 @@ last_signal = None
 
 def trade_signal(time, price):    #核心函数代码，必须要有这个，框架里会调用，只能传入time和price，没有vol，需要的话自己改框架
     
-    global price_data, last_boll_mid, last_boll_upper, last_boll_lower, last_signal
+    global last_boll_mid, last_boll_upper, last_boll_lower, last_signal
 
-    # 添加新的价格数据
-    price_data = pd.concat([price_data, pd.Series([price])])
-
-    # 计算布林带
-    if len(price_data) >= window:
-        boll_mid = price_data.rolling(window=window).mean()
-        boll_std = price_data.rolling(window=window).std()
-        boll_upper = boll_mid + std_multiplier * boll_std
-        boll_lower = boll_mid - std_multiplier * boll_std
-
-        current_boll_mid = boll_mid.iloc[-1]
-        current_boll_upper = boll_upper.iloc[-1]
-        current_boll_lower = boll_lower.iloc[-1]
+    # 添加新的价格数据并更新布林带
+    current_boll_mid, current_boll_upper, current_boll_lower = boll.update(price)
 
+    # 数据量足够时计算信号
+    if boll.ready:
         # 交易信号逻辑
         if last_boll_mid is not None:
             if price > current_boll_upper and price < last_boll_upper:
@@ -0,0 +1,273 @@
+import os
+import sys
+import argparse
+import logging
+from datetime import datetime
+import numpy as np
+
+from 持仓账本 import PositionBook
+from 绩效统计 import EquityCurve
+from 回测引擎 import (BacktestConfig, BacktestEngine, BacktestResult, FIXED_MARGIN_MODE, PARAM_MODELS,
+                  PERCENT_MARGIN_MODE, SIGNAL_NAMES, build_strategy_namespace,
+                  read_strategy_source)
+
+logger = logging.getLogger(__name__)
+
+SYMBOL_RESULT_KEYS = ["交易次数", "胜率", "总盈亏", "总手续费", "最大盈利", "最大亏损", "未平仓数"]
+
+
+def summarize_symbols(symbols, trade_orders, open_orders):
+    """按交易对统计已平仓订单和未平仓数量"""
+    summary = {symbol: {key: 0 for key in SYMBOL_RESULT_KEYS} for symbol in symbols}
+    trades_by_symbol = {symbol: [] for symbol in symbols}
+    for trade in trade_orders:
+        trades_by_symbol.setdefault(trade["symbol"], []).append(trade)
+
+    for symbol, trades in trades_by_symbol.items():
+        stats = summary.setdefault(symbol, {key: 0 for key in SYMBOL_RESULT_KEYS})
+        stats["交易次数"] = len(trades)
+        if not trades:
+            continue
+        profits = [t["profit"] for t in trades]
+        stats["胜率"] = round(sum(1 for p in profits if p > 0) / len(profits) * 100, 2)
+        stats["总盈亏"] = round(sum(profits), 2)
+        stats["总手续费"] = round(sum(t["total_fee"] for t in trades), 2)
+        stats["最大盈利"] = round(max(profits), 2)
+        stats["最大亏损"] = round(min(profits), 2)
+
+    for order in open_orders:
+        summary[order["symbol"]]["未平仓数"] += 1
+    return summary
+
+
+class PortfolioBacktestResult(BacktestResult):
+    """组合回测结果：summary 为账户整体指标，symbol_summary 为各交易对指标"""
+
+    def __init__(self, config, symbols):
+        super().__init__(config)
+        self.symbols = list(symbols)
+        self.symbol_summary = {symbol: {key: 0 for key in SYMBOL_RESULT_KEYS} for symbol in self.symbols}
+
+    def format_symbol_summary(self):
+        lines = []
+        for symbol, stats in self.symbol_summary.items():
+            text = "，".join(f"{key}: {value}{'%' if key == '胜率' else ''}" for key, value in stats.items())
+            lines.append(f"{symbol}  {text}")
+        return "\n".join(lines)
+
+    def format_summary(self):
+        return super().format_summary() + "\n\n" + self.format_symbol_summary()
+
+
+class PortfolioBacktestEngine(BacktestEngine):
+    """多交易对组合回测
+
+    同一份策略代码为每个交易对各执行一次，得到互不干扰的策略状态；
+    各交易对的K线按传参模型展开后，按 (K线时间, tick序号, 交易对) 合并成一条事件流，
+    所有交易对共用一个保证金账户，持仓按交易对分账本记录。
+    """
+
+    def __init__(self, config, code, params=None, log=None, on_trade=None):
+        self.config = config
+        self.code = code
+        self.params = params
+        self.strategy = None
+        self.batch_strategy = None
+        self.log = log
+        self.on_trade = on_trade
+        self.metrics = None
+        self.stop_requested = False
+        self.books = {}
+
+    def build_strategies(self, symbols):
+        """为每个交易对创建独立的策略命名空间"""
+        namespaces = {}
+        for symbol in symbols:
+            namespace = build_strategy_namespace(self.code, self.params)
+            if 'trade_signal' not in namespace and 'trade_signals' not in namespace:
+                raise ValueError("策略文件中未找到 trade_signal 或 trade_signals 函数")
+            namespaces[symbol] = namespace
+        return namespaces
+
+    def merge_ticks(self, frames, namespaces):
+        """把各交易对的tick合并为按时间排序的数组
+
+        返回 (时间字符串列表, 价格, 交易对序号, 批量信号编码)，
+        逐tick策略的交易对信号编码为 -1，表示需要在回测时调用 trade_signal。
+        """
+        symbols = list(frames)
+        times, phases, owners, prices, codes = [], [], [], [], []
+        phase_names = None
+        for s, symbol in enumerate(symbols):
+            df = frames[symbol]
+            ticks = self.expand_ticks(df)
+            phase_names = ticks.phases
+            batch_strategy = namespaces[symbol].get('trade_signals')
+            if batch_strategy is not None:
+                tick_codes = np.asarray(self.batch_tick_signals(batch_strategy, df, ticks), dtype=np.int8)
+            else:
+                tick_codes = np.full(len(ticks), -1, dtype=np.int8)
+            times.append(ticks.timestamps)
+            phases.append(ticks.phase_index)
+            owners.append(np.full(len(ticks), s, dtype=np.int16))
+            prices.append(ticks.prices)
+            codes.append(tick_codes)
+
+        if phase_names is None or not sum(len(p) for p in prices):
+            return [], np.empty(0), np.empty(0, dtype=np.int16), np.empty(0, dtype=np.int8)
+
+        times = np.concatenate(times)
+        phases = np.concatenate(phases)
+        owners = np.concatenate(owners)
+        order = np.lexsort((owners, phases, times))
+        times, phases = times[order], phases[order]
+
+        # 相同开盘时间的K线只生成一次时间字符串
+        bar_times, inverse = np.unique(times, return_inverse=True)
+        bar_labels = np.char.replace(
+            np.datetime_as_string(bar_times.astype("datetime64[ms]").astype("datetime64[s]"), unit="s"),
+            "T", " ").tolist()
+        suffixes = [f" {phase}" for phase in phase_names]
+        labels = [bar_labels[b] + suffixes[p] for b, p in zip(inverse.tolist(), phases.tolist())]
+        return labels, np.concatenate(prices)[order], owners[order], np.concatenate(codes)[order]
+
+    def run(self, frames):
+        """执行组合回测，frames 为 {交易对: K线DataFrame}"""
+        config = self.config
+        symbols = [symbol for symbol, df in frames.items() if df is not None and not df.empty]
+        result = PortfolioBacktestResult(config, symbols)
+        log = self.log
+        self.stop_requested = False
+
+        self.reset(result)
+        self.books = {symbol: PositionBook() for symbol in symbols}
+        self.positions = PositionBook()
+        self.symbol = config.symbol
+
+        try:
+            namespaces = self.build_strategies(symbols)
+            labels, prices, owners, codes = self.merge_ticks({s: frames[s] for s in symbols}, namespaces)
+        except Exception as e:
+            result.error = e
+            if log:
+                log(f"组合回测准备出错: {str(e)}\n")
+            self.summarize(result)
+            return result
+
+        books = [self.books[symbol] for symbol in symbols]
+        strategies = [namespaces[symbol].get('trade_signal') for symbol in symbols]
+        rules = [self.symbol_rules(symbol) for symbol in symbols]
+        # 账户权益 = 保证金余额 + 各交易对持仓按最新价计的权益（a * 最新价 + b），只在该交易对成交后重算系数
+        curve = EquityCurve()
+        last_prices = [0.0] * len(symbols)
+        terms = [(0.0, 0.0)] * len(symbols)
+        state = None
+        for time, price, s, code in zip(labels, prices.tolist(), owners.tolist(), codes.tolist()):
+            if self.stop_requested:
+                result.stopped = True
+                if log:
+                    log("回测已停止\n")
+                break
+
+            try:
+                # 切换到当前tick所属交易对的持仓账本，保证金账户共用
+                self.positions = books[s]
+                self.symbol = symbols[s]
+                self.rules = rules[s]
+                signal = strategies[s](time, price) if code < 0 else SIGNAL_NAMES[code]
+                result.ticks += 1
+                if log:
+                    log(f"{time}，{self.symbol}，价格: {price}，信号: {signal}\n")
+
+                self.process_signal(time, signal, price)
+                last_prices[s] = price
+                if state != (self.order_sequence, len(self.trade_orders)):
+                    state = (self.order_sequence, len(self.trade_orders))
+                    terms[s] = books[s].equity_terms()
+                curve.append(self.margin + sum(a * p + b for (a, b), p in zip(terms, last_prices)),
+                             any(books))
+
+                # 检查是否爆仓
+                if self.margin <= 0:
+                    result.bankrupt = True
+                    if log:
+                        log("账户爆仓，回测结束\n")
+                    break
+
+            except Exception as e:
+                result.error = e
+                if log:
+                    log(f"回测过程出错: {str(e)}\n")
+                break
+
+        result.equity = curve.equity
+        result.exposure = curve.exposed
+        result.final_margin = self.margin
+        result.open_orders = sorted((order for book in books for order in book.to_list()),
+                                    key=lambda order: order["sequence"])
+        self.summarize(result)
+        result.symbol_summary = summarize_symbols(symbols, result.trade_orders, result.open_orders)
+        if log:
+            log("回测完成\n")
+        return result
+
+
+def main(argv=None):
+    """命令行组合回测入口"""
+    parser = argparse.ArgumentParser(description="币安量化框架 - 多交易对组合回测")
+    parser.add_argument("strategy", help="策略文件路径（需包含 trade_signal 或 trade_signals 函数）")
+    parser.add_argument("--symbols", default="BTCUSDT,ETHUSDT,BNBUSDT,SOLUSDT,ADAUSDT", help="交易对，逗号分隔")
+    parser.add_argument("--interval", default="1h", help="时间周期，如 1m/5m/1h")
+    parser.add_argument("--start", required=True, help="开始时间，格式 YYYY-MM-DD HH:MM:SS")
+    parser.add_argument("--end", default=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), help="结束时间")
+    parser.add_argument("--initial-margin", type=float, default=1000, help="初始保证金金额（各交易对共用）")
+    parser.add_argument("--fee-rate", type=float, default=0.05, help="手续费率(%%)")
+    parser.add_argument("--percentage-margin", type=float, default=None,
+                        help="按百分比保证金模式（滚仓）下单，取值为百分比；不传则为固定保证金模式")
+    parser.add_argument("--fixed-margin", type=float, default=100, help="固定保证金模式下的下单保证金")
+    parser.add_argument("--leverage", type=float, default=10, help="杠杆倍数")
+    parser.add_argument("--param-model", default="开高低收", choices=PARAM_MODELS, help="传参模型")
+    parser.add_argument("--no-liquidation", action="store_true", help="关闭强平机制")
+    parser.add_argument("--exchange-rules", action="store_true", help="按交易所的数量步长和最小下单额取整开仓数量")
+    parser.add_argument("--verbose", action="store_true", help="输出逐tick日志")
+    args = parser.parse_args(argv)
+
+    from 数据服务 import load_portfolio_klines
+    from 交易规则 import ExchangeInfoCache
+
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+    start_ms = int(datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+    end_ms = int(datetime.strptime(args.end, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+    frames, _ = load_portfolio_klines(symbols, args.interval, start_ms, end_ms)
+    for symbol, df in frames.items():
+        if df.empty:
+            print(f"{symbol} 未获取到数据，已跳过")
+    if all(df.empty for df in frames.values()):
+        print("未获取到数据")
+        return 1
+
+    config = BacktestConfig(
+        symbol=symbols[0],
+        initial_margin=args.initial_margin,
+        fee_rate=args.fee_rate,
+        order_mode=PERCENT_MARGIN_MODE if args.percentage_margin is not None else FIXED_MARGIN_MODE,
+        fixed_margin=args.fixed_margin,
+        percentage_margin=args.percentage_margin or 10,
+        leverage=args.leverage,
+        param_model=args.param_model,
+        enable_liquidation=not args.no_liquidation,
+        symbol_filters=ExchangeInfoCache().select(symbols) if args.exchange_rules else None
+    )
+    code, _ = read_strategy_source(args.strategy)
+    log = (lambda text: sys.stdout.write(text)) if args.verbose else None
+    engine = PortfolioBacktestEngine(config, code, log=log)
+
+    bars = "，".join(f"{symbol} {len(df)} 根" for symbol, df in frames.items())
+    print(f"{os.path.basename(args.strategy)} 组合回测 {args.interval}：{bars}")
+    result = engine.run(frames)
+    print(result.format_summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import math
+import time
+import numpy as np
+
+# 由逐tick权益曲线计算的指标：最长水下为tick数，其余为百分比
+EQUITY_METRIC_KEYS = ["最大回撤", "水下时间", "最长水下", "持仓时间"]
+
+
+class EquityCurve:
+    """逐tick权益曲线，保存在预分配的 float64 / bool 数组中，写满后容量翻倍
+
+    equity 为每个tick处理完后的权益（可用保证金 + 占用保证金 + 未实现盈亏），exposed 为该tick是否持仓。
+    """
+
+    def __init__(self, capacity=65536):
+        self._equity = np.empty(capacity)
+        self._exposed = np.empty(capacity, dtype=bool)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self, capacity):
+        equity = np.empty(capacity)
+        exposed = np.empty(capacity, dtype=bool)
+        equity[:self.count] = self._equity[:self.count]
+        exposed[:self.count] = self._exposed[:self.count]
+        self._equity, self._exposed = equity, exposed
+
+    def append(self, equity, exposed):
+        if self.count == len(self._equity):
+            self._grow(max(len(self._equity) * 2, 1024))
+        self._equity[self.count] = equity
+        self._exposed[self.count] = exposed
+        self.count += 1
+
+    @property
+    def equity(self):
+        return self._equity[:self.count]
+
+    @property
+    def exposed(self):
+        return self._exposed[:self.count]
+
+
+def decimate_minmax(values, max_points):
+    """把序列抽稀到约 max_points 个点用于绘图，每段保留最小值和最大值，返回按原顺序排列的下标
+
+    只保留极值保证曲线上的回撤低点和高点不会因抽稀而消失，首尾两点总是保留。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    buckets = max(max_points // 2, 1)
+    if n <= max(max_points, 2):
+        return np.arange(n)
+    size = -(-n // buckets)
+    # 末尾不足一段的部分用最后一个值补齐，argmin/argmax 取第一次出现的位置，不会选中补齐的值
+    padded = np.concatenate([values, np.full(size * buckets - n, values[-1])]).reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    keep = np.concatenate([[0, n - 1], offsets + padded.argmin(axis=1), offsets + padded.argmax(axis=1)])
+    return np.unique(np.minimum(keep, n - 1))
+
+
+def underwater_runs(underwater):
+    """水下（低于此前最高点）的连续区间长度数组"""
+    if not len(underwater):
+        return np.zeros(0, dtype=np.int64)
+    edges = np.diff(np.concatenate([[0], underwater.view(np.int8), [0]]))
+    return np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+
+
+def equity_metrics(equity, exposed, initial):
+    """对逐tick权益曲线做数组运算，返回最大回撤（峰值到谷底）、水下时间占比、最长连续水下tick数和持仓时间占比"""
+    metrics = {key: 0 for key in EQUITY_METRIC_KEYS}
+    if not len(equity):
+        return metrics
+    # 初始金额作为起点的峰值
+    peak = np.maximum(np.maximum.accumulate(equity), initial)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = np.where(peak > 0, (peak - equity) / peak, 0.0)
+    underwater = equity < peak
+    # 行情跳空越过强平价时权益可能短暂为负，回撤最多按 100% 计
+    metrics["最大回撤"] = round(min(float(drawdown.max()), 1.0) * 100, 2)
+    metrics["水下时间"] = round(float(np.count_nonzero(underwater)) / len(equity) * 100, 2)
+    runs = underwater_runs(underwater)
+    metrics["最长水下"] = int(runs.max()) if len(runs) else 0
+    metrics["持仓时间"] = round(float(np.count_nonzero(exposed)) / len(exposed) * 100, 2) if len(exposed) else 0
+    return metrics
+
+
+# 实测/实盘运行中实时更新的指标
+ONLINE_METRIC_KEYS = ["交易次数", "胜率", "平均盈亏", "标准差", "夏普比率", "盈亏比", "最大回撤", "持仓时间"]
+
+
+class MetricsAccumulator:
+    """增量更新的绩效指标，每笔成交、每次权益更新都是 O(1)
+
+    平仓盈亏的均值和方差用 Welford 算法累计，最大回撤按权益的历史最高点实时更新，
+    持仓时间按两次权益更新之间是否持仓累计。写入只在交易线程中进行，每次更新后把全部状态
+    作为一个元组整体替换，界面线程调用 snapshot() 读取时不需要加锁，也不会读到更新了一半的状态。
+    盈亏口径与 BacktestEngine.summarize 相同（平仓盈亏不含手续费，标准差为总体标准差）。
+    initial 为起点的权益，为 None 时以第一次 update_equity 的权益为起点（实盘以首次同步的账户权益为准）。
+    """
+
+    def __init__(self, initial=None):
+        self.initial = initial
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.wins = 0
+        self.losses = 0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.peak = initial
+        self.max_drawdown = 0.0
+        self.exposed = False
+        self.exposed_seconds = 0.0
+        self.started = time.time()
+        self.last_update = self.started
+        self._state = None
+        self._publish()
+
+    def add_trade(self, profit):
+        """计入一笔平仓盈亏"""
+        self.count += 1
+        delta = profit - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (profit - self.mean)
+        if profit > 0:
+            self.wins += 1
+            self.gross_profit += profit
+        elif profit < 0:
+            self.losses += 1
+            self.gross_loss -= profit
+        self._publish()
+
+    def update_equity(self, equity, exposed, now=None):
+        """记录最新权益和是否持仓，now 为时间戳（秒），默认取当前时间"""
+        now = time.time() if now is None else now
+        if self.exposed:
+            self.exposed_seconds += max(now - self.last_update, 0.0)
+        self.last_update = now
+        self.exposed = exposed
+        if self.peak is None or equity > self.peak:
+            self.peak = equity
+        elif self.peak > 0:
+            self.max_drawdown = max(self.max_drawdown, min((self.peak - equity) / self.peak, 1.0))
+        self._publish()
+
+    def _publish(self):
+        self._state = (self.count, self.mean, self.m2, self.wins, self.gross_profit, self.gross_loss,
+                       self.max_drawdown, self.exposed, self.exposed_seconds, self.last_update)
+
+    def snapshot(self, now=None):
+        """返回当前指标字典，可在任意线程调用"""
+        count, mean, m2, wins, gross_profit, gross_loss, max_drawdown, exposed, exposed_seconds, last_update = \
+            self._state
+        now = time.time() if now is None else now
+        if exposed:
+            exposed_seconds += max(now - last_update, 0.0)
+        elapsed = now - self.started
+        std_dev = math.sqrt(m2 / count) if count else 0.0
+        return {
+            "交易次数": count,
+            "胜率": round(wins / count * 100, 2) if count else 0,
+            "平均盈亏": round(mean, 4),
+            "标准差": round(std_dev, 4) if count >= 2 else 0,
+            "夏普比率": round(mean / std_dev * math.sqrt(252), 2) if count >= 2 and std_dev != 0 else 0,
+            "盈亏比": round(gross_profit / gross_loss, 2) if gross_loss else 0,
+            "最大回撤": round(max_drawdown * 100, 2),
+            "持仓时间": round(exposed_seconds / elapsed * 100, 2) if elapsed > 0 else 0
+        }
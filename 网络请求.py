@@ -0,0 +1,170 @@
+import time
+import random
+import logging
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# 只对幂等请求重试；下单等 POST 请求即使失败也不自动重发，避免重复下单
+RETRY_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRY_STATUS = {500, 502, 503, 504}
+HTTP_STATS_KEYS = ["请求数", "失败数", "平均延迟ms", "P50延迟ms", "P95延迟ms", "最大延迟ms"]
+# 属于某个账户的请求头，只随对应 Client 的请求发送，不能写入共用的连接池
+AUTH_HEADERS = {"x-mbx-apikey"}
+
+
+class EndpointStats:
+    """单个接口的请求次数、失败次数和延迟统计，延迟分位数按最近 window 次请求计算"""
+
+    def __init__(self, window=500):
+        self.count = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.recent = deque(maxlen=window)
+
+    def record(self, latency, failed):
+        self.count += 1
+        self.errors += failed
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.recent.append(latency)
+
+    def summary(self):
+        recent = sorted(self.recent)
+
+        def percentile(q):
+            if not recent:
+                return 0
+            return round(recent[min(int(q * len(recent)), len(recent) - 1)] * 1000, 1)
+
+        return {
+            "请求数": self.count,
+            "失败数": self.errors,
+            "平均延迟ms": round(self.total_latency / self.count * 1000, 1) if self.count else 0,
+            "P50延迟ms": percentile(0.5),
+            "P95延迟ms": percentile(0.95),
+            "最大延迟ms": round(self.max_latency * 1000, 1)
+        }
+
+
+class HttpClient(requests.Session):
+    """全部 REST 请求共用的连接池
+
+    在 requests.Session 的基础上：复用 keep-alive 连接，未指定 timeout 的请求使用统一超时，
+    幂等请求遇到连接错误或 5xx 时按指数退避加随机抖动重试，并按 "方法 路径" 统计每个接口的延迟和失败次数。
+    可以直接替换 python-binance Client 的 session，使下单、查询账户等请求也走同一个连接池。
+    """
+
+    def __init__(self, timeout=10, max_retries=3, pool_size=16):
+        super().__init__()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def request(self, method, url, *args, retries=None, **kwargs):
+        """发送请求；retries 为本次请求的最大重试次数，默认使用 max_retries，调用方自己处理重试时传 0"""
+        kwargs.setdefault("timeout", self.timeout)
+        method = method.upper()
+        endpoint = f"{method} {urlsplit(url).path}"
+        retries = self.max_retries if retries is None else retries
+        if method not in RETRY_METHODS:
+            retries = 0
+
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self.record(endpoint, time.perf_counter() - start, True)
+                if attempt >= retries or not isinstance(e, (requests.exceptions.ConnectionError,
+                                                            requests.exceptions.Timeout)):
+                    raise
+                reason = str(e)
+            else:
+                self.record(endpoint, time.perf_counter() - start, response.status_code >= 400)
+                if response.status_code not in RETRY_STATUS or attempt >= retries:
+                    return response
+                reason = f"HTTP {response.status_code}"
+            backoff = min(2 ** attempt, 10) * (0.5 + random.random()) * 0.5
+            logger.warning(f"{endpoint} 请求失败（{reason}），{backoff:.1f}秒后重试")
+            time.sleep(backoff)
+
+    def record(self, endpoint, latency, failed):
+        with self._stats_lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = EndpointStats()
+            stats.record(latency, failed)
+
+    def stats(self):
+        """返回 {接口: 统计字典}，按请求数从多到少排列"""
+        with self._stats_lock:
+            items = [(endpoint, stats.summary()) for endpoint, stats in self._stats.items()]
+        return dict(sorted(items, key=lambda item: -item[1]["请求数"]))
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    def bind_binance_client(self, client):
+        """让 python-binance 的 Client 改用本连接池
+
+        Client 的普通请求头写入连接池；API Key 只保存在该 Client 的 ClientSession 中，
+        行情下载等其他共用连接池的请求不会带上账户凭证。
+        """
+        headers = client.session.headers
+        self.headers.update({key: value for key, value in headers.items() if key.lower() not in AUTH_HEADERS})
+        auth_headers = {key: value for key, value in headers.items() if key.lower() in AUTH_HEADERS}
+        if client.session is not self:
+            client.session.close()
+        client.session = ClientSession(self, auth_headers)
+        return client
+
+
+class ClientSession:
+    """python-binance Client 使用的会话：请求交给共用的 HttpClient 发送，每次请求附加该 Client 的账户请求头"""
+
+    def __init__(self, http, headers):
+        self.http = http
+        self.headers = headers
+
+    def request(self, method, url, headers=None, **kwargs):
+        return self.http.request(method, url, headers={**self.headers, **(headers or {})}, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        """连接池由 HttpClient 管理，这里不关闭"""
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_default_client():
+    """进程内共享的默认连接池"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
@@ -0,0 +1,180 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+
+from 事件引擎 import market_event
+
+# 文件头：8 字节标识 + 24 字节交易对，之后是定长记录
+TICK_LOG_MAGIC = b"BQTICK01"
+TICK_LOG_HEADER_SIZE = 32
+# received 为本机收到行情时的时间戳（秒），time 为行情自身的时间（毫秒）
+TICK_RECORD_DTYPE = np.dtype([("received", "<f8"), ("time", "<i8"), ("price", "<f8"), ("kind", "u1")])
+TRADE, MARK, KLINE = 0, 1, 2
+TICK_KINDS = {"trade": TRADE, "mark": MARK, "kline": KLINE}
+
+DEFAULT_TICK_LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tick_logs")
+
+
+class TickRecorder:
+    """把收到的每条行情追加写入二进制文件
+
+    每条记录 25 字节（收到时间、行情时间、价格、类型），先写入预分配的缓冲区，攒够 batch 条或调用 flush 时
+    一次追加到文件末尾。文件只追加不改写，进程意外退出时最多丢失缓冲区中的记录，已写入的部分仍可读取。
+    record 可以在任意线程调用。
+    """
+
+    def __init__(self, path, symbol, batch=4096):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.symbol = symbol
+        self._buffer = np.zeros(batch, dtype=TICK_RECORD_DTYPE)
+        self._count = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab")
+        if new_file:
+            self._file.write(TICK_LOG_MAGIC + symbol.encode()[:24].ljust(24, b"\0"))
+
+    def record(self, kind, time_ms, price, received=None):
+        with self._lock:
+            self._buffer[self._count] = (time.time() if received is None else received, time_ms, price, kind)
+            self._count += 1
+            self.recorded += 1
+            if self._count == len(self._buffer):
+                self._write()
+
+    def record_event(self, event):
+        """记录行情推送的事件（trade/mark/kline），K线记录收盘时间和收盘价"""
+        if event["type"] == "kline":
+            self.record(KLINE, event["close_time"], event["close"])
+        else:
+            self.record(TICK_KINDS[event["type"]], event["time"], event["price"])
+
+    def _write(self):
+        if self._count and self._file is not None:
+            self._file.write(self._buffer[:self._count].tobytes())
+            self._file.flush()
+        self._count = 0
+
+    def flush(self):
+        with self._lock:
+            self._write()
+
+    def close(self):
+        with self._lock:
+            self._write()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class TickLog:
+    """以内存映射方式读取 TickRecorder 写入的文件，records 为结构化数组，不会整体读入内存"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = f.read(TICK_LOG_HEADER_SIZE)
+        if len(header) < TICK_LOG_HEADER_SIZE or not header.startswith(TICK_LOG_MAGIC):
+            raise ValueError(f"不是行情录制文件: {path}")
+        self.path = path
+        self.symbol = header[len(TICK_LOG_MAGIC):].rstrip(b"\0").decode()
+        # 末尾不完整的记录（写入时进程退出）忽略
+        count = (os.path.getsize(path) - TICK_LOG_HEADER_SIZE) // TICK_RECORD_DTYPE.itemsize
+        self.records = np.memmap(path, dtype=TICK_RECORD_DTYPE, mode="r", offset=TICK_LOG_HEADER_SIZE,
+                                 shape=(count,)) if count else np.zeros(0, dtype=TICK_RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def duration(self):
+        """录制时长（秒）"""
+        if not len(self.records):
+            return 0.0
+        return float(self.records["received"][-1] - self.records["received"][0])
+
+
+def recorded_events(log, trigger="逐笔成交", speed=0, is_running=None, chunk=65536):
+    """把录制的行情转为事件驱动引擎的行情事件
+
+    逐笔成交触发时每笔成交一条事件；K线收盘触发时每根K线一条事件，成交和标记价格只用于强平检查。
+    speed 为回放倍速，按录制时的收到时间间隔除以 speed 等待；0 为不等待，以最快速度回放。
+    """
+    symbol = log.symbol
+    records = log.records
+    start_wall = time.monotonic()
+    start_received = float(records["received"][0]) if len(records) else 0.0
+    for begin in range(0, len(records), chunk):
+        # 逐块复制出内存映射的数据，转为 Python 列表后逐条处理
+        block = np.array(records[begin:begin + chunk])
+        for received, time_ms, price, kind in zip(block["received"].tolist(), block["time"].tolist(),
+                                                  block["price"].tolist(), block["kind"].tolist()):
+            if is_running is not None and not is_running():
+                return
+            if speed > 0:
+                delay = (received - start_received) / speed - (time.monotonic() - start_wall)
+                if delay > 0:
+                    time.sleep(delay)
+            if kind == KLINE:
+                if trigger == "K线收盘":
+                    yield market_event(time_ms, price, symbol)
+            elif kind == TRADE and trigger != "K线收盘":
+                yield market_event(time_ms, price, symbol, low=price, high=price)
+            else:
+                yield market_event(time_ms, None, symbol, low=price, high=price)
+
+
+def main(argv=None):
+    """命令行回放录制的行情"""
+    from 事件引擎 import EventEngine
+    from 回测引擎 import FIXED_MARGIN_MODE, PERCENT_MARGIN_MODE, BacktestConfig, load_strategy_namespace
+    from 行情推送 import TRIGGER_MODES
+
+    parser = argparse.ArgumentParser(description="币安量化框架 - 回放录制的行情")
+    parser.add_argument("strategy", help="策略文件路径（需包含 trade_signal 函数）")
+    parser.add_argument("log", help="行情录制文件（.ticks）")
+    parser.add_argument("--speed", type=float, default=0, help="回放倍速，0 为最快")
+    parser.add_argument("--trigger", default="逐笔成交", choices=TRIGGER_MODES, help="触发策略的方式")
+    parser.add_argument("--initial-margin", type=float, default=1000, help="初始保证金金额")
+    parser.add_argument("--fee-rate", type=float, default=0.05, help="手续费率(%%)")
+    parser.add_argument("--percentage-margin", type=float, default=None, help="按百分比保证金模式下单")
+    parser.add_argument("--fixed-margin", type=float, default=100, help="固定保证金模式下的下单保证金")
+    parser.add_argument("--leverage", type=float, default=10, help="杠杆倍数")
+    parser.add_argument("--no-liquidation", action="store_true", help="关闭强平机制")
+    parser.add_argument("--verbose", action="store_true", help="输出逐tick日志")
+    args = parser.parse_args(argv)
+
+    log = TickLog(args.log)
+    config = BacktestConfig(
+        symbol=log.symbol,
+        initial_margin=args.initial_margin,
+        fee_rate=args.fee_rate,
+        order_mode=PERCENT_MARGIN_MODE if args.percentage_margin is not None else FIXED_MARGIN_MODE,
+        fixed_margin=args.fixed_margin,
+        percentage_margin=args.percentage_margin or 10,
+        leverage=args.leverage,
+        enable_liquidation=not args.no_liquidation
+    )
+    namespace = load_strategy_namespace(args.strategy)
+    if namespace.get("trade_signal") is None:
+        print("回放需要策略提供 trade_signal 函数")
+        return 1
+    engine = EventEngine(config, namespace["trade_signal"],
+                         log=(lambda text: sys.stdout.write(text)) if args.verbose else None)
+
+    print(f"回放 {log.symbol}，共 {len(log)} 条行情，录制时长 {log.duration / 3600:.2f} 小时")
+    started = time.perf_counter()
+    result = engine.run_events(recorded_events(log, args.trigger, args.speed))
+    print(f"处理 {result.ticks} 个tick，用时 {time.perf_counter() - started:.2f} 秒")
+    print(result.format_summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import json
+import time
+import random
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+from websockets.sync.client import connect
+
+logger = logging.getLogger(__name__)
+
+STREAM_URL = "wss://fstream.binance.com"
+FEED_STREAMS = ("aggTrade", "markPrice", "kline")
+FEED_MODES = ["定时轮询", "WebSocket推送"]
+TRIGGER_MODES = ["逐笔成交", "K线收盘"]
+
+
+def stream_names(symbol, interval, streams=FEED_STREAMS):
+    """组合订阅的流名称，如 btcusdt@aggTrade、btcusdt@markPrice@1s、btcusdt@kline_1h"""
+    symbol = symbol.lower()
+    names = []
+    for stream in streams:
+        if stream == "markPrice":
+            names.append(f"{symbol}@markPrice@1s")
+        elif stream == "kline":
+            names.append(f"{symbol}@kline_{interval}")
+        else:
+            names.append(f"{symbol}@{stream}")
+    return names
+
+
+def stream_url(base_url, names):
+    """组合订阅地址，一条连接可以同时订阅多个交易对的多个流"""
+    return f"{base_url.rstrip('/')}/stream?streams={'/'.join(names)}"
+
+
+def format_event_time(ms):
+    return datetime.fromtimestamp(ms / 1000).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_message(raw):
+    """把推送消息解析为事件字典，不关心的消息（含未收盘的K线）返回 None
+
+    trade: 逐笔成交；mark: 标记价格；kline: 已收盘的K线
+    """
+    message = json.loads(raw)
+    data = message.get("data", message)
+    event_type = data.get("e")
+    if event_type == "aggTrade":
+        return {"type": "trade", "symbol": data["s"], "time": data["T"], "price": float(data["p"]),
+                "quantity": float(data["q"])}
+    if event_type == "markPriceUpdate":
+        return {"type": "mark", "symbol": data["s"], "time": data["E"], "price": float(data["p"])}
+    if event_type == "kline":
+        kline = data["k"]
+        if not kline.get("x"):
+            return None
+        return {"type": "kline", "symbol": data["s"], "time": kline["t"], "close_time": kline["T"],
+                "interval": kline["i"], "open": float(kline["o"]), "high": float(kline["h"]),
+                "low": float(kline["l"]), "close": float(kline["c"]), "volume": float(kline["v"])}
+    return None
+
+
+class TickConflator:
+    """把推送事件合并为交易线程按需取走的快照
+
+    推送线程每来一个事件就调用 push；交易线程调用 take 取走自上次以来的最新价、最高价和最低价，
+    处理速度跟不上推送时中间的成交会被合并，但最高/最低价保留下来用于强平检查，已收盘的K线逐根保留不丢弃。
+    """
+
+    def __init__(self):
+        # take 在持锁时调用 take_nowait，需要可重入锁
+        self._condition = threading.Condition(threading.RLock())
+        self._klines = deque()
+        self._clear()
+        self.mark_price = None
+
+    def _clear(self):
+        self._price = None
+        self._time = None
+        self._received = None
+        self._high = None
+        self._low = None
+        self._count = 0
+
+    def push(self, event):
+        with self._condition:
+            if event["type"] == "kline":
+                self._klines.append(event)
+            else:
+                price = event["price"]
+                if event["type"] == "trade":
+                    self._price = price
+                    self._time = event["time"]
+                    self._received = time.perf_counter()
+                    self._count += 1
+                else:
+                    self.mark_price = price
+                self._high = price if self._high is None else max(self._high, price)
+                self._low = price if self._low is None else min(self._low, price)
+            self._condition.notify()
+
+    def take(self, timeout=None):
+        """等待新事件并返回快照，超时返回 None
+
+        快照字段：price/time 为最新成交价和时间（毫秒，无新成交时为 None），received 为收到最新成交时的
+        perf_counter 读数（用于统计排队延迟），high/low 为期间成交价和标记价格的极值，
+        trades 为合并的成交笔数，klines 为期间收盘的K线事件列表。
+        """
+        with self._condition:
+            if self._high is None and not self._klines:
+                self._condition.wait(timeout)
+            return self.take_nowait()
+
+    def take_nowait(self):
+        """不等待，立即返回快照，没有新事件时返回 None"""
+        with self._condition:
+            if self._high is None and not self._klines:
+                return None
+            snapshot = {
+                "price": self._price, "time": self._time, "received": self._received,
+                "high": self._high, "low": self._low,
+                "mark": self.mark_price, "trades": self._count,
+                "klines": list(self._klines)
+            }
+            self._klines.clear()
+            self._clear()
+            return snapshot
+
+
+class MarketDataFeed:
+    """币安合约行情推送
+
+    在后台线程中订阅一个交易对的逐笔成交、标记价格和K线流，把解析后的事件交给 on_event。
+    连接断开、超过 heartbeat_timeout 秒没有收到任何消息或心跳超时时自动重连，重连间隔按指数退避并加随机抖动。
+    base_url 可以指向本地的 WebSocket 替身服务用于测试。
+    """
+
+    def __init__(self, symbol, interval, on_event, base_url=STREAM_URL, streams=FEED_STREAMS,
+                 on_status=None, heartbeat_timeout=30, ping_interval=20, max_backoff=60):
+        self.symbol = symbol
+        self.interval = interval
+        self.on_event = on_event
+        self.on_status = on_status
+        self.url = stream_url(base_url, stream_names(symbol, interval, streams))
+        self.heartbeat_timeout = heartbeat_timeout
+        self.ping_interval = ping_interval
+        self.max_backoff = max_backoff
+        self.messages = 0
+        self.reconnects = 0
+        self.last_message_time = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._ws = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=False):
+        """停止推送并关闭连接"""
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+        if wait and self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def status(self, text):
+        logger.info(text)
+        if self.on_status:
+            self.on_status(text)
+
+    def run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                with connect(self.url, open_timeout=10, ping_interval=self.ping_interval,
+                             ping_timeout=self.ping_interval, close_timeout=2) as ws:
+                    self._ws = ws
+                    attempt = 0
+                    self.status(f"行情推送已连接: {self.symbol}")
+                    while not self._stop.is_set():
+                        try:
+                            raw = ws.recv(timeout=self.heartbeat_timeout)
+                        except TimeoutError:
+                            raise ConnectionError(f"{self.heartbeat_timeout}秒未收到行情")
+                        self.messages += 1
+                        self.last_message_time = time.time()
+                        event = parse_message(raw)
+                        if event is not None:
+                            self.on_event(event)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                attempt += 1
+                self.reconnects += 1
+                backoff = min(2 ** attempt, self.max_backoff) * (0.5 + random.random())
+                self.status(f"行情推送断开（{e}），{backoff:.1f}秒后重连")
+                self._stop.wait(backoff)
+            finally:
+                self._ws = None
+        self.status(f"行情推送已停止: {self.symbol}")
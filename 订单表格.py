@@ -0,0 +1,122 @@
+from tkinter import ttk
+from collections import deque
+
+
+class OrderTable:
+    """虚拟化的订单表格
+
+    全部行保存在 rows 中，Treeview 里只保留可见的 height 行，滚动条按总行数换算位置；
+    任意线程调用 append/update/clear 只是把操作放入队列，界面每 interval_ms 毫秒统一应用一次，
+    再把可见行与上次显示的值逐行对比，只更新有变化的行。停在底部时新行自动滚入视野。
+    """
+
+    def __init__(self, parent, columns, widths=None, height=10, interval_ms=200):
+        self.columns = tuple(columns)
+        self.height = height
+        self.interval_ms = interval_ms
+        self._column_index = {col: i for i, col in enumerate(self.columns)}
+
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=self.columns, show="headings", height=height)
+        for col in self.columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=(widths or {}).get(col, 100))
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.on_scroll)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self.on_wheel)
+
+        self.rows = []
+        self._keys = {}
+        self._ops = deque()
+        self.top = 0
+        self.follow = True
+        self._items = []
+        self._shown = []
+        self.frame.after(self.interval_ms, self.poll)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def append(self, values, key=None):
+        """追加一行，key 用于之后按键更新（如订单序列号），可在任意线程调用"""
+        self._ops.append(("append", key, tuple(values)))
+
+    def update(self, key, changes):
+        """按键更新一行中的若干列，changes 为 {列名: 新值}，没有该键时忽略，可在任意线程调用"""
+        self._ops.append(("update", key, changes))
+
+    def clear(self):
+        """清空全部行，可在任意线程调用"""
+        self._ops.append(("clear", None, None))
+
+    def apply_pending(self):
+        """应用队列中的操作，返回是否有变化"""
+        changed = False
+        while self._ops:
+            op, key, data = self._ops.popleft()
+            if op == "append":
+                if key is not None:
+                    self._keys[key] = len(self.rows)
+                self.rows.append(data)
+            elif op == "update":
+                index = self._keys.get(key)
+                if index is None:
+                    continue
+                row = list(self.rows[index])
+                for col, value in data.items():
+                    row[self._column_index[col]] = value
+                self.rows[index] = tuple(row)
+            else:
+                self.rows.clear()
+                self._keys.clear()
+                self.top = 0
+                self.follow = True
+            changed = True
+        return changed
+
+    def poll(self):
+        if self.apply_pending():
+            self.render()
+        self.frame.after(self.interval_ms, self.poll)
+
+    def render(self):
+        """把可见窗口内的行同步到 Treeview"""
+        total = len(self.rows)
+        max_top = max(total - self.height, 0)
+        self.top = max_top if self.follow else min(max(self.top, 0), max_top)
+        visible = self.rows[self.top:self.top + self.height]
+
+        while len(self._items) < len(visible):
+            self._items.append(self.tree.insert("", "end"))
+            self._shown.append(None)
+        while len(self._items) > len(visible):
+            self.tree.delete(self._items.pop())
+            self._shown.pop()
+
+        for i, values in enumerate(visible):
+            if self._shown[i] != values:
+                self.tree.item(self._items[i], values=values)
+                self._shown[i] = values
+
+        if total:
+            self.scrollbar.set(self.top / total, (self.top + len(visible)) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.top = int(float(amount) * len(self.rows))
+        else:
+            self.top += int(amount) * (self.height if unit == "pages" else 1)
+        self.follow = self.top >= len(self.rows) - self.height
+        self.render()
+
+    def on_wheel(self, event):
+        step = -3 if event.num == 4 or event.delta > 0 else 3
+        self.on_scroll("scroll", step, "units")
+        return "break"
@@ -0,0 +1,270 @@
+import json
+import time
+import random
+import logging
+import threading
+
+from websockets.sync.client import connect
+
+from 行情推送 import STREAM_URL
+
+logger = logging.getLogger(__name__)
+
+# listenKey 60分钟不续期会失效，按币安建议每30分钟续期一次
+KEEPALIVE_INTERVAL = 30 * 60
+# 订单不会再变化的状态
+FINAL_ORDER_STATUS = ("FILLED", "CANCELED", "EXPIRED", "REJECTED")
+
+
+class AccountMirror:
+    """实盘账户的内存镜像：余额、持仓和订单
+
+    连接（或重连）用户数据流时先用 REST 快照初始化，之后由 ACCOUNT_UPDATE 和 ORDER_TRADE_UPDATE 推送增量更新，
+    交易线程和结果线程直接读取镜像，不再轮询账户接口。持仓按 (交易对, 持仓方向) 存放，订单按订单号存放。
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.balances = {}
+        self.positions = {}
+        self.orders = {}
+        self._order_watchers = {}
+        self.updated = None
+        self.ready = threading.Event()
+
+    def load_snapshot(self, balances, positions):
+        """用 futures_account_balance 和 futures_position_information 的返回值重建镜像"""
+        with self._condition:
+            self.balances = {
+                item["asset"]: {
+                    "wallet": float(item["balance"]),
+                    "cross": float(item.get("crossWalletBalance", item["balance"]))
+                }
+                for item in balances
+            }
+            self.positions = {}
+            for item in positions:
+                self._set_position(item["symbol"], item.get("positionSide", "BOTH"), float(item["positionAmt"]),
+                                   float(item["entryPrice"]), float(item.get("unRealizedProfit", 0)))
+            self.updated = time.time()
+            self._condition.notify_all()
+        self.ready.set()
+
+    def _set_position(self, symbol, position_side, amount, entry_price, unrealized):
+        key = (symbol, position_side)
+        if amount == 0:
+            self.positions.pop(key, None)
+        else:
+            self.positions[key] = {"amount": amount, "entry_price": entry_price, "unrealized": unrealized}
+
+    def apply(self, event):
+        """应用一条用户数据流事件，返回事件类型"""
+        event_type = event.get("e")
+        callbacks = ()
+        with self._condition:
+            if event_type == "ACCOUNT_UPDATE":
+                account = event["a"]
+                for item in account.get("B", []):
+                    self.balances[item["a"]] = {"wallet": float(item["wb"]), "cross": float(item["cw"])}
+                for item in account.get("P", []):
+                    self._set_position(item["s"], item.get("ps", "BOTH"), float(item["pa"]), float(item["ep"]),
+                                       float(item.get("up", 0)))
+            elif event_type == "ORDER_TRADE_UPDATE":
+                order = self._apply_order(event["o"])
+                if order["status"] in FINAL_ORDER_STATUS:
+                    callbacks = self._order_watchers.pop(event["o"]["i"], ())
+                    order = dict(order)
+            else:
+                return event_type
+            self.updated = time.time()
+            self._condition.notify_all()
+        # 回调在锁外执行，回调中读取镜像不会死锁
+        for callback in callbacks:
+            callback(order)
+        return event_type
+
+    def _apply_order(self, data):
+        order_id = data["i"]
+        order = self.orders.get(order_id)
+        if order is None:
+            order = self.orders[order_id] = {"commission": 0.0, "realized_profit": 0.0}
+        # 手续费和已实现盈亏按每次成交累加，其余字段取最新值
+        if data.get("x") == "TRADE":
+            order["commission"] += float(data.get("n", 0))
+            order["realized_profit"] += float(data.get("rp", 0))
+        order.update({
+            "symbol": data["s"],
+            "side": data["S"],
+            "position_side": data.get("ps", "BOTH"),
+            "status": data["X"],
+            "quantity": float(data["q"]),
+            "filled": float(data["z"]),
+            "avg_price": float(data["ap"]),
+            "time": data["T"],
+            "received": time.perf_counter()
+        })
+        return order
+
+    def balance(self, asset="USDT"):
+        """钱包余额，没有该资产时返回 None"""
+        with self._condition:
+            entry = self.balances.get(asset)
+        return None if entry is None else entry["wallet"]
+
+    def position(self, symbol, position_side="BOTH"):
+        """返回持仓字典（amount 为带方向的数量），没有持仓时返回 None"""
+        with self._condition:
+            entry = self.positions.get((symbol, position_side))
+            return None if entry is None else dict(entry)
+
+    def unrealized_pnl(self, symbol=None, price=None):
+        """未实现盈亏；传入 price 时按该价格重算，否则使用最近一次推送中的值"""
+        with self._condition:
+            total = 0.0
+            for (position_symbol, _), entry in self.positions.items():
+                if symbol is not None and position_symbol != symbol:
+                    continue
+                if price is None:
+                    total += entry["unrealized"]
+                else:
+                    total += entry["amount"] * (price - entry["entry_price"])
+            return total
+
+    def wait_order(self, order_id, timeout=5):
+        """等待订单完全成交（或被取消/拒绝），返回订单字典，超时返回 None"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                order = self.orders.get(order_id)
+                if order is not None and order["status"] in FINAL_ORDER_STATUS:
+                    return dict(order)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+
+    def watch_order(self, order_id, callback):
+        """订单完全成交（或被取消/拒绝）时调用 callback(订单字典)，不阻塞调用方
+
+        订单字典中的 received 为收到最后一条订单推送时的 perf_counter 读数；调用时推送已经到达的，立即回调。
+        """
+        with self._condition:
+            order = self.orders.get(order_id)
+            if order is None or order["status"] not in FINAL_ORDER_STATUS:
+                self._order_watchers.setdefault(order_id, []).append(callback)
+                return
+            order = dict(order)
+        callback(order)
+
+
+class UserDataStream:
+    """币安合约用户数据流
+
+    在后台线程中申请 listenKey 并订阅账户推送，每 keepalive_interval 秒续期一次。
+    每次连接成功后先用 REST 拉取余额和持仓重建镜像（断线期间错过的推送由此补齐），之后只依赖推送更新；
+    连接断开或收到 listenKeyExpired 时按指数退避加随机抖动重连。client 为已绑定 API 的 python-binance Client；
+    on_event 在每条推送应用到镜像之后调用，on_sync 在每次 REST 同步之后调用。
+    """
+
+    def __init__(self, client, mirror=None, on_event=None, on_sync=None, on_status=None, base_url=STREAM_URL,
+                 keepalive_interval=KEEPALIVE_INTERVAL, ping_interval=20, max_backoff=60):
+        self.client = client
+        self.mirror = mirror or AccountMirror()
+        self.on_event = on_event
+        self.on_sync = on_sync
+        self.on_status = on_status
+        self.base_url = base_url.rstrip("/")
+        self.keepalive_interval = keepalive_interval
+        self.ping_interval = ping_interval
+        self.max_backoff = max_backoff
+        self.listen_key = None
+        self.messages = 0
+        self.reconnects = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._ws = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=False):
+        """停止推送、关闭连接并注销 listenKey"""
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+        if wait and self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def status(self, text):
+        logger.info(text)
+        if self.on_status:
+            self.on_status(text)
+
+    def resync(self):
+        """通过 REST 重建账户镜像"""
+        self.mirror.load_snapshot(self.client.futures_account_balance(),
+                                  self.client.futures_position_information())
+        if self.on_sync:
+            self.on_sync()
+
+    def run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                self.listen_key = self.client.futures_stream_get_listen_key()
+                last_keepalive = time.monotonic()
+                with connect(f"{self.base_url}/ws/{self.listen_key}", open_timeout=10,
+                             ping_interval=self.ping_interval, ping_timeout=self.ping_interval,
+                             close_timeout=2) as ws:
+                    self._ws = ws
+                    # 先连接再拉快照：拉快照期间的推送缓存在连接里，随后依次应用，不会遗漏
+                    self.resync()
+                    attempt = 0
+                    self.status("账户推送已连接，余额和持仓已同步")
+                    while not self._stop.is_set():
+                        if time.monotonic() - last_keepalive >= self.keepalive_interval:
+                            self.client.futures_stream_keepalive(listenKey=self.listen_key)
+                            last_keepalive = time.monotonic()
+                        try:
+                            raw = ws.recv(timeout=min(60, self.keepalive_interval))
+                        except TimeoutError:
+                            # 账户没有变动时本来就没有推送，连接存活由 ping 保证
+                            continue
+                        self.messages += 1
+                        event = json.loads(raw)
+                        event = event.get("data", event)
+                        if event.get("e") == "listenKeyExpired":
+                            raise ConnectionError("listenKey 已过期")
+                        self.mirror.apply(event)
+                        if self.on_event:
+                            self.on_event(event)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                attempt += 1
+                self.reconnects += 1
+                backoff = min(2 ** attempt, self.max_backoff) * (0.5 + random.random())
+                self.status(f"账户推送断开（{e}），{backoff:.1f}秒后重连")
+                self._stop.wait(backoff)
+            finally:
+                self._ws = None
+
+        if self.listen_key is not None:
+            try:
+                self.client.futures_stream_close(listenKey=self.listen_key)
+            except Exception as e:
+                logger.warning(f"注销 listenKey 失败: {e}")
+            self.listen_key = None
+        self.status("账户推送已停止")
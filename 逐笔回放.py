@@ -0,0 +1,156 @@
+import os
+import zipfile
+import logging
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+REPLAY_KINDS = ["aggTrades", "bookTicker"]
+
+# 币安公开数据归档（data.binance.vision）的列名，较早的文件没有表头
+ARCHIVE_COLUMNS = {
+    "aggTrades": ["agg_trade_id", "price", "quantity", "first_trade_id", "last_trade_id", "transact_time",
+                  "is_buyer_maker"],
+    "bookTicker": ["update_id", "best_bid_price", "best_bid_qty", "best_ask_price", "best_ask_qty",
+                   "transaction_time", "event_time"]
+}
+# 每种数据读取的时间列和价格列，盘口数据取买一卖一的中间价
+ARCHIVE_FIELDS = {
+    "aggTrades": ("transact_time", ["price"]),
+    "bookTicker": ("transaction_time", ["best_bid_price", "best_ask_price"])
+}
+
+
+def detect_kind(path):
+    """按文件名判断归档类型，如 BTCUSDT-aggTrades-2024-01-01.zip"""
+    name = os.path.basename(path)
+    for kind in REPLAY_KINDS:
+        if kind.lower() in name.lower():
+            return kind
+    raise ValueError(f"无法从文件名判断数据类型，请指定 aggTrades 或 bookTicker: {path}")
+
+
+@contextmanager
+def open_archive(path):
+    """打开 CSV 或只含一个 CSV 的 ZIP 归档，得到二进制文件对象（逐块解压，不整体读入内存）"""
+    if not zipfile.is_zipfile(path):
+        with open(path, "rb") as f:
+            yield f
+        return
+    with zipfile.ZipFile(path) as archive:
+        names = [name for name in archive.namelist() if name.lower().endswith(".csv")]
+        if not names:
+            raise ValueError(f"压缩包中没有 CSV 文件: {path}")
+        with archive.open(names[0]) as f:
+            yield f
+
+
+def has_header(path):
+    with open_archive(path) as f:
+        first = f.readline().strip()
+    return bool(first) and not first[:1].isdigit()
+
+
+def read_chunks(path, kind=None, chunksize=1000000):
+    """逐块读取一个归档文件，每块产出 (毫秒时间戳 int64 数组, 价格 float64 数组)"""
+    kind = kind or detect_kind(path)
+    time_column, price_columns = ARCHIVE_FIELDS[kind]
+    header = 0 if has_header(path) else None
+    with open_archive(path) as f:
+        reader = pd.read_csv(
+            f, header=header, names=ARCHIVE_COLUMNS[kind], usecols=[time_column] + price_columns,
+            dtype={time_column: "int64", **{col: "float64" for col in price_columns}}, chunksize=chunksize
+        )
+        for chunk in reader:
+            times = chunk[time_column].to_numpy()
+            # 2025 年起部分归档的时间戳为微秒
+            if len(times) and times.max() > 10 ** 14:
+                times = np.where(times > 10 ** 14, times // 1000, times)
+            if len(price_columns) == 1:
+                prices = chunk[price_columns[0]].to_numpy()
+            else:
+                prices = chunk[price_columns].to_numpy().mean(axis=1)
+            yield times, prices
+
+
+def segment_extreme_index(buckets, prices, starts, highest):
+    """每个时间桶内最高（或最低）价第一次出现的位置"""
+    order = np.lexsort((np.arange(len(prices)), -prices if highest else prices, buckets))
+    return order[starts]
+
+
+def thin_ticks(times, prices, bucket_ms):
+    """按 bucket_ms 毫秒分桶抽稀，每桶只保留第一笔、最高价、最低价和最后一笔，按原顺序返回
+
+    保留极值保证强平检查不会漏掉桶内的插针，保留首尾保证信号价格与原序列衔接。
+    """
+    if len(times) == 0:
+        return times, prices
+    buckets = times // bucket_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(times)] - 1
+    keep = np.unique(np.concatenate([
+        starts, ends,
+        segment_extreme_index(buckets, prices, starts, True),
+        segment_extreme_index(buckets, prices, starts, False)
+    ]))
+    return times[keep], prices[keep]
+
+
+def thin_chunks(chunks, bucket_ms):
+    """对逐块数据抽稀，每块最后一个时间桶留到下一块一起处理，保证跨块的桶不被拆开"""
+    carry = None
+    for times, prices in chunks:
+        if carry is not None:
+            times = np.concatenate([carry[0], times])
+            prices = np.concatenate([carry[1], prices])
+        if len(times) == 0:
+            continue
+        last_bucket = times[-1] // bucket_ms
+        split = int(np.searchsorted(times, last_bucket * bucket_ms, side="left"))
+        carry = (times[split:], prices[split:])
+        if split:
+            yield thin_ticks(times[:split], prices[:split], bucket_ms)
+    if carry is not None and len(carry[0]):
+        yield thin_ticks(carry[0], carry[1], bucket_ms)
+
+
+def format_tick_times(times):
+    """毫秒时间戳数组转为 "YYYY-MM-DD HH:MM:SS.fff" 字符串列表（UTC，与K线时间一致）"""
+    labels = np.datetime_as_string(times.astype("datetime64[ms]"), unit="ms")
+    return np.char.replace(labels, "T", " ").tolist()
+
+
+class ReplayTicks:
+    """本地逐笔成交/盘口归档的tick序列
+
+    按文件顺序逐块读取，任何时刻内存中只有一块数据（chunksize 行），几 GB 的单日文件也可以直接回放。
+    bucket_ms 大于 0 时按时间桶抽稀，每桶保留首尾和最高/最低价。
+    迭代产出 (时间字符串, 价格)，可直接交给 BacktestEngine.run_ticks。
+    """
+
+    def __init__(self, paths, kind=None, chunksize=1000000, bucket_ms=0):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        missing = [path for path in self.paths if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"找不到回放文件: {', '.join(missing)}")
+        self.kind = kind
+        self.chunksize = chunksize
+        self.bucket_ms = bucket_ms
+
+    def chunks(self):
+        """逐块产出 (毫秒时间戳数组, 价格数组)"""
+        def raw():
+            for path in self.paths:
+                logger.info(f"回放 {path}")
+                yield from read_chunks(path, self.kind, self.chunksize)
+
+        if self.bucket_ms > 0:
+            return thin_chunks(raw(), self.bucket_ms)
+        return raw()
+
+    def __iter__(self):
+        for times, prices in self.chunks():
+            yield from zip(format_tick_times(times), prices.tolist())